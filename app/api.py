@@ -0,0 +1,132 @@
+"""
+Headless trajectory API
+/api/trajectories serves the dashboard's trajectories to other tools, as GeoJSON
+(one LineString per flight, see trips.py) or as an Arrow IPC table of positions.
+Bodies are content-hashed into strong ETags, so a repeat poll with If-None-Match gets
+an empty 304 while the data is unchanged. Windows that ended in the past cannot
+change: their bodies are built once per cached dataset and marked cacheable. Open
+windows are fetched and built per request, so their ETag follows new rows.
+"""
+
+import os
+import gzip
+import hashlib
+from datetime import datetime, timedelta
+import flask
+from dataset_cache import get_artifact
+from export import filters_from_args
+from flight_queries import TIME_FORMAT
+from render_pool import RenderPoolBusy
+
+API_ROUTE = "/api/trajectories"
+
+API_FORMATS = {
+    "geojson": "application/geo+json",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Windows ending at least this long ago are treated as final
+API_HISTORICAL_MINUTES = int(os.getenv("API_HISTORICAL_MINUTES", "30"))
+
+# Client cache lifetime for final windows
+API_HISTORICAL_MAX_AGE = int(os.getenv("API_HISTORICAL_MAX_AGE", "86400"))
+
+
+def geojson_body(df):
+    """Trips as a GeoJSON FeatureCollection ([lon, lat, altitude, epoch seconds] coordinates)"""
+    from trips import build_trip_collection
+    return build_trip_collection(df).encode("utf-8")
+
+
+def arrow_body(df):
+    """Positions as an Arrow IPC stream (times as timestamp[s], strings dictionary-encoded)"""
+    import pyarrow as pa
+    from frame_schema import EPOCH_COLUMNS
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for col in EPOCH_COLUMNS:
+        if col in table.column_names and pa.types.is_integer(table.schema.field(col).type):
+            index = table.column_names.index(col)
+            table = table.set_column(index, col, table.column(col).cast(pa.int64()).cast(pa.timestamp("s")))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+BODY_BUILDERS = {"geojson": geojson_body, "arrow": arrow_body}
+
+
+def _build_entry(fmt, df):
+    body = BODY_BUILDERS[fmt](df)
+    return {
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+        "raw": body,
+        "gzip": gzip.compress(body, compresslevel=6) if fmt == "geojson" else None,
+    }
+
+
+def is_historical(end_date):
+    """Whether a window ended long enough ago for its result to be final"""
+    if not end_date:
+        return False
+    end = datetime.strptime(end_date, TIME_FORMAT)
+    return end <= datetime.now() - timedelta(minutes=API_HISTORICAL_MINUTES)
+
+
+def _requested_format(request):
+    fmt = request.args.get("format")
+    if fmt is None:
+        accepted = request.accept_mimetypes
+        fmt = "arrow" if accepted.best_match(list(API_FORMATS.values())) == API_FORMATS["arrow"] else "geojson"
+    return fmt
+
+
+def register_api_routes(server, load_dataset):
+    """
+    Serve the trajectory API
+
+    Args:
+        server: Flask app (Dash's app.server)
+        load_dataset: Callable taking a filters dict (see export.filters_from_args) and
+            returning (dataset_id, frame) from the dataset cache or a fresh fetch;
+            dataset_id is None for frames that are not cached
+    """
+    @server.route(API_ROUTE)
+    def trajectories():
+        request = flask.request
+        fmt = _requested_format(request)
+        if fmt not in API_FORMATS:
+            flask.abort(400, description=f"format must be one of {', '.join(API_FORMATS)}")
+        try:
+            filters = filters_from_args(request.args)
+        except ValueError as e:
+            flask.abort(400, description=str(e))
+
+        try:
+            dataset_id, df = load_dataset(filters)
+        except RenderPoolBusy as e:
+            response = flask.jsonify({"error": str(e)})
+            response.status_code = 503
+            response.headers["Retry-After"] = "5"
+            return response
+
+        entry = get_artifact(dataset_id, f"api:{fmt}", lambda frame: _build_entry(fmt, frame)) if dataset_id else None
+        if entry is None:
+            # Not cached (an open window or an empty result): build for this response only
+            entry = _build_entry(fmt, df)
+
+        use_gzip = entry["gzip"] is not None and "gzip" in request.headers.get("Accept-Encoding", "")
+        response = flask.Response(entry["gzip"] if use_gzip else entry["raw"], mimetype=API_FORMATS[fmt])
+        if use_gzip:
+            response.headers["Content-Encoding"] = "gzip"
+        response.headers["Vary"] = "Accept, Accept-Encoding"
+        # Each content encoding is its own representation, so it gets its own tag
+        response.set_etag(entry["etag"] + ("-gz" if use_gzip else ""))
+
+        # Results depend on the caller's data permissions, so only the client may cache them
+        if not df.empty and is_historical(filters["end_date"]):
+            response.headers["Cache-Control"] = f"private, max-age={API_HISTORICAL_MAX_AGE}, immutable"
+        else:
+            response.headers["Cache-Control"] = "private, no-cache"
+        response.headers["X-Records"] = str(len(df))
+        return response.make_conditional(request)
@@ -5,18 +5,37 @@ Visualize flight paths with animation using Databricks data
 
 import os
 import json
-import re
-from io import StringIO
 from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
-from flask import Flask, jsonify
-from dash import Dash, html, dcc, Input, Output, State, callback_context
+from flask import Flask, jsonify, has_request_context
+from dash import Dash, html, dcc, Input, Output, State, callback_context, ClientsideFunction, no_update
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-from databricks import sql
-from keplergl import KeplerGl
-from databricks_utils import sqlQuery, get_databricks_server_hostname, get_databricks_token, get_databricks_sp_token
+from databricks_utils import sqlQuery, get_databricks_server_hostname, get_databricks_token, get_databricks_sp_token, identity_key, use_access_token
+from flight_queries import TABLE_NAME, DEDUP_MODE, DEDUP_COUNT_COLUMN, SPARSE_FETCH_SECONDS, build_flight_query, build_filter_clause, bounded_time_range, choose_source
+from kepler_assets import register_asset_routes
+from map_shell import render_map_shell, store_map_payload, store_payload_parts, has_map_payload, register_payload_routes
+from export import register_export_routes, export_url
+from api import register_api_routes, is_historical
+from dataset_cache import normalize_filters, make_dataset_id, scoped_dataset_id, dataset_owner, put_dataset, get_dataset, get_artifact, stats as dataset_cache_stats
+from singleflight import SingleFlight
+from server_metrics import register_metric_source, register_metrics_route
+from prewarm import BackgroundRefresher, PREWARM_DIR, describe_age
+from render_pool import render_pool, RenderPoolBusy
+from load_jobs import JobManager, JobCancelled, check_cancelled, report_progress
+# pandas and the modules built on it are imported here on the main thread, before the
+# default-view refresher or a request thread could import pandas concurrently and leave
+# a partially initialized module in sys.modules (which Plotly's JSON encoder checks).
+# Only the Databricks connector and SDK stay lazy (see databricks_utils.py).
+import pandas as pd
+from trajectory import INTERPOLATE_SECONDS, prepare_trajectories, dedupe_positions, interpolate_positions
+from frame_schema import compact_frame, memory_report, format_bytes
+from time_slices import FETCH_PARALLELISM, MIXED_SOURCE, split_time_range, slice_hours_for, slice_source, combine_sources, fetch_time_slices, concat_time_slices
+from supersets import find_subset, remember_frame
+from kepler_map import build_map_payload
+from time_chunks import should_stream, plan_time_chunks, build_streamed_payload
+from trips import build_trip_collection
+from tiles import register_tile_routes, should_tile, tile_source
+from flight_stats import get_dataset_stats
 
 # server = Flask(__name__)
 
@@ -25,10 +44,6 @@ from databricks_utils import sqlQuery, get_databricks_server_hostname, get_datab
 #     # Return token at runtime—never embedded in HTML
 #     return jsonify({"token": os.environ["MAPBOX_API_KEY"]})
 
-# Table configuration
-# TABLE_NAME = "justinm.geospatial.flights_states"
-TABLE_NAME = "justinm.opensky.ingest_flights"
-
 # Initialize Dash app
 app = Dash(
     __name__,
@@ -38,6 +53,32 @@ app = Dash(
     title="Flight Tracker - Animated"
 )
 
+# Pre-warmed default view: window length and refresh period. Opt-in: the view is
+# fetched as the app's service principal and shown to every session, so users see it
+# through the app's permissions rather than their own. When off, each session's first
+# load is its own on-behalf-of fetch.
+DEFAULT_VIEW_HOURS = 6
+PREWARM_DEFAULT_VIEW = os.getenv("PREWARM_DEFAULT_VIEW", "0") == "1"
+PREWARM_INTERVAL_SECONDS = int(os.getenv("PREWARM_INTERVAL_SECONDS", "300"))
+
+# Self-hosted Kepler bundles and per-load map payloads
+register_asset_routes(app.server)
+register_payload_routes(app.server)
+register_export_routes(app.server)
+register_metrics_route(app.server)
+register_metric_source("render_pool", render_pool.stats)
+
+# Data loads run as cancellable background jobs polled by the page
+flight_loads = JobManager("flight_load")
+register_metric_source("flight_loads", flight_loads.stats)
+register_metric_source("dataset_cache", dataset_cache_stats)
+
+# How often the page polls a running load for progress (ms)
+LOAD_POLL_INTERVAL_MS = int(os.getenv("LOAD_POLL_INTERVAL_MS", "1000"))
+
+# WSGI entry point for gunicorn (see gunicorn.conf.py)
+server = app.server
+
 # Styles - Dark mode to match Kepler map
 CARD_STYLE = {
     "margin": "10px",
@@ -65,151 +106,188 @@ MAP_CONTAINER_STYLE = {
     "border": "1px solid #3a3f4b"
 }
 
-with open("map.html", "r") as f:
-    map_html = f.read()
-
-# Layout
-app.layout = dbc.Container(
-    fluid=True,
-    children=[
-        # Header
-        dbc.Row([
-            dbc.Col([
-                html.H2(
-                    "✈️ Flight Tracker - Animated",
-                    className="text-center",
-                    style={
-                        "color": "#12939A",
-                        "margin": "10px 0",
-                        "padding": "10px 0",
-                        "textShadow": "0 0 10px rgba(18, 147, 154, 0.5)"
-                    }
-                ),
-            ])
-        ]),
-        
-        # Main content
-        dbc.Row([
-            # Left sidebar - Filters
-            dbc.Col([
-                dbc.Card([
-                    dbc.CardHeader(
-                        html.H5("Filters", style={"color": "#e0e0e0", "margin": "0"})
+
+def serve_layout():
+    """
+    Build the page layout for each new session
+    
+    When a pre-warmed default view is ready, the map shell, dataset store, filter
+    options and status are filled in directly so the first paint does not wait
+    on the warehouse.
+    
+    Dash also calls this once at import, outside any request, to validate
+    callback ids; that pass leaves out the map shell so building the asset
+    manifest waits for the first real page load.
+    """
+    in_request = has_request_context()
+    view = default_view.get() if in_request else None
+    dataset = view["dataset"] if view else None
+    filter_options = view["filter_options"] if view else {"callsigns": [], "countries": []}
+    status_color = "gray"
+    status_text = "Ready"
+    if view:
+        status_color = "green"
+        status_text = f"Loaded {dataset['records']} records (default view, updated {describe_age(default_view.age_seconds())})"
+    
+    # Kepler map shell, loaded once; datasets are pushed into it by assets/map_bridge.js
+    map_html = render_map_shell(data_url=view["map_url"] if view else None) if in_request else ""
+    
+    return dbc.Container(
+        fluid=True,
+        children=[
+            # Header
+            dbc.Row([
+                dbc.Col([
+                    html.H2(
+                        "✈️ Flight Tracker - Animated",
+                        className="text-center",
+                        style={
+                            "color": "#12939A",
+                            "margin": "10px 0",
+                            "padding": "10px 0",
+                            "textShadow": "0 0 10px rgba(18, 147, 154, 0.5)"
+                        }
                     ),
-                    dbc.CardBody([
-                        # Status indicator
-                        html.Div([
-                            html.Span("●", id="status-indicator", style={
-                                "color": "gray",
-                                "fontSize": "20px",
-                                "marginRight": "5px"
-                            }),
-                            html.Span("Ready", id="status-text", style={"color": "#e0e0e0"}),
-                        ], className="mb-3"),
+                ])
+            ]),
+        
+            # Main content
+            dbc.Row([
+                # Left sidebar - Filters
+                dbc.Col([
+                    dbc.Card([
+                        dbc.CardHeader(
+                            html.H5("Filters", style={"color": "#e0e0e0", "margin": "0"})
+                        ),
+                        dbc.CardBody([
+                            # Status indicator
+                            html.Div([
+                                html.Span("●", id="status-indicator", style={
+                                    "color": "gray",
+                                    "fontSize": "20px",
+                                    "marginRight": "5px"
+                                }),
+                                html.Span(status_text, id="status-text", style={"color": "#e0e0e0"}),
+                            ], className="mb-3"),
                         
-                        html.Hr(),
+                            html.Hr(),
                         
-                        # Callsign filter (dropdown)
-                        html.Div([
-                            dbc.Label("Callsign", html_for="callsign-filter", style={"color": "#e0e0e0"}),
-                            dcc.Dropdown(
-                                id="callsign-filter",
-                                options=[],
-                                value=[],  # No default callsign - show all
-                                placeholder="Select callsign(s)...",
-                                multi=True,
-                                className="mb-3 dark-dropdown",
-                                style={"backgroundColor": "#2c3039", "color": "#e0e0e0"}
-                            ),
-                        ]),
+                            # Callsign filter (dropdown)
+                            html.Div([
+                                dbc.Label("Callsign", html_for="callsign-filter", style={"color": "#e0e0e0"}),
+                                dcc.Dropdown(
+                                    id="callsign-filter",
+                                    options=[],
+                                    value=[],  # No default callsign - show all
+                                    placeholder="Select callsign(s)...",
+                                    multi=True,
+                                    className="mb-3 dark-dropdown",
+                                    style={"backgroundColor": "#2c3039", "color": "#e0e0e0"}
+                                ),
+                            ]),
                         
-                        # Origin country filter (dropdown)
-                        html.Div([
-                            dbc.Label("Origin Country", html_for="country-filter", style={"color": "#e0e0e0"}),
-                            dcc.Dropdown(
-                                id="country-filter",
-                                options=[],
-                                value=["United States"],  # Default to United States
-                                placeholder="Select country(ies)...",
-                                multi=True,
-                                className="mb-3 dark-dropdown",
-                                style={"backgroundColor": "#2c3039", "color": "#e0e0e0"}
-                            ),
-                        ]),
+                            # Origin country filter (dropdown)
+                            html.Div([
+                                dbc.Label("Origin Country", html_for="country-filter", style={"color": "#e0e0e0"}),
+                                dcc.Dropdown(
+                                    id="country-filter",
+                                    options=[],
+                                    value=["United States"],  # Default to United States
+                                    placeholder="Select country(ies)...",
+                                    multi=True,
+                                    className="mb-3 dark-dropdown",
+                                    style={"backgroundColor": "#2c3039", "color": "#e0e0e0"}
+                                ),
+                            ]),
                         
-                        # Timestamp range filter
-                        html.Div([
-                            dbc.Label("Start Date & Time (EST)", html_for="start-datetime-filter", style={"color": "#e0e0e0"}),
-                            dbc.Input(
-                                id="start-datetime-filter",
-                                type="datetime-local",
-                                value=(datetime.now() - timedelta(hours=6)).strftime('%Y-%m-%dT%H:%M'),
-                                className="mb-2",
-                                style={"backgroundColor": "#2c3039", "color": "#e0e0e0", "border": "1px solid #3a3f4b"}
-                            ),
-                            dbc.Label("End Date & Time (EST)", html_for="end-datetime-filter", style={"color": "#e0e0e0", "marginTop": "10px"}),
-                            dbc.Input(
-                                id="end-datetime-filter",
-                                type="datetime-local",
-                                value=datetime.now().strftime('%Y-%m-%dT%H:%M'),
-                                className="mb-3",
-                                style={"backgroundColor": "#2c3039", "color": "#e0e0e0", "border": "1px solid #3a3f4b"}
-                            ),
-                        ]),
+                            # Timestamp range filter
+                            html.Div([
+                                dbc.Label("Start Date & Time (EST)", html_for="start-datetime-filter", style={"color": "#e0e0e0"}),
+                                dbc.Input(
+                                    id="start-datetime-filter",
+                                    type="datetime-local",
+                                    value=(datetime.now() - timedelta(hours=6)).strftime('%Y-%m-%dT%H:%M'),
+                                    className="mb-2",
+                                    style={"backgroundColor": "#2c3039", "color": "#e0e0e0", "border": "1px solid #3a3f4b"}
+                                ),
+                                dbc.Label("End Date & Time (EST)", html_for="end-datetime-filter", style={"color": "#e0e0e0", "marginTop": "10px"}),
+                                dbc.Input(
+                                    id="end-datetime-filter",
+                                    type="datetime-local",
+                                    value=datetime.now().strftime('%Y-%m-%dT%H:%M'),
+                                    className="mb-3",
+                                    style={"backgroundColor": "#2c3039", "color": "#e0e0e0", "border": "1px solid #3a3f4b"}
+                                ),
+                            ]),
                         
-                        html.Hr(),
+                            html.Hr(),
                         
-                        # Load data button
-                        dbc.Button(
-                            "Load Flight Data",
-                            id="load-button",
-                            color="primary",
-                            className="w-100 mb-3"
-                        ),
+                            # Load data button
+                            dbc.Button(
+                                "Load Flight Data",
+                                id="load-button",
+                                color="primary",
+                                className="w-100 mb-3"
+                            ),
                         
-                        html.Hr(),
+                            # Streaming exports of the loaded filters (see export.py)
+                            html.Div([
+                                html.A("Export Parquet", id="export-parquet", href="", download="",
+                                       className="btn btn-outline-secondary btn-sm", style={"flex": "1"}),
+                                html.A("Export Arrow", id="export-arrow", href="", download="",
+                                       className="btn btn-outline-secondary btn-sm", style={"flex": "1"}),
+                            ], id="export-links", className="mb-3", style={"display": "none"}),
                         
-                        # Statistics
-                        html.Div([
-                            html.H6("Statistics", className="mb-2", style={"color": "#e0e0e0"}),
-                            html.Div(id="stats-display", style={"color": "#e0e0e0"})
+                            html.Hr(),
+                        
+                            # Statistics
+                            html.Div([
+                                html.H6("Statistics", className="mb-2", style={"color": "#e0e0e0"}),
+                                html.Div(id="stats-display", style={"color": "#e0e0e0"})
+                            ])
                         ])
-                    ])
-                ], style=CONTROL_PANEL_STYLE)
-            ], width=3),
+                    ], style=CONTROL_PANEL_STYLE)
+                ], width=3),
             
-            # Right side - Kepler.gl Map
-            dbc.Col([
-                html.Div([
-                    html.Iframe(
-                        id="kepler-map",
-                        srcDoc=map_html,
-                        style={"width": "100%", "height": "100%", "border": "none"}
-                    )
-                ], style=MAP_CONTAINER_STYLE)
-            ], width=9, style={"padding": "0"})
-        ], style={"height": "calc(100vh - 80px)"}),
-        
-        # Store for flight data
-        dcc.Store(id="flight-data-store"),
-        dcc.Store(id="initial-load-complete", data=False),
-        
-        # Interval to trigger initial load
-        dcc.Interval(
-            id="initial-load-trigger",
-            interval=500,  # 500ms delay
-            n_intervals=0,
-            max_intervals=1  # Only fire once
-        )
-    ],
-    style={
-        "maxWidth": "100%",
-        "padding": "0",
-        "height": "100vh",
-        "overflow": "hidden",
-        "backgroundColor": "#1a1d24"
-    }
-)
+                # Right side - Kepler.gl Map
+                dbc.Col([
+                    html.Div([
+                        html.Iframe(
+                            id="kepler-map",
+                            srcDoc=map_html,
+                            style={"width": "100%", "height": "100%", "border": "none"}
+                        )
+                    ], style=MAP_CONTAINER_STYLE)
+                ], width=9, style={"padding": "0"})
+            ], style={"height": "calc(100vh - 80px)"}),
+        
+            # Store for flight data
+            dcc.Store(id="flight-data-store", data=dataset),
+            dcc.Store(id="initial-load-complete", data=view is not None),
+            # Latest map payload ({url, message}) posted into the live map iframe
+            dcc.Store(id="map-payload"),
+            dcc.Store(id="map-bridge"),
+            # Running background load ({job_id}) and the interval polling it
+            dcc.Store(id="load-job"),
+            dcc.Interval(id="load-poll", interval=LOAD_POLL_INTERVAL_MS, disabled=True),
+        
+            # Interval to trigger initial load
+            dcc.Interval(
+                id="initial-load-trigger",
+                interval=500,  # 500ms delay
+                n_intervals=0,
+                max_intervals=1  # Only fire once
+            )
+        ],
+        style={
+            "maxWidth": "100%",
+            "padding": "0",
+            "height": "100vh",
+            "overflow": "hidden",
+            "backgroundColor": "#1a1d24"
+        }
+    )
+
 
 
 # def get_databricks_connection():
@@ -230,109 +308,145 @@ app.layout = dbc.Container(
 #     return connection
 
 
-def fetch_flight_data(callsigns=None, countries=None, start_date=None, end_date=None):
+# Concurrent sessions loading the same filters share one fetch and post-processing pass
+fetch_flights = SingleFlight("fetch_flight_data")
+register_metric_source("fetch_coalescing", fetch_flights.stats)
+
+
+def fetch_flight_data(callsigns=None, countries=None, start_date=None, end_date=None, dedup=DEDUP_MODE, sample_seconds=SPARSE_FETCH_SECONDS):
     """
     Fetch flight data from Databricks table
     
+    Identical concurrent requests from the same identity are coalesced into one
+    execution (see singleflight.py); each caller gets its own copy of the frame.
+    Requests inside a frame this identity already loaded are filtered from it
+    locally (see supersets.py).
+    
     Args:
         callsigns: List of callsigns to filter
         countries: List of origin countries to filter
         start_date: Start timestamp (datetime or string)
         end_date: End timestamp (datetime or string)
+        dedup: "sql", "local" or "off" - how to collapse repeated position reports
+        sample_seconds: Sparse fetch - one raw report per aircraft per this many
+            seconds, interpolated when rendering (0 fetches every report)
     
     Returns:
         pandas DataFrame with flight data
     """
+    filters = normalize_filters(callsigns, countries, start_date, end_date, dedup=dedup, sample=sample_seconds or None)
+    identity = identity_key(get_databricks_token())
+    return fetch_flights.do((identity, make_dataset_id(filters)), _fetch_or_subset, identity, filters)
+
+
+def _fetch_or_subset(identity, filters):
+    """Filter a loaded superset when one covers the filters, otherwise fetch (and remember) the frame"""
+    
+    df = find_subset(identity, filters)
+    if df is not None:
+        print(f"Filtered {len(df)} records from a loaded dataset instead of querying")
+        return df
+    
+    df = _fetch_flight_data(
+        callsigns=filters["callsigns"],
+        countries=filters["countries"],
+        start_date=filters["start_date"],
+        end_date=filters["end_date"],
+        dedup=filters.get("dedup", DEDUP_MODE),
+        sample_seconds=filters.get("sample") or 0
+    )
+    # The remembered frame is the frame store's shared copy when sharing is on
+    return remember_frame(identity, filters, df)
+
+
+def _fetch_flight_data(callsigns=None, countries=None, start_date=None, end_date=None, dedup=DEDUP_MODE, sample_seconds=0):
+    """
+    Fetch flight data from Databricks table (uncoalesced)
+    
+    Args:
+        callsigns: List of callsigns to filter
+        countries: List of origin countries to filter
+        start_date: Start timestamp (datetime or string)
+        end_date: End timestamp (datetime or string)
+        dedup: "sql", "local" or "off" - how to collapse repeated position reports
+        sample_seconds: Sparse-fetch bucket for raw reads (see flight_queries.build_sample_condition)
+    
+    Returns:
+        pandas DataFrame with flight data; df.attrs['dedup_removed'] holds the
+        number of repeated position reports that were dropped and
+        df.attrs['sample_seconds'] the sparse-fetch bucket it was read with (0 if none)
+    """
+    
     try:
         # connection = get_databricks_connection()
         # cursor = connection.cursor()
         
-        # Build query with filters
-        # Convert UTC timestamps to Eastern time for display
-        query = f"""
-            SELECT 
-                icao24, 
-                callsign, 
-                origin_country, 
-                from_utc_timestamp(time_position, 'America/New_York') as last_position, 
-                from_utc_timestamp(last_contact, 'America/New_York') as timestamp,
-                longitude as lon, 
-                latitude as lat
-                -- geo_altitude as altitude
-                -- on_ground as onground, 
-                -- velocity as groundspeed, 
-                -- true_track as track,
-                -- vertical_rate, 
-                -- squawk, 
-                -- spi, 
-                -- category as position_source
-            FROM {TABLE_NAME}
-            WHERE latitude IS NOT NULL 
-              AND longitude IS NOT NULL
-        """
-        
-        # Add filters
-        if callsigns:
-            callsigns_str = ", ".join([f"'{cs}'" for cs in callsigns])
-            query += f" AND callsign IN ({callsigns_str})"
-        
-        if countries:
-            countries_str = ", ".join([f"'{c}'" for c in countries])
-            query += f" AND origin_country IN ({countries_str})"
-        
-        # Convert Eastern time input to UTC for filtering
-        if start_date:
-            query += f" AND last_contact >= to_utc_timestamp('{start_date}', 'America/New_York')"
-        
-        if end_date:
-            query += f" AND last_contact <= to_utc_timestamp('{end_date}', 'America/New_York')"
-        
-        query += " ORDER BY last_contact"
-        
-        print(f"Executing query: {query}")
-        
-        # Execute query
-        # cursor.execute(query)
+        # Long windows read the coarsest rollup that still resolves them (see flight_queries.py)
+        source = choose_source(start_date, end_date)
         
+        # Long windows are fetched as parallel time slices (see time_slices.py)
+        slices = split_time_range(start_date, end_date, slice_hours=slice_hours_for(source))
+        if len(slices) > 1:
+            print(f"Fetching {len(slices)} time slices ({FETCH_PARALLELISM} in parallel) from source {source}")
+            frames, sources = fetch_time_slices(callsigns, countries, slices, dedup=dedup, source=source, sample_seconds=sample_seconds)
+            df = concat_time_slices(frames, dedup=dedup)
+            # Recent slices may have fallen back to the raw table
+            source = combine_sources(sources)
+        else:
+            source = slice_source(source, end_date)
+            # Build query with filters
+            query = build_flight_query(
+                callsigns=callsigns,
+                countries=countries,
+                start_date=start_date,
+                end_date=end_date,
+                dedup=dedup,
+                source=source,
+                sample_seconds=sample_seconds
+            )
+            
+            print(f"Executing query: {query}")
+            
+            df = sqlQuery(query)
+        check_cancelled()
         
-        # Fetch results
-        # columns = [desc[0] for desc in cursor.description]
-        # rows = cursor.fetchall()
-        
-        # # Close connection
-        # cursor.close()
-        # connection.close()
-        
-        df = sqlQuery(query)
-        # Create DataFrame
-        # df = pd.DataFrame(rows, columns=columns)
+        # Count rows collapsed by the dedup, either in the warehouse or locally
+        dedup_removed = 0
+        if DEDUP_COUNT_COLUMN in df.columns:
+            # Rollup slices carry no count; each of their rows stands for itself
+            dedup_removed = int(df[DEDUP_COUNT_COLUMN].fillna(1).sum()) - len(df)
+            df = df.drop(columns=DEDUP_COUNT_COLUMN)
+        elif dedup == "local":
+            df, dedup_removed = dedupe_positions(df)
+        if dedup_removed:
+            print(f"Dedup ({dedup}) removed {dedup_removed} repeated position reports")
         
         if not df.empty:
-            # Convert ALL datetime/timestamp columns to string format
-            for col in df.columns:
-                # Check if column contains datetime-like objects
-                if df[col].dtype == 'object':
-                    # Check first non-null value
-                    sample = df[col].dropna().head(1)
-                    if len(sample) > 0:
-                        sample_val = sample.iloc[0]
-                        # Check if it's a datetime-like object
-                        if hasattr(sample_val, 'strftime') or str(type(sample_val)) == "<class 'datetime.datetime'>":
-                            try:
-                                df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
-                            except:
-                                pass
-                # Also check pandas datetime types
-                elif pd.api.types.is_datetime64_any_dtype(df[col]):
-                    df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
-            
             # Clean callsign
             if 'callsign' in df.columns:
                 df['callsign'] = df['callsign'].fillna('N/A').str.strip()
+            
+            # Categoricals, float32 coordinates and epoch-second times (see frame_schema.py)
+            df = compact_frame(df)
+            
+            print(f"Fetched {len(df)} records")
+            report_progress(f"Segmenting {len(df):,} records into flights")
+            
+            # Split into distinct flights and drop stationary/duplicate points
+            df = render_pool.run(prepare_trajectories, df, rows=len(df))
         
-        print(f"Fetched {len(df)} records")
+        report = memory_report(df)
+        print(f"Returning {len(df)} records ({format_bytes(report['bytes'])}, {report['bytes_per_row']} bytes/row)")
+        df.attrs['dedup_removed'] = dedup_removed
+        # Window the frame was fetched for, used to key per-aircraft caches (see trips.py)
+        df.attrs['window'] = (start_date, end_date)
+        df.attrs['source'] = source
+        # Rollups are already one row per bucket; only raw reads are sampled
+        df.attrs['sample_seconds'] = sample_seconds if source == "raw" else 0
         return df
         
+    except (JobCancelled, RenderPoolBusy):
+        raise
     except Exception as e:
         print(f"Error fetching flight data: {e}")
         import traceback
@@ -412,19 +526,14 @@ def get_random_callsigns(start_date=None, end_date=None, limit=100):
         List of callsign strings
     """
     try:
+        # Missing ends are filled in, so the scan stays bounded (see OPEN_RANGE_HOURS)
+        start_date, end_date = bounded_time_range(start_date, end_date)
         query = f"""
             SELECT DISTINCT callsign 
             FROM {TABLE_NAME} 
             WHERE callsign IS NOT NULL
         """
-        
-        # Add time filters (convert EST input to UTC for comparison)
-        if start_date:
-            query += f" AND last_contact >= to_utc_timestamp('{start_date}', 'America/New_York')"
-        
-        if end_date:
-            query += f" AND last_contact <= to_utc_timestamp('{end_date}', 'America/New_York')"
-        
+        query += build_filter_clause(start_date=start_date, end_date=end_date)
         query += f"""
             ORDER BY RAND()
             LIMIT {limit}
@@ -442,216 +551,204 @@ def get_random_callsigns(start_date=None, end_date=None, limit=100):
         return []
 
 
-def create_kepler_map(df):
+def create_kepler_map(df, dataset_id=None):
     """
-    Create Kepler.gl map with flight path animation
+    Create Kepler.gl map payload with flight path animation
+    
+    Large frames are rendered in the render process pool (see render_pool.py).
+    Long, large windows are split into time chunks the map shell streams in as
+    the animation plays (see time_chunks.py); other maps get prebuilt trip-layer
+    paths (see trips.py), and large ones send their points as vector tiles of the
+    cached dataset (see tiles.py).
     
     Args:
         df: pandas DataFrame with flight data (must have lat, lon, timestamp columns)
+        dataset_id: Dataset cache id of df; tiles are only served for cached datasets
     
     Returns:
-        HTML string of Kepler.gl map
+        URL of the map payload for the map shell, or None if there is no data
     """
+    
     if df.empty:
-        return "<html><body style='background-color: #242730; color: #e0e0e0;'><h3 style='text-align: center; padding: 50px;'>No data to display. Please load data first.</h3></body></html>"
-    
-    # Make a copy to avoid modifying the original
-    df = df.copy()
-    
-    # CRITICAL: Convert timestamp to string format that Kepler understands
-    # This must be done before passing to Kepler.gl
-    if 'timestamp' in df.columns:
-        # Check if it's already a string
-        if df['timestamp'].dtype != 'object' or not isinstance(df['timestamp'].iloc[0], str):
-            # Convert pandas timestamps to string
-            if pd.api.types.is_datetime64_any_dtype(df['timestamp']):
-                df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                # Handle object dtype with Timestamp objects
-                df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Convert any other timestamp columns
-    for col in df.columns:
-        if col != 'timestamp' and ('time' in col.lower() or 'date' in col.lower()):
-            try:
-                if pd.api.types.is_datetime64_any_dtype(df[col]):
-                    df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-                elif df[col].dtype == 'object' and len(df[col].dropna()) > 0:
-                    sample_val = df[col].dropna().iloc[0]
-                    if hasattr(sample_val, 'strftime'):
-                        df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
-            except:
-                pass  # If conversion fails, leave as is
-    
-    # Create Kepler map
-    mapbox_api_key = os.environ["MAPBOX_API_KEY"]
-    # print("MAPBOX_API_KEY:", mapbox_api_key)
-    # print("TOKEN FROM ENV:", repr(os.environ.get("MAPBOX_API_KEY")))
-    map_obj = KeplerGl(height=800, mapboxApiAccessToken=mapbox_api_key)
-    
-    # Add data to map
-    map_obj.add_data(data=df, name='flight_paths')
-    
-    # Configure the map for trip/path visualization with animation
-    config = {
-        'version': 'v1',
-        'config': {
-            'visState': {
-                'filters': [
-                    {
-                        'dataId': ['flight_paths'],
-                        'id': 'time_filter',
-                        'name': ['timestamp'],
-                        'type': 'timeRange',
-                        'enlarged': True,
-                        'plotType': 'histogram',
-                        'animationWindow': 'free',
-                        'speed': 1
-                    }
-                ],
-                'layers': [
-                    {
-                        'type': 'trip',
-                        'config': {
-                            'dataId': 'flight_paths',
-                            'label': 'Flight Paths',
-                            'color': [18, 147, 154],
-                            'columns': {
-                                'lat': 'lat',
-                                'lng': 'lon',
-                                'timestamp': 'timestamp'
-                            },
-                            'isVisible': True,
-                            'visConfig': {
-                                'opacity': 0.8,
-                                'thickness': 3,
-                                'trailLength': 180,
-                                'colorRange': {
-                                    'name': 'Global Warming',
-                                    'type': 'sequential',
-                                    'category': 'Uber',
-                                    'colors': [
-                                        '#5A1846',
-                                        '#900C3F',
-                                        '#C70039',
-                                        '#E3611C',
-                                        '#F1920E',
-                                        '#FFC300'
-                                    ]
-                                }
-                            }
-                        }
-                    },
-                    {
-                        'type': 'point',
-                        'config': {
-                            'dataId': 'flight_paths',
-                            'label': 'Aircraft Points',
-                            'color': [255, 203, 153],
-                            'columns': {
-                                'lat': 'lat',
-                                'lng': 'lon',
-                                'altitude': 'altitude'
-                            },
-                            'isVisible': True,
-                            'visConfig': {
-                                'radius': 5,
-                                'opacity': 0.6,
-                                'radiusRange': [0, 50],
-                                'colorRange': {
-                                    'name': 'Global Warming',
-                                    'type': 'sequential',
-                                    'category': 'Uber',
-                                    'colors': [
-                                        '#5A1846',
-                                        '#900C3F',
-                                        '#C70039',
-                                        '#E3611C',
-                                        '#F1920E',
-                                        '#FFC300'
-                                    ]
-                                },
-                                'filled': True
-                            }
-                        }
-                    }
-                ],
-                'interactionConfig': {
-                    'tooltip': {
-                        'fieldsToShow': {
-                            'flight_paths': [
-                                {'name': 'callsign', 'format': None},
-                                {'name': 'origin_country', 'format': None},
-                                {'name': 'altitude', 'format': None},
-                                {'name': 'groundspeed', 'format': None},
-                                {'name': 'timestamp', 'format': None}
-                            ]
-                        },
-                        'enabled': True
-                    }
-                }
-            },
-            'mapState': {
-                'bearing': 0,
-                'dragRotate': False,
-                'latitude': 38.6274,
-                'longitude': -90.1982,
-                'pitch': 0,
-                'zoom': 4,
-                'isSplit': False,
-                "isViewportSynced": True,
-            },
-            'mapStyle': {
-                'styleType': 'dark',
-                'topLayerGroups': {},
-                'visibleLayerGroups': {
-                    'label': True,
-                    'road': True,
-                    'border': False,
-                    'building': True,
-                    'water': True,
-                    'land': True,
-                    '3d building': False
-                }
-            }
-        }
+        return None
+    
+    # Sparse fetches are filled back in to the render cadence along great circles
+    if df.attrs.get('sample_seconds', 0) > INTERPOLATE_SECONDS > 0:
+        df = render_pool.run(interpolate_positions, df, INTERPOLATE_SECONDS, rows=len(df))
+        print(f"Interpolated {df.attrs['interpolated_rows']} positions between sparse reports")
+    
+    if should_stream(df):
+        # Only the first chunk is encoded before the map opens; the rest follow in time order
+        plan = plan_time_chunks(df)
+        print(f"Streaming {len(df)} records as {len(plan['chunks'])} time chunks")
+        return build_streamed_payload(df, plan, store_payload_parts, run=render_pool.run)
+    
+    # Trip paths are cached per aircraft and window; only unseen aircraft are built
+    trips_json = build_trip_collection(df, run=render_pool.run)
+    if dataset_id and should_tile(df):
+        # Tiles are cut from the cached (not interpolated) frame
+        tiles = tile_source(dataset_id, df)
+        print(f"Serving {len(df)} points as vector tiles")
+        return store_map_payload(build_map_payload(df, trips_json=trips_json, tiles=tiles))
+    payload_json = render_pool.run(build_map_payload, df, trips_json=trips_json, rows=len(df))
+    return store_map_payload(payload_json)
+
+
+def get_map_url(dataset_id):
+    """Map payload URL of a cached dataset, rendered once per dataset (None if not cached)"""
+    return get_artifact(dataset_id, "map_payload", lambda frame: create_kepler_map(frame, dataset_id))
+
+
+# Owner of datasets every session may read (the opt-in pre-warmed default view)
+SHARED_DATASET_OWNER = "shared"
+
+
+def can_read_dataset(dataset_id):
+    """Whether the current caller may use a dataset id sent by the browser"""
+    owner = dataset_owner(dataset_id)
+    return owner == identity_key(get_databricks_token()) or (PREWARM_DEFAULT_VIEW and owner == SHARED_DATASET_OWNER)
+
+
+def cache_flight_data(df, callsigns=None, countries=None, start_date=None, end_date=None, owner=None):
+    """
+    Put a fetched frame in the server-side cache
+    
+    Args:
+        owner: Owner the dataset id is scoped to; defaults to the caller's identity
+    
+    Returns:
+        flight-data-store entry: dataset id, filters, record and dedup counts
+    """
+    filters = normalize_filters(
+        callsigns=callsigns,
+        countries=countries,
+        start_date=start_date,
+        end_date=end_date,
+        dedup=DEDUP_MODE,
+        sample=SPARSE_FETCH_SECONDS or None
+    )
+    dataset_id = scoped_dataset_id(owner or identity_key(get_databricks_token()), filters)
+    put_dataset(dataset_id, df, filters)
+    return {
+        "dataset_id": dataset_id,
+        "filters": filters,
+        "records": len(df),
+        "dedup_removed": df.attrs.get('dedup_removed', 0)
     }
+
+
+def get_cached_flight_data(dataset):
+    """
+    Return the frame for a flight-data-store entry
     
-    # Apply configuration
-    map_obj.config = config
-    # print("CONFIG:", map_obj.config)
-    map_obj.save_to_html(file_name="map.html")
-    # After saving map.html, find and replace Mapbox tokens using regex
-    new_token = os.environ["MAPBOX_API_KEY"]
-    try:
-        with open("map.html", "r", encoding="utf-8") as f:
-            html_contents = f.read()
-        # Use regex to find and replace any token after mapboxApiAccessToken:
-        # This matches mapboxApiAccessToken:"<any characters>" or mapboxApiAccessToken:""
-        html_contents = re.sub(
-            r'mapboxApiAccessToken:"[^"]*"',
-            f'mapboxApiAccessToken:"{new_token}"',
-            html_contents
-        )
-        with open("map.html", "w", encoding="utf-8") as f:
-            f.write(html_contents)
-    except Exception as e:
-        print(f"Token replace failed: {e}")
+    Re-fetches with the stored filters when this app instance does not hold the
+    dataset (evicted, or loaded by another worker). Shared datasets are re-fetched
+    as the service principal that built them, so no user's rows end up shared.
+    
+    Raises:
+        PermissionError: The dataset id belongs to another user
+    """
+    dataset_id = dataset["dataset_id"]
+    if not can_read_dataset(dataset_id):
+        raise PermissionError("This dataset was loaded by another user")
+    df = get_dataset(dataset_id)
+    if df is None:
+        filters = dataset["filters"]
+        token = get_databricks_sp_token() if dataset_owner(dataset_id) == SHARED_DATASET_OWNER else get_databricks_token()
+        with use_access_token(token):
+            df = fetch_flight_data(
+                callsigns=filters.get("callsigns"),
+                countries=filters.get("countries"),
+                start_date=filters.get("start_date"),
+                end_date=filters.get("end_date"),
+                dedup=filters.get("dedup", DEDUP_MODE),
+                sample_seconds=filters.get("sample") or 0
+            )
+        df = put_dataset(dataset_id, df, filters)
+    return df
 
-    with open("map.html", "r", encoding="utf-8") as f:
-            html_contents = f.read()
 
-    return html_contents
+def load_api_dataset(filters):
+    """
+    Frame for /api/trajectories filters (see api.py)
     
-    # # Return HTML - decode bytes to string if necessary
-    # html_output = map_obj._repr_html_()
+    Uses the dataset cache under an id scoped to the caller's identity, since API
+    clients are not tied to a page session. Only windows that have ended (see
+    api.is_historical) are cached: an open or recent window still gains rows, so each
+    poll fetches it again and its ETag follows the new content. Empty results are
+    not cached either.
     
-    # # Check if it's bytes and decode to string
-    # if isinstance(html_output, bytes):
-    #     html_output = html_output.decode('utf-8')
+    Returns:
+        (dataset_id, DataFrame); dataset_id is None when the frame is not cached
+    """
+    filters = normalize_filters(dedup=DEDUP_MODE, sample=SPARSE_FETCH_SECONDS or None, **filters)
+    dataset_id = scoped_dataset_id(identity_key(get_databricks_token()), filters)
+    cacheable = is_historical(filters.get("end_date"))
+    df = get_dataset(dataset_id) if cacheable else None
+    if df is None:
+        df = fetch_flight_data(
+            callsigns=filters.get("callsigns"),
+            countries=filters.get("countries"),
+            start_date=filters.get("start_date"),
+            end_date=filters.get("end_date")
+        )
+        if not cacheable or df.empty:
+            return None, df
+        df = put_dataset(dataset_id, df, filters)
+    return dataset_id, df
+
+
+def format_distribution(distribution, unit, precision=0):
+    """Format a stats distribution as 'mean (median) unit'"""
+    if not distribution or distribution.get("mean") is None:
+        return "N/A"
+    text = f"{distribution['mean']:.{precision}f} {unit}"
+    if distribution.get("p50") is not None:
+        text += f" (median {distribution['p50']:.{precision}f})"
+    return text
+
+
+def build_stats_display(stats):
+    """Render the statistics panel from a flight_stats dict"""
+    text_style = {"color": "#e0e0e0"}
+    histogram = stats["time_histogram"]
+    top_countries = stats["by_country"][:5]
     
-    # # print("HTML OUTPUT:", html_output)
-    # return html_output
+    return html.Div([
+        html.P([html.Strong("Total Flights: "), f"{stats['flights']}"], style=text_style),
+        html.P([html.Strong("Aircraft: "), f"{stats['aircraft']}"], style=text_style),
+        html.P([html.Strong("Total Records: "), f"{stats['records']}"], style=text_style),
+        html.P([html.Strong("Countries: "), f"{stats['countries']}"], style=text_style),
+        html.Hr(),
+        html.P([html.Strong("Avg Altitude: "), format_distribution(stats.get("altitude"), "m")], style=text_style),
+        html.P([html.Strong("Avg Speed: "), format_distribution(stats.get("speed"), "m/s", 1)], style=text_style),
+        html.Hr(),
+        html.H6("Top Countries", style=text_style),
+        html.Ul([
+            html.Li(f"{c['country']}: {c['flights']} flights, {c['records']} records")
+            for c in top_countries
+        ], style={**text_style, "paddingLeft": "20px"}),
+        html.H6("Reports over Time", style=text_style),
+        dcc.Graph(
+            figure={
+                "data": [{
+                    "type": "bar",
+                    "x": histogram["bin_starts"],
+                    "y": histogram["counts"],
+                    "marker": {"color": "#12939A"}
+                }],
+                "layout": {
+                    "height": 140,
+                    "margin": {"l": 30, "r": 5, "t": 5, "b": 30},
+                    "paper_bgcolor": "rgba(0,0,0,0)",
+                    "plot_bgcolor": "rgba(0,0,0,0)",
+                    "font": {"color": "#e0e0e0", "size": 9},
+                    "bargap": 0.05
+                }
+            },
+            config={"displayModeBar": False}
+        ),
+    ], style={"fontSize": "14px", "color": "#e0e0e0"})
 
 
 @app.callback(
@@ -679,33 +776,111 @@ def load_filter_options(n_clicks, n_intervals, initial_load_complete):
     if trigger_id == "initial-load-trigger" and initial_load_complete:
         raise PreventUpdate
     
+    view = default_view.get()
+    if trigger_id == "initial-load-trigger" and view:
+        return view["filter_options"]["callsigns"], view["filter_options"]["countries"], True
+    
     callsigns = get_unique_callsigns()
     countries = get_unique_countries()
     
     return callsigns, countries, True
 
 
+# Status indicator color while a load is running
+LOADING_COLOR = "#f0ad4e"
+
+
+def status_style(color):
+    """Style for the status indicator dot"""
+    return {"color": color, "fontSize": "20px", "marginRight": "5px"}
+
+
+def run_flight_load(access_token, callsigns, countries, start_date, end_date, initial=False):
+    """
+    Background job behind load_flight_data: fetch, cache, render and summarize a dataset
+    
+    Runs on a load_jobs thread, so the caller's access token is passed in explicitly.
+    
+    Returns:
+        dict with "dataset" (flight-data-store entry or None), "color" and "text" for the status line
+    """
+    
+    with use_access_token(access_token):
+        if initial:
+            # Get 100 random callsigns that have data within this time window
+            report_progress("Picking flights for the default view")
+            callsigns = get_random_callsigns(start_date=start_date, end_date=end_date, limit=100)
+        
+        print(f"Callsigns: {callsigns}")
+        
+        try:
+            df = fetch_flight_data(
+                callsigns=callsigns,
+                countries=countries,
+                start_date=start_date,
+                end_date=end_date
+            )
+        except RenderPoolBusy as e:
+            return {"dataset": None, "color": "orange", "text": str(e)}
+        
+        if df.empty:
+            return {"dataset": None, "color": "orange", "text": "No Data"}
+        
+        # Keep the frame on the server; the browser only holds its id and filters
+        dataset = cache_flight_data(df, callsigns, countries, start_date, end_date)
+        
+        # Render the map and stats here so update_map_and_stats finds them cached
+        check_cancelled()
+        report_progress(f"Rendering map for {len(df):,} records")
+        get_map_url(dataset["dataset_id"])
+        check_cancelled()
+        report_progress("Computing statistics")
+        get_dataset_stats(dataset["dataset_id"], dataset["filters"])
+    
+    status = f"Loaded {len(df)} records"
+    if df.attrs.get('source') == MIXED_SOURCE:
+        status += " from a rollup and, for recent hours, the raw table"
+    elif df.attrs.get('source', 'raw') != 'raw':
+        status += f" from the {df.attrs['source']} rollup"
+    if df.attrs.get('sample_seconds'):
+        status += f" (sampled every {df.attrs['sample_seconds']}s)"
+    if df.attrs.get('subset_of'):
+        status += " (filtered from a loaded dataset)"
+    if df.attrs.get('dedup_removed'):
+        status += f" ({df.attrs['dedup_removed']} repeated reports removed)"
+    return {"dataset": dataset, "color": "green", "text": status}
+
+
 @app.callback(
     [
         Output("flight-data-store", "data"),
         Output("status-indicator", "style"),
-        Output("status-text", "children")
+        Output("status-text", "children"),
+        Output("load-job", "data"),
+        Output("load-poll", "disabled")
     ],
     [
         Input("load-button", "n_clicks"),
-        Input("initial-load-trigger", "n_intervals")
+        Input("initial-load-trigger", "n_intervals"),
+        Input("load-poll", "n_intervals"),
+        Input("callsign-filter", "value"),
+        Input("country-filter", "value"),
+        Input("start-datetime-filter", "value"),
+        Input("end-datetime-filter", "value")
     ],
     [
-        State("callsign-filter", "value"),
-        State("country-filter", "value"),
-        State("start-datetime-filter", "value"),
-        State("end-datetime-filter", "value"),
-        State("initial-load-complete", "data")
+        State("initial-load-complete", "data"),
+        State("flight-data-store", "data"),
+        State("load-job", "data")
     ]
 )
-def load_flight_data(n_clicks, n_intervals, callsigns, countries, start_datetime, end_datetime, initial_load_complete):
+def load_flight_data(n_clicks, n_intervals, n_polls, callsigns, countries, start_datetime, end_datetime, initial_load_complete, current_dataset, load_job):
     """
     Load flight data from Databricks based on filters
+    
+    Loads run as background jobs (see load_jobs.py): this callback starts them,
+    polls their progress into the status line, and cancels a running load when
+    it is superseded by a new one or the filters change under it.
     """
     ctx = callback_context
     
@@ -713,21 +888,57 @@ def load_flight_data(n_clicks, n_intervals, callsigns, countries, start_datetime
         raise PreventUpdate
     
     trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    job_id = load_job["job_id"] if load_job else None
+    
+    if trigger_id == "load-poll":
+        if not job_id:
+            return no_update, no_update, no_update, None, True
+        job = flight_loads.status(job_id)
+        if job is None:
+            return no_update, status_style("red"), "Load was lost, please try again", None, True
+        if job["state"] == "running":
+            return no_update, status_style(LOADING_COLOR), f"{job['progress']}... ({job['elapsed']:.0f}s)", no_update, False
+        if job["state"] == "cancelled":
+            return no_update, status_style("orange"), "Load cancelled", None, True
+        if job["state"] == "failed":
+            print(f"Error loading data: {job['error']}")
+            return None, status_style("red"), "Error loading data", None, True
+        result = job["result"]
+        return result["dataset"], status_style(result["color"]), result["text"], None, True
     
+    if trigger_id in ("callsign-filter", "country-filter", "start-datetime-filter", "end-datetime-filter"):
+        # A running load no longer matches the filters: stop it
+        if not job_id:
+            raise PreventUpdate
+        flight_loads.cancel(job_id)
+        return no_update, status_style("orange"), "Load cancelled (filters changed)", None, True
+    
+    initial = False
     # Auto-load on initial trigger with past 6 hours of data
     if trigger_id == "initial-load-trigger":
-        if not initial_load_complete:
-            # Set time window to past 6 hours for initial load
-            current_time = datetime.now()
-            six_hours_ago = current_time - timedelta(hours=6)
-            start_datetime = six_hours_ago.strftime('%Y-%m-%dT%H:%M')
-            end_datetime = current_time.strftime('%Y-%m-%dT%H:%M')
-            # Get 100 random callsigns that have data within this time window
-            start_date = start_datetime.replace('T', ' ') + ':00'
-            end_date = end_datetime.replace('T', ' ') + ':00'
-            callsigns = get_random_callsigns(start_date=start_date, end_date=end_date, limit=100)
-            # Don't filter by country for initial load
-            countries = None
+        # The layout already carries the pre-warmed default view
+        if current_dataset or initial_load_complete:
+            raise PreventUpdate
+        
+        view = default_view.get()
+        if view:
+            return (
+                view["dataset"],
+                status_style("green"),
+                f"Loaded {view['dataset']['records']} records (default view, updated {describe_age(default_view.age_seconds())})",
+                no_update,
+                True
+            )
+        
+        # Set time window to past 6 hours for initial load
+        current_time = datetime.now()
+        six_hours_ago = current_time - timedelta(hours=6)
+        start_datetime = six_hours_ago.strftime('%Y-%m-%dT%H:%M')
+        end_datetime = current_time.strftime('%Y-%m-%dT%H:%M')
+        # Random callsigns are picked inside the job; don't filter by country for initial load
+        initial = True
+        callsigns = None
+        countries = None
     elif trigger_id == "load-button":
         if not n_clicks:
             raise PreventUpdate
@@ -744,125 +955,154 @@ def load_flight_data(n_clicks, n_intervals, callsigns, countries, start_datetime
         # Convert from 'YYYY-MM-DDTHH:MM' to 'YYYY-MM-DD HH:MM:SS'
         end_date = end_datetime.replace('T', ' ') + ':00'
     
-    print(f"Callsigns: {callsigns}")
-
-    try:
-        # Fetch data
-        df = fetch_flight_data(
-            callsigns=callsigns,
-            countries=countries,
-            start_date=start_date,
-            end_date=end_date
-        )
-        
-        if df.empty:
-            return (
-                None,
-                {"color": "orange", "fontSize": "20px", "marginRight": "5px"},
-                "No Data"
-            )
-        
-        # Double-check: Ensure all datetime columns are converted to strings for JSON serialization
-        for col in df.columns:
-            # Check pandas datetime types
-            if pd.api.types.is_datetime64_any_dtype(df[col]):
-                df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-            # Check for object columns that might contain datetime objects
-            elif df[col].dtype == 'object':
-                sample = df[col].dropna().head(1)
-                if len(sample) > 0:
-                    sample_val = sample.iloc[0]
-                    if hasattr(sample_val, 'strftime') or 'Timestamp' in str(type(sample_val)):
-                        try:
-                            df[col] = df[col].apply(lambda x: x.strftime('%Y-%m-%d %H:%M:%S') if pd.notna(x) and hasattr(x, 'strftime') else str(x) if pd.notna(x) else None)
-                        except Exception as e:
-                            print(f"Warning: Could not convert column {col}: {e}")
-        
-        # Convert to JSON for storage
-        data_json = df.to_json(date_format='iso', orient='split')
-        
-        return (
-            data_json,
-            {"color": "green", "fontSize": "20px", "marginRight": "5px"},
-            f"Loaded {len(df)} records"
-        )
-        
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return (
-            None,
-            {"color": "red", "fontSize": "20px", "marginRight": "5px"},
-            "Error loading data"
-        )
+    # A new load supersedes (and cancels) the one still running for this page
+    new_job_id = flight_loads.submit(
+        run_flight_load,
+        get_databricks_token(),
+        callsigns,
+        countries,
+        start_date,
+        end_date,
+        initial=initial,
+        supersedes=job_id
+    )
+    
+    return no_update, status_style(LOADING_COLOR), "Loading...", {"job_id": new_job_id}, False
 
 
 @app.callback(
     [
-        Output("kepler-map", "srcDoc"),
+        Output("map-payload", "data"),
         Output("stats-display", "children")
     ],
     Input("flight-data-store", "data")
 )
-def update_map_and_stats(data_json):
+def update_map_and_stats(dataset):
     """
     Update Kepler.gl map and statistics
     """
-    if not data_json:
+    
+    if not dataset:
         return (
-            "<html><body style='background-color: #242730; color: #e0e0e0;'><h3 style='text-align: center; padding: 50px;'>No data loaded. Click 'Load Data' to begin.</h3></body></html>",
+            {"message": "No data loaded. Click 'Load Data' to begin."},
             html.P("No data available")
         )
     
     try:
-        # Load data
-        df = pd.read_json(StringIO(data_json), orient='split')
+        # Load data from the server-side cache
+        df = get_cached_flight_data(dataset)
         
         if df.empty:
             return (
-                "<html><body style='background-color: #242730; color: #e0e0e0;'><h3 style='text-align: center; padding: 50px;'>No flights match the selected filters.</h3></body></html>",
+                {"message": "No flights match the selected filters."},
                 html.P("No data matches filters")
             )
         
-        # Ensure timestamp is a string (in case JSON deserialized it back to datetime)
-        if 'timestamp' in df.columns and df['timestamp'].dtype != 'object':
-            df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Create Kepler map (will do additional timestamp conversion inside)
-        kepler_html = create_kepler_map(df)
+        # Create Kepler map payload once per dataset (timestamp conversion happens inside)
+        dataset_id = dataset["dataset_id"]
+        data_url = get_map_url(dataset_id)
+        if not has_map_payload(data_url):
+            # Payload was evicted from the payload cache; render it again
+            data_url = create_kepler_map(df, dataset_id)
         
         # Create statistics
-        total_flights = df['callsign'].nunique()
-        total_records = len(df)
-        countries = df['origin_country'].nunique()
-        
-        # avg_altitude = df['altitude'].mean()
-        # avg_speed = df['groundspeed'].mean()
+        stats = get_dataset_stats(dataset_id, dataset.get("filters"))
         
-        stats = html.Div([
-            html.P([html.Strong("Total Flights: "), f"{total_flights}"], style={"color": "#e0e0e0"}),
-            html.P([html.Strong("Total Records: "), f"{total_records}"], style={"color": "#e0e0e0"}),
-            html.P([html.Strong("Countries: "), f"{countries}"], style={"color": "#e0e0e0"}),
-            html.Hr(),
-            # html.P([html.Strong("Avg Altitude: "), f"{avg_altitude:.0f} m" if not np.isnan(avg_altitude) else "N/A"], style={"color": "#e0e0e0"}),
-            # html.P([html.Strong("Avg Speed: "), f"{avg_speed:.1f} m/s" if not np.isnan(avg_speed) else "N/A"], style={"color": "#e0e0e0"}),
-        ], style={"fontSize": "14px", "color": "#e0e0e0"})
-        
-        # with open("map.html", "r") as f:
-        #     kepler_html = f.read()
-
-        return kepler_html, stats
+        return {"url": data_url, "message": None}, build_stats_display(stats)
         
+    except RenderPoolBusy as e:
+        return {"message": str(e)}, html.P("Server busy")
+    except PermissionError as e:
+        return {"message": str(e)}, html.P("Dataset unavailable")
     except Exception as e:
         print(f"Error updating map: {e}")
         import traceback
         traceback.print_exc()
         return (
-            f"<html><body style='background-color: #242730; color: #e0e0e0;'><h3 style='text-align: center; padding: 50px;'>Error creating map: {str(e)}</h3></body></html>",
+            {"message": f"Error creating map: {str(e)}"},
             html.P("Error loading data")
         )
 
 
-# Run the app
+@app.callback(
+    [
+        Output("export-parquet", "href"),
+        Output("export-arrow", "href"),
+        Output("export-links", "style")
+    ],
+    Input("flight-data-store", "data")
+)
+def update_export_links(dataset):
+    """Point the export links at the loaded dataset's filters"""
+    if not dataset:
+        return "", "", {"display": "none"}
+    filters = dataset["filters"]
+    return (
+        export_url("parquet", filters),
+        export_url("arrow", filters),
+        {"display": "flex", "gap": "8px"}
+    )
+
+
+def build_default_view():
+    """
+    Build the default "last 6 hours" view served to new sessions
+    
+    Runs on a background thread as the app's service principal (there is no
+    user request to take an on-behalf-of token from).
+    """
+    
+    with use_access_token(get_databricks_sp_token()):
+        current_time = datetime.now()
+        start_date = (current_time - timedelta(hours=DEFAULT_VIEW_HOURS)).strftime('%Y-%m-%d %H:%M:00')
+        end_date = current_time.strftime('%Y-%m-%d %H:%M:00')
+        callsigns = get_random_callsigns(start_date=start_date, end_date=end_date, limit=100)
+        df = fetch_flight_data(callsigns=callsigns, start_date=start_date, end_date=end_date)
+        if df.empty:
+            raise ValueError("default view query returned no data")
+        
+        # Every session starts from this view, so it is not scoped to the service principal
+        dataset = cache_flight_data(df, callsigns, None, start_date, end_date, owner=SHARED_DATASET_OWNER)
+        map_url = get_map_url(dataset["dataset_id"])
+        get_dataset_stats(dataset["dataset_id"], dataset["filters"])
+        filter_options = {
+            "callsigns": get_unique_callsigns(),
+            "countries": get_unique_countries()
+        }
+    
+    return {
+        "dataset": dataset,
+        "map_url": map_url,
+        "filter_options": filter_options
+    }
+
+
+# Pre-warmed default view, refreshed in the background by one worker at a time
+default_view = BackgroundRefresher("default_view", build_default_view, PREWARM_INTERVAL_SECONDS, share_dir=PREWARM_DIR)
+register_metric_source("default_view", default_view.stats)
+# Render pool workers re-import this module under spawn (__mp_main__); they must not refresh
+if PREWARM_DEFAULT_VIEW and __name__ != "__mp_main__":
+    default_view.start()
+
+# Headless access to the same trajectories for other tools
+register_api_routes(app.server, load_api_dataset)
+
+# Vector tiles of cached datasets, served only to sessions that may read them
+register_tile_routes(app.server, can_read_dataset)
+
+# Layout is built per session so it can carry the latest default view
+app.layout = serve_layout
+
+
+# Push map payloads into the live Kepler iframe instead of reloading it
+app.clientside_callback(
+    ClientsideFunction(namespace="flightTracker", function_name="pushMapPayload"),
+    Output("map-bridge", "data"),
+    Input("map-payload", "data")
+)
+
+
+# Run the app (development server; production runs `gunicorn -c gunicorn.conf.py app:server`)
 if __name__ == "__main__":
     app.run(
         debug=False
@@ -0,0 +1,34 @@
+// Bridge from Dash to the Kepler map iframe: posts the latest map payload
+// ({url, message}) into the live shell instead of replacing the iframe's srcDoc.
+(function () {
+  var latest = null;
+  var ready = false;
+
+  function send() {
+    var frame = document.getElementById('kepler-map');
+    if (!latest || !ready || !frame || !frame.contentWindow) {
+      return;
+    }
+    frame.contentWindow.postMessage({type: 'flight-tracker:load', payload: latest}, window.location.origin);
+  }
+
+  window.addEventListener('message', function (event) {
+    var frame = document.getElementById('kepler-map');
+    if (frame && event.source === frame.contentWindow && event.data && event.data.type === 'flight-tracker:ready') {
+      ready = true;
+      send();
+    }
+  });
+
+  window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    flightTracker: {
+      pushMapPayload: function (payload) {
+        if (payload) {
+          latest = payload;
+          send();
+        }
+        return window.dash_clientside.no_update;
+      }
+    }
+  });
+})();
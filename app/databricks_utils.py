@@ -1,18 +1,61 @@
 import os
-import requests
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
 import flask
-import pandas as pd
-from databricks import sql
-from databricks.sdk.core import Config
+from singleflight import SingleFlight
+from server_metrics import register_metric_source
+from load_jobs import JobCancelled, check_cancelled, on_cancel, report_progress
+
+# pandas, requests and the Databricks SQL connector / SDK take over a second to import
+# together, so they are imported where first used rather than at app startup
+if TYPE_CHECKING:
+    import pandas as pd
 
 DATABRICKS_WAREHOUSE_ID = os.getenv("DATABRICKS_WAREHOUSE_ID")
 
-if not DATABRICKS_WAREHOUSE_ID:
+# Answer queries from the offline stand-in in local_warehouse.py instead of Databricks
+LOCAL_WAREHOUSE = os.getenv("LOCAL_WAREHOUSE", "0") == "1"
+
+# Identity used by the local stand-in outside a request
+LOCAL_WAREHOUSE_TOKEN = "local-warehouse"
+
+if not DATABRICKS_WAREHOUSE_ID and not LOCAL_WAREHOUSE:
     print("Warning: DATABRICKS_WAREHOUSE_ID not set. Cannot pull data.")
 
+# Rows fetched per round trip; progress is reported and cancellation checked between chunks
+FETCH_CHUNK_ROWS = int(os.getenv("FETCH_CHUNK_ROWS", "100000"))
+
+# Identical concurrent queries (per identity) share one warehouse execution
+query_flights = SingleFlight("sqlQuery")
+register_metric_source("sql_coalescing", query_flights.stats)
+
+# Token set by use_access_token() for work running outside a request (e.g. background refreshes)
+_token_override = threading.local()
+
+@contextmanager
+def use_access_token(token):
+    """Run queries in this thread with the given access token instead of the request's"""
+    previous = getattr(_token_override, "token", None)
+    _token_override.token = token
+    try:
+        yield
+    finally:
+        _token_override.token = previous
+
 def get_databricks_token():
+    override = getattr(_token_override, "token", None)
+    if override:
+        return override
+
     DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN")
 
+    if not DATABRICKS_TOKEN and LOCAL_WAREHOUSE:
+        if flask.has_request_context():
+            return flask.request.headers.get('X-Forwarded-Access-Token') or LOCAL_WAREHOUSE_TOKEN
+        return LOCAL_WAREHOUSE_TOKEN
+
     if not DATABRICKS_TOKEN:
         print("DATABRICKS_TOKEN not set in environment variables, using on-behalf-of authentication.")
         DATABRICKS_TOKEN = flask.request.headers.get('X-Forwarded-Access-Token')
@@ -22,6 +65,7 @@ def get_databricks_server_hostname():
     DATABRICKS_SERVER_HOSTNAME = os.getenv("DATABRICKS_HOST")
     if not DATABRICKS_SERVER_HOSTNAME:
         print("DATABRICKS_SERVER_HOSTNAME not set in environment variables pulling from config.")
+        from databricks.sdk.core import Config
         cfg = Config()
         DATABRICKS_SERVER_HOSTNAME = cfg.host
     return DATABRICKS_SERVER_HOSTNAME
@@ -29,8 +73,12 @@ def get_databricks_server_hostname():
 def get_databricks_sp_token():
     DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN")
 
+    if not DATABRICKS_TOKEN and LOCAL_WAREHOUSE:
+        return LOCAL_WAREHOUSE_TOKEN
+
     if not DATABRICKS_TOKEN:
         print("DATABRICKS_TOKEN not set in environment variables, using SP authentication.")
+        import requests
         host = get_databricks_server_hostname()
         DATABRICKS_HOST = "https://" + host
         CLIENT_ID = os.getenv("DATABRICKS_CLIENT_ID")
@@ -56,20 +104,94 @@ def get_databricks_sp_token():
 
     return DATABRICKS_TOKEN
 
-def sqlQuery(query: str) -> pd.DataFrame:
-    """Execute a SQL query and return the result as a pandas DataFrame."""
-    # print("RUNNING QUERY:", query)
-    DATABRICKS_SERVER_HOSTNAME = get_databricks_server_hostname()
+def identity_key(token):
+    """Short, non-reversible key for an access token, so results are never shared across users"""
+    return hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:16]
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so formatting differences don't defeat coalescing"""
+    return " ".join(query.split())
+
+def sqlQuery(query: str) -> "pd.DataFrame":
+    """Execute a SQL query and return the result as a pandas DataFrame.
+
+    Concurrent callers with the same identity and normalized query wait on a single
+    execution and share its result. Inside a load job (see load_jobs.py) the statement
+    is cancelled on the warehouse when the job is cancelled.
+    """
+    check_cancelled()
     DATABRICKS_TOKEN = get_databricks_token()
+    key = (identity_key(DATABRICKS_TOKEN), normalize_query(query))
+    if LOCAL_WAREHOUSE:
+        from local_warehouse import run_query
+        return query_flights.do(key, run_query, query)
+    DATABRICKS_SERVER_HOSTNAME = get_databricks_server_hostname()
+    return query_flights.do(key, _execute_query, query, DATABRICKS_SERVER_HOSTNAME, DATABRICKS_TOKEN)
+
+def _execute_query(query: str, DATABRICKS_SERVER_HOSTNAME: str, DATABRICKS_TOKEN: str) -> "pd.DataFrame":
+    """Run a query on the SQL warehouse."""
+    import pandas as pd
+    from databricks import sql
+    # print("RUNNING QUERY:", query)
     with sql.connect(
         http_path=f"/sql/1.0/warehouses/{DATABRICKS_WAREHOUSE_ID}",
         server_hostname=DATABRICKS_SERVER_HOSTNAME,
         access_token=DATABRICKS_TOKEN
     ) as connection:
         print("CONNECTION MADE")
-        with connection.cursor() as cursor:
-            cursor.execute(query)
-            columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
+        with connection.cursor() as cursor, on_cancel(cursor.cancel):
+            try:
+                report_progress("Running query on the SQL warehouse")
+                cursor.execute(query)
+                columns = [desc[0] for desc in cursor.description]
+                rows = []
+                while True:
+                    chunk = cursor.fetchmany(FETCH_CHUNK_ROWS)
+                    if not chunk:
+                        break
+                    rows.extend(chunk)
+                    check_cancelled()
+                    report_progress(f"Fetched {len(rows):,} rows")
+            except JobCancelled:
+                raise
+            except Exception:
+                # A cancelled statement surfaces as a driver error; report it as a cancellation
+                check_cancelled()
+                raise
             df = pd.DataFrame(rows, columns=columns)
-        return df
\ No newline at end of file
+        return df
+
+def iter_arrow_batches(query: str, batch_rows: int = FETCH_CHUNK_ROWS):
+    """Execute a query and yield its result as pyarrow RecordBatches, one fetch at a time.
+
+    For streaming consumers (see export.py): results are neither coalesced nor
+    collected, so memory is bounded by one batch. At least one batch is yielded,
+    empty if there are no rows, so callers always see the schema.
+    """
+    check_cancelled()
+    if LOCAL_WAREHOUSE:
+        from local_warehouse import run_query_batches
+        yield from run_query_batches(query, batch_rows)
+        return
+    from databricks import sql
+    with sql.connect(
+        http_path=f"/sql/1.0/warehouses/{DATABRICKS_WAREHOUSE_ID}",
+        server_hostname=get_databricks_server_hostname(),
+        access_token=get_databricks_token()
+    ) as connection:
+        with connection.cursor() as cursor, on_cancel(cursor.cancel):
+            cursor.execute(query)
+            first = True
+            while True:
+                table = cursor.fetchmany_arrow(batch_rows)
+                if table.num_rows == 0:
+                    if first:
+                        yield from table.to_batches() or [_empty_batch(table.schema)]
+                    break
+                first = False
+                yield from table.to_batches()
+                check_cancelled()
+
+def _empty_batch(schema):
+    import pyarrow as pa
+    return pa.RecordBatch.from_pylist([], schema=schema)
@@ -0,0 +1,173 @@
+"""
+Server-side cache of loaded flight datasets
+Frames stay on the server keyed by their owner's identity and a hash of their
+filters; the browser only holds the dataset id, and lookups check its owner (see
+dataset_owner). Values derived from a frame (stats, map payloads, ...) are memoized
+on the same entry and evicted with it. Frames are also written to the host-wide
+frame store (frame_store.py): entries hold its memory-mapped copy, and a dataset
+another worker loaded is opened from there instead of being fetched again.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from frame_store import store_frame, open_frame, release_frame, is_shared
+
+# Number of datasets kept in memory per app instance
+MAX_CACHED_DATASETS = int(os.getenv("MAX_CACHED_DATASETS", "64"))
+
+# Memory budget for cached frames held privately by this worker (shared frames are
+# bounded by FRAME_STORE_MB); least recently used datasets are evicted beyond it
+DATASET_CACHE_MB = int(os.getenv("DATASET_CACHE_MB", "1024"))
+
+_datasets = OrderedDict()
+_datasets_lock = threading.Lock()
+
+
+def normalize_filters(callsigns=None, countries=None, start_date=None, end_date=None, **options):
+    """
+    Canonical form of a set of fetch filters, so equal requests hash equally
+
+    Args:
+        callsigns: List of callsigns (order and duplicates don't matter)
+        countries: List of origin countries (order and duplicates don't matter)
+        start_date: Start timestamp string
+        end_date: End timestamp string
+        **options: Other fetch options that change the result (e.g. dedup)
+
+    Returns:
+        dict of filters
+    """
+    return {
+        "callsigns": sorted(set(callsigns)) if callsigns else None,
+        "countries": sorted(set(countries)) if countries else None,
+        "start_date": start_date,
+        "end_date": end_date,
+        **{k: v for k, v in sorted(options.items()) if v is not None},
+    }
+
+
+def make_dataset_id(filters):
+    """Stable id for a normalized filter dict"""
+    encoded = json.dumps(filters, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def scoped_dataset_id(owner, filters):
+    """
+    Dataset id of filters loaded by owner
+
+    Args:
+        owner: identity_key of the loading user (or another fixed owner name)
+        filters: normalize_filters dict
+
+    Returns:
+        "<owner>-<filter hash>", so equal filters of different users never share an entry
+    """
+    return f"{owner}-{make_dataset_id(filters)}"
+
+
+def dataset_owner(dataset_id):
+    """Owner part of a scoped_dataset_id id, or None for an unscoped id"""
+    owner, sep, _ = str(dataset_id).rpartition("-")
+    return owner if sep else None
+
+
+def _insert(dataset_id, df, filters):
+    """Add an entry and evict beyond the limits; returns the entry's frame"""
+    shared = is_shared(dataset_id, df)
+    size = int(df.memory_usage(deep=True).sum())
+    evicted = []
+    with _datasets_lock:
+        _datasets[dataset_id] = {"df": df, "filters": filters, "artifacts": {}, "bytes": size, "shared": shared}
+        _datasets.move_to_end(dataset_id)
+        budget = DATASET_CACHE_MB * 1024 * 1024
+        # The newest dataset is always kept, even if it alone exceeds the budget
+        while len(_datasets) > 1 and (
+            len(_datasets) > MAX_CACHED_DATASETS
+            or sum(entry["bytes"] for entry in _datasets.values() if not entry["shared"]) > budget
+        ):
+            key, entry = _datasets.popitem(last=False)
+            if entry["shared"]:
+                evicted.append(key)
+    for key in evicted:
+        release_frame(key)
+    return df
+
+
+def _open_shared(dataset_id):
+    """Cache a frame another worker put in the frame store, or return None"""
+    df, filters = open_frame(dataset_id)
+    if df is None:
+        return None
+    return _insert(dataset_id, df, filters)
+
+
+def put_dataset(dataset_id, df, filters=None):
+    """
+    Store a frame (replacing any previous entry and its derived values)
+
+    Returns:
+        The frame the cache holds: the frame store's read-only mapping of df when
+        sharing is on, otherwise df itself
+    """
+    return _insert(dataset_id, store_frame(dataset_id, df, filters), filters)
+
+
+def get_dataset(dataset_id):
+    """Return the cached frame for dataset_id (opening it from the frame store if needed), or None"""
+    with _datasets_lock:
+        entry = _datasets.get(dataset_id)
+        if entry is not None:
+            _datasets.move_to_end(dataset_id)
+            return entry["df"]
+    return _open_shared(dataset_id)
+
+
+def get_artifact(dataset_id, name, build):
+    """
+    Memoize a value derived from a cached dataset
+
+    Args:
+        dataset_id: Id of a dataset stored with put_dataset
+        name: Artifact name (e.g. "stats")
+        build: Callable taking the frame and returning the value
+
+    Returns:
+        The cached or newly built value, or None if the dataset is not cached
+    """
+    with _datasets_lock:
+        entry = _datasets.get(dataset_id)
+        if entry is not None and name in entry["artifacts"]:
+            return entry["artifacts"][name]
+        df = entry["df"] if entry is not None else None
+    if df is None:
+        df = _open_shared(dataset_id)
+        if df is None:
+            return None
+
+    # Build outside the lock; concurrent builders just race to the same value
+    value = build(df)
+    with _datasets_lock:
+        entry = _datasets.get(dataset_id)
+        if entry is not None:
+            entry["artifacts"].setdefault(name, value)
+    return value
+
+
+def stats():
+    """Per-dataset memory report for monitoring"""
+    with _datasets_lock:
+        entries = [
+            {"dataset_id": dataset_id, "rows": len(entry["df"]), "bytes": entry["bytes"], "shared": entry["shared"]}
+            for dataset_id, entry in _datasets.items()
+        ]
+    return {
+        "datasets": len(entries),
+        "bytes": sum(e["bytes"] for e in entries),
+        "private_bytes": sum(e["bytes"] for e in entries if not e["shared"]),
+        "budget_bytes": DATASET_CACHE_MB * 1024 * 1024,
+        "entries": entries,
+    }
@@ -0,0 +1,225 @@
+"""
+Streaming bulk export
+/export/flights.parquet and /export/flights.arrow stream the rows behind a set of
+filters straight from the warehouse's Arrow batches into the response. Each batch is
+written as one Parquet row group (or Arrow IPC record batch) and sent before the
+next is fetched, so memory stays flat however many rows are exported.
+"""
+
+import os
+import threading
+from datetime import datetime
+import flask
+from databricks_utils import get_databricks_token, use_access_token, iter_arrow_batches
+from flight_queries import DEDUP_MODE, TIME_FORMAT, build_flight_query
+from server_metrics import register_metric_source
+
+EXPORT_ROUTE = "/export"
+
+# Rows per warehouse fetch, and so per Parquet row group / IPC batch
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "100000"))
+
+EXPORT_FORMATS = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Longest window one export may cover; start and end are both required
+EXPORT_MAX_HOURS = float(os.getenv("EXPORT_MAX_HOURS", "168"))
+
+# Accepted start/end formats (Eastern time); the page's datetime-local inputs omit seconds
+ARG_TIME_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M"]
+
+_counters = {"started": 0, "completed": 0, "failed": 0, "rows": 0, "bytes": 0}
+_counters_lock = threading.Lock()
+
+
+def _parse_time(value):
+    for fmt in ARG_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime(TIME_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError(f"invalid time {value!r}, expected YYYY-MM-DD HH:MM[:SS]")
+
+
+def _parse_list(args, name):
+    values = [v.strip() for arg in args.getlist(name) for v in arg.split(",") if v.strip()]
+    # Values are inlined into SQL by flight_queries.build_filter_clause
+    for value in values:
+        if "'" in value or "\\" in value:
+            raise ValueError(f"invalid {name} {value!r}")
+    return values or None
+
+
+def filters_from_args(args):
+    """
+    Read fetch filters from query parameters
+
+    callsign and country may repeat or hold comma-separated values; start and end
+    are Eastern times as 'YYYY-MM-DD HH:MM[:SS]' (a 'T' separator is accepted).
+
+    Args:
+        args: Request query parameters (flask.request.args)
+
+    Returns:
+        dict with callsigns, countries, start_date and end_date
+
+    Raises:
+        ValueError: a parameter is malformed
+    """
+    start = args.get("start")
+    end = args.get("end")
+    return {
+        "callsigns": _parse_list(args, "callsign"),
+        "countries": _parse_list(args, "country"),
+        "start_date": _parse_time(start) if start else None,
+        "end_date": _parse_time(end) if end else None,
+    }
+
+
+def check_export_window(filters):
+    """
+    Refuse exports that are unbounded or longer than EXPORT_MAX_HOURS
+
+    Args:
+        filters: Output of filters_from_args
+
+    Raises:
+        ValueError: start or end is missing, end is before start, or the window is too long
+    """
+    if not filters["start_date"] or not filters["end_date"]:
+        raise ValueError("start and end are required")
+    window = datetime.strptime(filters["end_date"], TIME_FORMAT) - datetime.strptime(filters["start_date"], TIME_FORMAT)
+    if window.total_seconds() < 0:
+        raise ValueError("end is before start")
+    if window.total_seconds() > EXPORT_MAX_HOURS * 3600:
+        raise ValueError(f"window is longer than {EXPORT_MAX_HOURS:g} hours; export it in parts")
+
+
+def export_url(fmt, filters):
+    """Export URL for a flight-data-store filter dict"""
+    from urllib.parse import urlencode
+    params = [("callsign", c) for c in filters.get("callsigns") or []]
+    params += [("country", c) for c in filters.get("countries") or []]
+    params += [(k, filters[key]) for k, key in (("start", "start_date"), ("end", "end_date")) if filters.get(key)]
+    return f"{EXPORT_ROUTE}/flights.{fmt}?{urlencode(params)}"
+
+
+class _ChunkSink:
+    """Write-only file object collecting what a writer produces until it is drained"""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _count(**deltas):
+    with _counters_lock:
+        for name, n in deltas.items():
+            _counters[name] += n
+
+
+def stream_export(fmt, token, callsigns=None, countries=None, start_date=None, end_date=None, dedup=DEDUP_MODE):
+    """
+    Generate an export file in chunks
+
+    Exports always read the raw table (with the configured dedup) in a single
+    query; the warehouse streams it, so there is nothing to gain from slicing. If
+    the client disconnects, closing the generator closes the warehouse cursor.
+
+    Args:
+        fmt: "parquet" or "arrow"
+        token: Access token to query with (the generator outlives the request)
+
+    Yields:
+        Bytes of the file, one chunk per warehouse batch
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    query = build_flight_query(
+        callsigns=callsigns,
+        countries=countries,
+        start_date=start_date,
+        end_date=end_date,
+        dedup=dedup
+    )
+    sink = _ChunkSink()
+    writer = None
+    _count(started=1)
+    try:
+        with use_access_token(token):
+            for batch in iter_arrow_batches(query, EXPORT_BATCH_ROWS):
+                if writer is None:
+                    schema = batch.schema
+                    if fmt == "parquet":
+                        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+                    else:
+                        writer = pa.ipc.new_stream(sink, schema)
+                elif batch.schema != schema and batch.num_rows:
+                    # Empty batches are not written (and a cast table of no rows has no batches)
+                    batch = pa.Table.from_batches([batch]).cast(schema).combine_chunks().to_batches()[0]
+                if batch.num_rows:
+                    writer.write_batch(batch)
+                chunk = sink.drain()
+                _count(rows=batch.num_rows, bytes=len(chunk))
+                if chunk:
+                    yield chunk
+        writer.close()
+        chunk = sink.drain()
+        _count(completed=1, bytes=len(chunk))
+        yield chunk
+    except Exception as e:
+        _count(failed=1)
+        print(f"Export failed: {e}")
+        raise
+
+
+def register_export_routes(server):
+    """
+    Serve streaming exports
+
+    Args:
+        server: Flask app (Dash's app.server)
+    """
+    @server.route(f"{EXPORT_ROUTE}/flights.<fmt>")
+    def export_flights(fmt):
+        if fmt not in EXPORT_FORMATS:
+            flask.abort(404)
+        try:
+            filters = filters_from_args(flask.request.args)
+            check_export_window(filters)
+        except ValueError as e:
+            flask.abort(400, description=str(e))
+
+        body = stream_export(fmt, get_databricks_token(), **filters)
+        stamp = filters["start_date"].replace(" ", "_").replace(":", "")
+        response = flask.Response(body, mimetype=EXPORT_FORMATS[fmt])
+        response.headers["Content-Disposition"] = f'attachment; filename="flights_{stamp}.{fmt}"'
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+
+def stats():
+    """Counters for monitoring"""
+    with _counters_lock:
+        return dict(_counters)
+
+
+register_metric_source("exports", stats)
@@ -0,0 +1,287 @@
+"""
+SQL builders for flight position queries
+"""
+
+import os
+from datetime import datetime, timedelta
+
+# Table configuration
+# TABLE_NAME = "justinm.geospatial.flights_states"
+TABLE_NAME = "justinm.opensky.ingest_flights"
+
+# Position rollups maintained by the bundle's rollup job (resources/rollup_jobs.yml):
+# one row per aircraft per bucket holding its last report in the bucket
+ROLLUP_1M_TABLE = os.getenv("ROLLUP_1M_TABLE", "justinm.opensky.flight_positions_1m")
+ROLLUP_10M_TABLE = os.getenv("ROLLUP_10M_TABLE", "justinm.opensky.flight_positions_10m")
+
+# Query sources, finest first: name -> (table, bucket seconds)
+QUERY_SOURCES = {
+    "raw": (TABLE_NAME, 0),
+    "1m": (ROLLUP_1M_TABLE, 60),
+    "10m": (ROLLUP_10M_TABLE, 600),
+}
+
+# Route long windows to the rollups (0 always reads the raw table)
+QUERY_ROLLUPS = os.getenv("QUERY_ROLLUPS", "1") == "1"
+
+# Positions per aircraft a window should keep; the coarsest source still giving this many is used
+ROLLUP_TARGET_POINTS = int(os.getenv("ROLLUP_TARGET_POINTS", "720"))
+
+# The rollups trail the raw table by up to one job run; ranges ending later read raw data
+ROLLUP_LAG_MINUTES = int(os.getenv("ROLLUP_LAG_MINUTES", "20"))
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# How to collapse repeated reports of the same position:
+#   "sql"   - keep one row per (icao24, time_position) in the warehouse with QUALIFY
+#   "local" - fetch everything and drop repeats in pandas
+#   "off"   - keep every heartbeat
+DEDUP_MODE = os.getenv("DEDUP_MODE", "sql").lower()
+
+# Sparse fetch: read one report per aircraft per this many seconds from the raw table
+# and interpolate between them when rendering (0 reads every report)
+SPARSE_FETCH_SECONDS = int(os.getenv("SPARSE_FETCH_SECONDS", "0"))
+
+# Shape filters for the table layout the bundle's maintenance job keeps
+# (resources/maintenance_jobs.yml): last_contact always bounded, sorted literal IN
+# lists, and rollup reads bounded on their clustering key. 0 emits the original predicates.
+SHAPE_PREDICATES = os.getenv("SHAPE_PREDICATES", "1") == "1"
+
+# Shaped queries missing a start read this many hours back from their end, and
+# queries missing an end read up to now, so no query scans the whole table
+OPEN_RANGE_HOURS = int(os.getenv("OPEN_RANGE_HOURS", "24"))
+
+# Column reporting how many raw rows collapsed into each deduplicated row
+DEDUP_COUNT_COLUMN = "reports_at_position"
+
+# OpenSky repeats time_position across last_contact heartbeats; rows without a
+# position time fall back to last_contact so they are never merged together
+POSITION_KEY = "icao24, COALESCE(time_position, last_contact)"
+
+
+def build_filter_clause(callsigns=None, countries=None, start_date=None, end_date=None, end_inclusive=True, bucket_seconds=0):
+    """
+    Build the " AND ..." predicates shared by every query over the position table
+
+    Every predicate compares a bare clustering column (last_contact, origin_country,
+    callsign) with constants, so file statistics can skip files that cannot match.
+
+    Args:
+        callsigns: List of callsigns to filter
+        countries: List of origin countries to filter
+        start_date: Start timestamp in Eastern time ('YYYY-MM-DD HH:MM:SS')
+        end_date: End timestamp in Eastern time ('YYYY-MM-DD HH:MM:SS')
+        end_inclusive: False for a half-open range (adjacent time slices don't overlap)
+        bucket_seconds: Bucket length of a rollup source; its bucket column (the
+            rollups' clustering key) is then bounded by the time range as well
+
+    Returns:
+        SQL fragment (empty string when there are no filters)
+    """
+    if SHAPE_PREDICATES:
+        return _shaped_filter_clause(callsigns, countries, start_date, end_date, end_inclusive, bucket_seconds)
+
+    clause = ""
+
+    # Add filters
+    if callsigns:
+        callsigns_str = ", ".join([f"'{cs}'" for cs in callsigns])
+        clause += f" AND callsign IN ({callsigns_str})"
+
+    if countries:
+        countries_str = ", ".join([f"'{c}'" for c in countries])
+        clause += f" AND origin_country IN ({countries_str})"
+
+    # Convert Eastern time input to UTC for filtering
+    if start_date:
+        clause += f" AND last_contact >= to_utc_timestamp('{start_date}', 'America/New_York')"
+
+    if end_date:
+        end_op = "<=" if end_inclusive else "<"
+        clause += f" AND last_contact {end_op} to_utc_timestamp('{end_date}', 'America/New_York')"
+
+    return clause
+
+
+def bounded_time_range(start_date=None, end_date=None):
+    """
+    Fill in the missing ends of a time range (see OPEN_RANGE_HOURS)
+
+    Args:
+        start_date: Start timestamp in Eastern time ('YYYY-MM-DD HH:MM:SS') or None
+        end_date: End timestamp in Eastern time ('YYYY-MM-DD HH:MM:SS') or None
+
+    Returns:
+        (start_date, end_date), both set
+    """
+    end_date = end_date or datetime.now().strftime(TIME_FORMAT)
+    if not start_date:
+        start = datetime.strptime(end_date, TIME_FORMAT) - timedelta(hours=OPEN_RANGE_HOURS)
+        start_date = start.strftime(TIME_FORMAT)
+    return start_date, end_date
+
+
+def _shaped_filter_clause(callsigns, countries, start_date, end_date, end_inclusive, bucket_seconds):
+    """
+    build_filter_clause for the clustered layout (see SHAPE_PREDICATES)
+
+    File skipping depends on what the predicates are, not their order: last_contact is
+    bounded on both ends, and every filter compares a bare clustering column with
+    constants or a literal IN list, never an expression over the column.
+    """
+    start_date, end_date = bounded_time_range(start_date, end_date)
+    start = f"to_utc_timestamp('{start_date}', 'America/New_York')"
+    end = f"to_utc_timestamp('{end_date}', 'America/New_York')"
+    end_op = "<=" if end_inclusive else "<"
+
+    clause = f" AND last_contact >= {start} AND last_contact {end_op} {end}"
+    if bucket_seconds:
+        # A row's bucket starts at most one bucket before its last_contact
+        clause += f" AND bucket > {start} - INTERVAL {int(bucket_seconds)} SECONDS AND bucket {end_op} {end}"
+
+    # Sorted, de-duplicated lists give identical filters identical query text, so
+    # the warehouse's result cache and query coalescing match them
+    if countries:
+        countries_str = ", ".join(f"'{c}'" for c in sorted(set(countries)))
+        clause += f" AND origin_country IN ({countries_str})"
+
+    if callsigns:
+        callsigns_str = ", ".join(f"'{cs}'" for cs in sorted(set(callsigns)))
+        clause += f" AND callsign IN ({callsigns_str})"
+
+    return clause
+
+
+def choose_source(start_date=None, end_date=None):
+    """
+    Pick the coarsest query source that still resolves the window
+
+    A window needs one position per window / ROLLUP_TARGET_POINTS seconds per
+    aircraft; short and open-ended windows read the raw table.
+
+    Args:
+        start_date: Start timestamp in Eastern time ('YYYY-MM-DD HH:MM:SS')
+        end_date: End timestamp in Eastern time ('YYYY-MM-DD HH:MM:SS')
+
+    Returns:
+        Key of QUERY_SOURCES
+    """
+    if not QUERY_ROLLUPS or not start_date or not end_date or ROLLUP_TARGET_POINTS <= 0:
+        return "raw"
+    window = datetime.strptime(end_date, TIME_FORMAT) - datetime.strptime(start_date, TIME_FORMAT)
+    needed = window.total_seconds() / ROLLUP_TARGET_POINTS
+    source = "raw"
+    for name, (_, bucket_seconds) in QUERY_SOURCES.items():
+        if bucket_seconds <= needed:
+            source = name
+    return source
+
+
+def rollup_covers(end_date):
+    """Whether the rollups are complete up to end_date (Eastern, as the app's clock)"""
+    if not end_date:
+        return False
+    end = datetime.strptime(end_date, TIME_FORMAT)
+    return end <= datetime.now() - timedelta(minutes=ROLLUP_LAG_MINUTES)
+
+
+def build_sample_condition(sample_seconds):
+    """QUALIFY condition keeping each aircraft's freshest position per sample_seconds bucket"""
+    return (
+        f"ROW_NUMBER() OVER (PARTITION BY icao24, FLOOR(unix_timestamp(last_contact) / {int(sample_seconds)}) "
+        f"ORDER BY COALESCE(time_position, last_contact) DESC, last_contact DESC) = 1"
+    )
+
+
+def build_flight_query(callsigns=None, countries=None, start_date=None, end_date=None, dedup=DEDUP_MODE, end_inclusive=True, source="raw", sample_seconds=0):
+    """
+    Build the position query for the given filters
+
+    Args:
+        callsigns: List of callsigns to filter
+        countries: List of origin countries to filter
+        start_date: Start timestamp in Eastern time ('YYYY-MM-DD HH:MM:SS')
+        end_date: End timestamp in Eastern time ('YYYY-MM-DD HH:MM:SS')
+        dedup: Dedup mode; "sql" pushes the dedup into the query
+        end_inclusive: False to exclude end_date (used for time slices)
+        source: Key of QUERY_SOURCES to read (see choose_source)
+        sample_seconds: Keep one report per aircraft per this many seconds (raw
+            source only; the rollups are already one row per bucket). Sampled rows
+            are one per bucket, so no dedup is applied.
+
+    Returns:
+        SQL query string
+    """
+    if source != "raw":
+        return build_rollup_query(callsigns, countries, start_date, end_date, end_inclusive, source)
+
+    if sample_seconds:
+        dedup = "off"
+
+    dedup_select = ""
+    if dedup == "sql":
+        dedup_select = f",\n            COUNT(*) OVER (PARTITION BY {POSITION_KEY}) as {DEDUP_COUNT_COLUMN}"
+
+    # Convert UTC timestamps to Eastern time for display
+    query = f"""
+        SELECT
+            icao24,
+            callsign,
+            origin_country,
+            from_utc_timestamp(time_position, 'America/New_York') as last_position,
+            from_utc_timestamp(last_contact, 'America/New_York') as timestamp,
+            longitude as lon,
+            latitude as lat{dedup_select}
+            -- geo_altitude as altitude
+            -- on_ground as onground,
+            -- velocity as groundspeed,
+            -- true_track as track,
+            -- vertical_rate,
+            -- squawk,
+            -- spi,
+            -- category as position_source
+        FROM {TABLE_NAME}
+        WHERE latitude IS NOT NULL
+          AND longitude IS NOT NULL
+    """
+
+    query += build_filter_clause(callsigns, countries, start_date, end_date, end_inclusive)
+
+    # Keep the first heartbeat that reported each position
+    if dedup == "sql":
+        query += f" QUALIFY ROW_NUMBER() OVER (PARTITION BY {POSITION_KEY} ORDER BY last_contact) = 1"
+    elif sample_seconds:
+        query += f" QUALIFY {build_sample_condition(sample_seconds)}"
+
+    query += " ORDER BY last_contact"
+
+    return query
+
+
+def build_rollup_query(callsigns=None, countries=None, start_date=None, end_date=None, end_inclusive=True, source="1m"):
+    """
+    Build the position query against a rollup table
+
+    Returns the same columns as build_flight_query. Rollup rows are already one
+    per aircraft per bucket, so no dedup is applied.
+    """
+    table = QUERY_SOURCES[source][0]
+    query = f"""
+        SELECT
+            icao24,
+            callsign,
+            origin_country,
+            from_utc_timestamp(time_position, 'America/New_York') as last_position,
+            from_utc_timestamp(last_contact, 'America/New_York') as timestamp,
+            longitude as lon,
+            latitude as lat
+        FROM {table}
+        WHERE latitude IS NOT NULL
+          AND longitude IS NOT NULL
+    """
+
+    query += build_filter_clause(callsigns, countries, start_date, end_date, end_inclusive,
+                                 bucket_seconds=QUERY_SOURCES[source][1])
+    query += " ORDER BY last_contact"
+
+    return query
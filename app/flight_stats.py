@@ -0,0 +1,182 @@
+"""
+Dataset statistics
+Counts, per-country breakdowns and time histograms come from one vectorized pass over
+the cached frame; altitude and speed distributions are aggregated in the warehouse so
+those columns never need to be fetched row by row.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from databricks_utils import sqlQuery
+from flight_queries import TABLE_NAME, build_filter_clause
+from trajectory import epoch_seconds
+import dataset_cache
+
+# Number of bars in the time histogram
+HISTOGRAM_BINS = int(os.getenv("STATS_HISTOGRAM_BINS", "48"))
+
+# Set to 0 to skip the warehouse aggregate query (altitude/speed stats become N/A)
+STATS_SQL_AGGREGATES = os.getenv("STATS_SQL_AGGREGATES", "1") == "1"
+
+QUANTILES = [0.1, 0.5, 0.9]
+
+
+def build_stats_query(callsigns=None, countries=None, start_date=None, end_date=None):
+    """
+    Build the aggregate query for altitude/speed distributions of airborne reports
+
+    Args:
+        callsigns: List of callsigns to filter
+        countries: List of origin countries to filter
+        start_date: Start timestamp in Eastern time
+        end_date: End timestamp in Eastern time
+
+    Returns:
+        SQL query string returning a single row
+    """
+    quantiles = ", ".join(str(q) for q in QUANTILES)
+    query = f"""
+        SELECT
+            COUNT(*) as raw_records,
+            COUNT(DISTINCT icao24) as aircraft,
+            AVG(geo_altitude) FILTER (WHERE NOT on_ground) as altitude_mean,
+            percentile_approx(geo_altitude, array({quantiles})) FILTER (WHERE NOT on_ground) as altitude_quantiles,
+            MAX(geo_altitude) as altitude_max,
+            AVG(velocity) FILTER (WHERE NOT on_ground) as speed_mean,
+            percentile_approx(velocity, array({quantiles})) FILTER (WHERE NOT on_ground) as speed_quantiles,
+            MAX(velocity) as speed_max
+        FROM {TABLE_NAME}
+        WHERE latitude IS NOT NULL
+          AND longitude IS NOT NULL
+    """
+    query += build_filter_clause(callsigns, countries, start_date, end_date)
+    return query
+
+
+def _distribution(mean, quantiles, maximum):
+    """Package a distribution, mapping missing values to None"""
+    def clean(value):
+        return None if value is None or pd.isna(value) else float(value)
+
+    quantiles = list(quantiles) if quantiles is not None else [None] * len(QUANTILES)
+    return {
+        "mean": clean(mean),
+        "p10": clean(quantiles[0]),
+        "p50": clean(quantiles[1]),
+        "p90": clean(quantiles[2]),
+        "max": clean(maximum),
+    }
+
+
+def fetch_sql_stats(filters):
+    """
+    Run the warehouse aggregate query for a dataset's filters
+
+    Args:
+        filters: Normalized filter dict (see dataset_cache.normalize_filters)
+
+    Returns:
+        dict with "aircraft", "raw_records", "altitude" and "speed" entries, or {} on failure
+    """
+    try:
+        query = build_stats_query(
+            callsigns=filters.get("callsigns"),
+            countries=filters.get("countries"),
+            start_date=filters.get("start_date"),
+            end_date=filters.get("end_date"),
+        )
+        print(f"Executing stats query: {query}")
+        df = sqlQuery(query)
+        if df.empty:
+            return {}
+        row = df.iloc[0]
+        return {
+            "aircraft": int(row["aircraft"]),
+            "raw_records": int(row["raw_records"]),
+            "altitude": _distribution(row["altitude_mean"], row["altitude_quantiles"], row["altitude_max"]),
+            "speed": _distribution(row["speed_mean"], row["speed_quantiles"], row["speed_max"]),
+        }
+    except Exception as e:
+        print(f"Error fetching stats: {e}")
+        return {}
+
+
+def _frame_distribution(series):
+    """Distribution of a numeric column from the cached frame"""
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return _distribution(None, None, None)
+    return _distribution(values.mean(), np.quantile(values, QUANTILES), values.max())
+
+
+def compute_frame_stats(df, bins=HISTOGRAM_BINS):
+    """
+    Compute counts, per-country breakdown and time histogram in one pass over a frame
+
+    Args:
+        df: Flight DataFrame (callsign, origin_country, timestamp, optional flight_id)
+        bins: Number of time histogram bins
+
+    Returns:
+        dict of statistics
+    """
+    flight_col = "flight_id" if "flight_id" in df.columns else "callsign"
+    t = epoch_seconds(df["timestamp"])
+
+    by_country = (
+        df.groupby("origin_country", sort=False, observed=True)
+        .agg(records=(flight_col, "size"), flights=(flight_col, "nunique"))
+        .sort_values("records", ascending=False)
+    )
+
+    counts, edges = np.histogram(t, bins=bins) if len(t) else (np.array([], dtype=np.int64), np.array([]))
+    bin_starts = pd.to_datetime(edges[:-1].astype(np.int64), unit="s").strftime("%Y-%m-%d %H:%M").tolist()
+
+    stats = {
+        "flights": int(df[flight_col].nunique()),
+        "aircraft": int(df["icao24"].nunique()) if "icao24" in df.columns else None,
+        "records": int(len(df)),
+        "countries": int(len(by_country)),
+        "by_country": [
+            {"country": country, "records": int(row.records), "flights": int(row.flights)}
+            for country, row in by_country.iterrows()
+        ],
+        "time_range": [
+            pd.to_datetime(int(t.min()), unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+            pd.to_datetime(int(t.max()), unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+        ] if len(t) else None,
+        "time_histogram": {"bin_starts": bin_starts, "counts": counts.tolist()},
+    }
+
+    # Use locally available kinematics when the frame has them
+    if "altitude" in df.columns:
+        stats["altitude"] = _frame_distribution(df["altitude"])
+    if "groundspeed" in df.columns:
+        stats["speed"] = _frame_distribution(df["groundspeed"])
+
+    return stats
+
+
+def get_dataset_stats(dataset_id, filters=None):
+    """
+    Statistics for a cached dataset, computed once and memoized with the dataset
+
+    Args:
+        dataset_id: Id of a dataset in dataset_cache
+        filters: Normalized filters used for the warehouse aggregates
+
+    Returns:
+        dict of statistics, or None if the dataset is not cached
+    """
+    def build(df):
+        stats = compute_frame_stats(df)
+        if STATS_SQL_AGGREGATES and filters is not None and not ("altitude" in stats and "speed" in stats):
+            sql_stats = fetch_sql_stats(filters)
+            for key in ("altitude", "speed", "raw_records"):
+                if key in sql_stats:
+                    stats.setdefault(key, sql_stats[key])
+        return stats
+
+    return dataset_cache.get_artifact(dataset_id, "stats", build)
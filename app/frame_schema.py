@@ -0,0 +1,83 @@
+"""
+Compact in-memory schema for flight frames
+Dimension columns become categoricals, coordinates float32 and times int64 epoch
+seconds (Eastern wall-clock, as returned by the queries). Frames are compacted once at
+fetch time, so every cached dataset, render and pickled pool job carries the small form.
+"""
+
+import numpy as np
+import pandas as pd
+from trajectory import epoch_seconds
+
+# Low-cardinality strings repeated on every report
+CATEGORY_COLUMNS = ["icao24", "callsign", "origin_country", "flight_id"]
+
+# float32 keeps ~1 m precision for coordinates
+FLOAT32_COLUMNS = ["lat", "lon", "altitude", "groundspeed", "track", "vertical_rate"]
+
+# Times stored as int64 epoch seconds; formatted only when rendered
+EPOCH_COLUMNS = ["timestamp", "last_position"]
+
+
+def compact_frame(df):
+    """
+    Convert a fetched frame to the compact schema
+
+    Missing position times fall back to the report time so they fit in int64.
+
+    Args:
+        df: Flight DataFrame with object strings, float64 coordinates and datetime columns
+
+    Returns:
+        New DataFrame with the same columns in compact dtypes
+    """
+    if df.empty:
+        return df
+
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORY_COLUMNS and not isinstance(series.dtype, pd.CategoricalDtype):
+            columns[col] = series.astype("category")
+        elif col in FLOAT32_COLUMNS and series.dtype != np.float32:
+            columns[col] = pd.to_numeric(series, errors="coerce").astype(np.float32)
+        elif col in EPOCH_COLUMNS and not pd.api.types.is_integer_dtype(series):
+            if col != "timestamp" and "timestamp" in df.columns:
+                series = pd.to_datetime(series).fillna(pd.to_datetime(df["timestamp"]))
+            columns[col] = epoch_seconds(series)
+        else:
+            columns[col] = series
+
+    compact = pd.DataFrame(columns, index=df.index)
+    compact.attrs.update(df.attrs)
+    return compact
+
+
+def format_epoch(values, fmt="%Y-%m-%d %H:%M:%S"):
+    """Format int64 epoch seconds as timestamp strings (for Kepler and exports)"""
+    return pd.to_datetime(pd.Series(values), unit="s").dt.strftime(fmt)
+
+
+def memory_report(df):
+    """
+    Memory used by a frame
+
+    Returns:
+        dict with rows, total bytes, bytes per row and bytes per column
+    """
+    usage = df.memory_usage(deep=True, index=True)
+    total = int(usage.sum())
+    return {
+        "rows": int(len(df)),
+        "bytes": total,
+        "bytes_per_row": round(total / len(df), 1) if len(df) else 0,
+        "columns": {str(col): int(n) for col, n in usage.items()},
+    }
+
+
+def format_bytes(n):
+    """Human-readable size, e.g. '3.2 MB'"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
@@ -0,0 +1,230 @@
+"""
+Host-wide store of cached frames, shared by worker processes
+Each cached dataset is written once to FRAME_STORE_DIR as an uncompressed Arrow IPC
+file and memory-mapped read-only by every worker that holds it, so its numeric
+columns live once in the host's page cache instead of once per worker and opening
+it elsewhere costs no fetch and no copy. Workers record which files they hold with
+per-process reference markers; once the store is over FRAME_STORE_MB, the least
+recently used files nobody holds are deleted. Deleting a mapped file is safe: its
+mappings stay valid until the last holder lets go.
+
+Frames from the store are read-only: replace columns rather than writing into them.
+"""
+
+import os
+import json
+import tempfile
+import threading
+import weakref
+from server_metrics import register_metric_source
+
+# Shared by all worker processes on the host
+FRAME_STORE_DIR = os.getenv("FRAME_STORE_DIR", os.path.join(tempfile.gettempdir(), "flight-tracker-frames"))
+
+# Size the store is pruned back to (files still held by a worker are kept)
+FRAME_STORE_MB = int(os.getenv("FRAME_STORE_MB", "4096"))
+
+# Set to 0 to keep every cached frame private to its worker
+SHARED_FRAMES = os.getenv("SHARED_FRAMES", "1") == "1"
+
+# Schema metadata key carrying df.attrs and the dataset's filters
+METADATA_KEY = b"flight_tracker"
+
+# Frames this process mapped, so storing one again is a no-op
+_mapped = weakref.WeakValueDictionary()
+_held = {}
+_lock = threading.Lock()
+_counters = {"written": 0, "opened": 0, "pruned": 0, "failed": 0}
+
+
+def _path(key):
+    return os.path.join(FRAME_STORE_DIR, f"{key}.arrow")
+
+
+def _ref_path(key, holder):
+    return os.path.join(FRAME_STORE_DIR, "refs", f"{key}.{os.getpid()}.{holder}")
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def _write(key, df, filters):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = json.dumps({"attrs": df.attrs, "filters": filters}, default=str).encode("utf-8")
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: metadata})
+    os.makedirs(FRAME_STORE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=FRAME_STORE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        # Uncompressed, so readers can map the buffers as they are
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        # Workers that mapped an older file for the key keep reading it
+        os.replace(tmp_path, _path(key))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    _count("written")
+
+
+def _map(key):
+    """Memory-map a stored frame; numeric columns without nulls are zero-copy views"""
+    import pyarrow as pa
+    source = pa.memory_map(_path(key), "r")
+    table = pa.ipc.open_file(source).read_all()
+    meta = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+    df = table.to_pandas(split_blocks=True)
+    df.attrs = meta.get("attrs", {})
+    _mapped[key] = df
+    return df, meta.get("filters")
+
+
+def store_frame(key, df, filters=None, holder="datasets"):
+    """
+    Write a frame to the store and return its memory-mapped replacement
+
+    Args:
+        key: Dataset id
+        df: Frame to share (returned as is if it already is the mapping for key)
+        filters: JSON-serializable filters kept with the frame
+        holder: Name of the cache that holds it in this process (see release_frame)
+
+    Returns:
+        Read-only frame backed by the store, or df itself if sharing is off, the
+        frame is empty or the write failed
+    """
+    if not SHARED_FRAMES or df.empty:
+        return df
+    try:
+        if not is_shared(key, df):
+            _write(key, df, filters)
+            df, _ = _map(key)
+        _acquire(key, holder)
+    except Exception as e:
+        _count("failed")
+        print(f"Could not share frame {key}: {e}")
+        return df
+    _prune()
+    return df
+
+
+def open_frame(key, holder="datasets"):
+    """
+    Map a frame another worker stored
+
+    Returns:
+        (frame, filters), or (None, None) if the store does not have it
+    """
+    if not SHARED_FRAMES or not os.path.exists(_path(key)):
+        return None, None
+    try:
+        df = _mapped.get(key)
+        filters = None
+        if df is None:
+            df, filters = _map(key)
+        _acquire(key, holder)
+        os.utime(_path(key))
+    except Exception as e:
+        _count("failed")
+        print(f"Could not open shared frame {key}: {e}")
+        return None, None
+    _count("opened")
+    return df, filters
+
+
+def is_shared(key, df):
+    """Whether df is this process's mapping of the stored frame for key"""
+    return _mapped.get(key) is df
+
+
+def _acquire(key, holder):
+    with _lock:
+        _held[(key, holder)] = True
+    os.makedirs(os.path.join(FRAME_STORE_DIR, "refs"), exist_ok=True)
+    with open(_ref_path(key, holder), "w"):
+        pass
+
+
+def release_frame(key, holder="datasets"):
+    """Drop this process's hold on a stored frame (e.g. on cache eviction)"""
+    with _lock:
+        if _held.pop((key, holder), None) is None:
+            return
+    try:
+        os.remove(_ref_path(key, holder))
+    except OSError:
+        pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _live_refs():
+    """Keys held by a running process; markers left by dead workers are removed"""
+    held = set()
+    refs_dir = os.path.join(FRAME_STORE_DIR, "refs")
+    for name in os.listdir(refs_dir) if os.path.isdir(refs_dir) else []:
+        key, pid, _ = name.rsplit(".", 2)
+        if _pid_alive(int(pid)):
+            held.add(key)
+        else:
+            try:
+                os.remove(os.path.join(refs_dir, name))
+            except OSError:
+                pass
+    return held
+
+
+def _prune():
+    """Delete least recently used unheld files until the store fits FRAME_STORE_MB"""
+    try:
+        files = [
+            (entry.stat().st_mtime, entry.stat().st_size, entry.name[:-len(".arrow")], entry.path)
+            for entry in os.scandir(FRAME_STORE_DIR)
+            if entry.name.endswith(".arrow")
+        ]
+        total = sum(size for _, size, _, _ in files)
+        budget = FRAME_STORE_MB * 1024 * 1024
+        if total <= budget:
+            return
+        held = _live_refs()
+        for _, size, key, path in sorted(files):
+            if total <= budget:
+                break
+            if key in held:
+                continue
+            os.remove(path)
+            total -= size
+            _count("pruned")
+    except OSError as e:
+        print(f"Could not prune frame store: {e}")
+
+
+def stats():
+    """Store size and counters for monitoring"""
+    try:
+        files = [entry.stat().st_size for entry in os.scandir(FRAME_STORE_DIR) if entry.name.endswith(".arrow")]
+    except OSError:
+        files = []
+    with _lock:
+        return {
+            "enabled": SHARED_FRAMES,
+            "files": len(files),
+            "bytes": sum(files),
+            "budget_bytes": FRAME_STORE_MB * 1024 * 1024,
+            "held_here": len(_held),
+            **_counters,
+        }
+
+
+register_metric_source("frame_store", stats)
@@ -0,0 +1,25 @@
+"""
+Gunicorn configuration for production serving
+Usage (from app/): gunicorn -c gunicorn.conf.py app:server
+
+Each worker is a separate process with its own request threads; CPU-heavy rendering is
+handed to render_pool's process pool, so a big render never blocks the worker's threads.
+"""
+
+import os
+
+# Databricks Apps provides the port in DATABRICKS_APP_PORT
+bind = f"0.0.0.0:{os.getenv('DATABRICKS_APP_PORT') or os.getenv('PORT') or '8000'}"
+
+# Threaded workers: callbacks mostly wait on the SQL warehouse
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Large warehouse queries can take a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
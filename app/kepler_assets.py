@@ -0,0 +1,203 @@
+"""
+Self-hosted Kepler.gl / React assets
+Vendors the map's JS/CSS bundles next to the app and serves them from Flask with
+content-hashed URLs, long-lived cache headers and precompressed variants.
+
+Usage:
+    python kepler_assets.py    # download bundles into app/vendor/ (run before deploy)
+"""
+
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+import flask
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+VENDOR_DIR = os.path.join(APP_DIR, "vendor")
+STATIC_DIR = os.path.join(APP_DIR, "static")
+
+# URL prefix the hashed assets are served under
+ASSET_ROUTE = "/kepler-assets"
+
+# Hashed URLs never change content, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Third-party bundles in load order (same set keplergl's HTML export pulls from CDNs)
+VENDOR_ASSETS = [
+    ("uber-fonts.css", "https://d1a3f4spazzrp4.cloudfront.net/kepler.gl/uber-fonts/4.0.0/superfine.css"),
+    ("mapbox-gl.css", "https://api.tiles.mapbox.com/mapbox-gl-js/v1.1.1/mapbox-gl.css"),
+    ("react.production.min.js", "https://unpkg.com/react@17.0.2/umd/react.production.min.js"),
+    ("react-dom.production.min.js", "https://unpkg.com/react-dom@17.0.2/umd/react-dom.production.min.js"),
+    ("redux.js", "https://unpkg.com/redux@3.7.2/dist/redux.js"),
+    ("react-redux.min.js", "https://unpkg.com/react-redux@7.1.3/dist/react-redux.min.js"),
+    ("react-intl.min.js", "https://unpkg.com/react-intl@3.12.0/dist/react-intl.min.js"),
+    ("react-copy-to-clipboard.min.js", "https://unpkg.com/react-copy-to-clipboard@5.0.2/build/react-copy-to-clipboard.min.js"),
+    ("styled-components.min.js", "https://unpkg.com/styled-components@4.1.3/dist/styled-components.min.js"),
+    ("keplergl.min.js", "https://unpkg.com/kepler.gl@2.5.5/umd/keplergl.min.js"),
+]
+
+# App-owned scripts shipped in app/static/
+STATIC_ASSETS = ["kepler_shell.js"]
+
+# Encodings in order of preference, with the file suffix of the precompressed variant
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def _compress_variants(path):
+    """Write .gz (and .br when brotli is installed) next to an asset if missing or stale"""
+    with open(path, "rb") as f:
+        content = f.read()
+    mtime = os.path.getmtime(path)
+
+    gz_path = path + ".gz"
+    if not os.path.exists(gz_path) or os.path.getmtime(gz_path) < mtime:
+        with open(gz_path, "wb") as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+
+    br_path = path + ".br"
+    if brotli is not None and (not os.path.exists(br_path) or os.path.getmtime(br_path) < mtime):
+        with open(br_path, "wb") as f:
+            f.write(brotli.compress(content, quality=11))
+
+    return content
+
+
+def _hashed_name(name, content):
+    """Insert a short content hash before the extension: keplergl.min.js -> keplergl.min.<hash>.js"""
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def _build_manifest():
+    """Map asset names to hashed URLs and hashed file names to paths on disk"""
+    urls = {}
+    files = {}
+    missing = []
+
+    sources = [(name, os.path.join(VENDOR_DIR, name), cdn_url) for name, cdn_url in VENDOR_ASSETS]
+    sources += [(name, os.path.join(STATIC_DIR, name), None) for name in STATIC_ASSETS]
+
+    for name, path, cdn_url in sources:
+        if not os.path.exists(path):
+            # Not vendored: fall back to the public CDN so online deployments keep working
+            urls[name] = cdn_url
+            missing.append(name)
+            continue
+        try:
+            content = _compress_variants(path)
+        except OSError as e:
+            print(f"Could not precompress {path}: {e}")
+            with open(path, "rb") as f:
+                content = f.read()
+        hashed = _hashed_name(name, content)
+        urls[name] = f"{ASSET_ROUTE}/{hashed}"
+        files[hashed] = path
+
+    if missing:
+        print(f"Kepler assets not vendored, using CDN for: {', '.join(missing)}. Run `python kepler_assets.py` to vendor them.")
+
+    return {"urls": urls, "files": files}
+
+
+def get_manifest():
+    """Return the asset manifest, building it on first use"""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = _build_manifest()
+    return _manifest
+
+
+def asset_url(name):
+    """URL for an asset: the content-hashed local route, or the CDN when not vendored"""
+    return get_manifest()["urls"].get(name)
+
+
+def stylesheet_urls():
+    """Vendored stylesheet URLs in load order"""
+    return [asset_url(name) for name, _ in VENDOR_ASSETS if name.endswith(".css")]
+
+
+def script_urls():
+    """Vendored script URLs in load order"""
+    return [asset_url(name) for name, _ in VENDOR_ASSETS if name.endswith(".js")]
+
+
+def _accepted_encodings():
+    """Content codings the current request accepts"""
+    header = flask.request.headers.get("Accept-Encoding", "")
+    return {part.split(";")[0].strip().lower() for part in header.split(",") if part.strip()}
+
+
+def register_asset_routes(server):
+    """
+    Serve hashed assets from the Flask server
+
+    Args:
+        server: Flask app (Dash's app.server)
+    """
+    @server.route(f"{ASSET_ROUTE}/<path:filename>")
+    def kepler_asset(filename):
+        path = get_manifest()["files"].get(filename)
+        if path is None:
+            flask.abort(404)
+
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        accepted = _accepted_encodings()
+        encoding = None
+        for coding, suffix in ENCODINGS:
+            if coding in accepted and os.path.exists(path + suffix):
+                path, encoding = path + suffix, coding
+                break
+
+        response = flask.send_file(path, mimetype=mimetype, conditional=True, etag=True)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def download_vendor_assets():
+    """
+    Download the third-party bundles into app/vendor/ and precompress them
+
+    Returns:
+        List of asset names that could not be downloaded
+    """
+    import requests
+
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    failed = []
+    for name, cdn_url in VENDOR_ASSETS:
+        path = os.path.join(VENDOR_DIR, name)
+        print(f"Downloading {cdn_url}")
+        try:
+            response = requests.get(cdn_url, timeout=60)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"  failed: {e}")
+            failed.append(name)
+            continue
+        with open(path, "wb") as f:
+            f.write(response.content)
+        _compress_variants(path)
+        print(f"  -> {path} ({len(response.content) / 1024:.0f} KB)")
+    return failed
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(1 if download_vendor_assets() else 0)
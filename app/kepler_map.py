@@ -0,0 +1,260 @@
+"""
+Kepler.gl map payload builder
+Pure pandas/JSON work with no Dash or Flask state, so it can run in the render
+process pool.
+"""
+
+import os
+import json
+import pandas as pd
+from frame_schema import EPOCH_COLUMNS, format_epoch
+from transport import encode_frame
+
+# "delta": compact columnar encoding decoded by the map shell (see transport.py)
+# "json": pandas split orientation with formatted timestamps
+TRANSPORT_ENCODING = os.getenv("TRANSPORT_ENCODING", "delta").lower()
+
+
+def build_map_payload(df, encoding=TRANSPORT_ENCODING, trips_json=None, tiles=None):
+    """
+    Build the Kepler.gl payload (dataset + config) for flight path animation
+    
+    Args:
+        df: pandas DataFrame with flight data (must have lat, lon, timestamp columns)
+        encoding: "delta" or "json" dataset encoding
+        trips_json: Optional trip GeoJSON (see trips.py) for the trip layer
+        tiles: Optional tile manifest (see tiles.tile_source); the point dataset is
+            then left empty for the map shell to fill from vector tiles
+    
+    Returns:
+        JSON string {"datasets": [...], "config": ..., "options": ...}
+    """
+    if tiles:
+        data_json = json.dumps({"columns": tiles["columns"], "data": []})
+        return assemble_map_payload(data_json, trips_json=trips_json, tiles=tiles)
+    if encoding == "delta":
+        data_json = json.dumps(encode_frame(df), separators=(",", ":"))
+    else:
+        data_json = split_data_json(df)
+    return assemble_map_payload(data_json, trips_json=trips_json)
+
+
+def assemble_map_payload(data_json, stream=None, trips_json=None, tiles=None):
+    """
+    Wrap an encoded flight dataset with the animation config
+    
+    Args:
+        data_json: Serialized dataset (encode_frame or split orientation)
+        stream: Optional time-chunk manifest for the map shell (see time_chunks.py)
+        trips_json: Optional trip GeoJSON; when given the trip layer draws it instead
+            of assembling paths from the position rows
+        tiles: Optional tile manifest for the map shell (see tiles.py)
+    
+    Returns:
+        JSON string {"datasets": [...], "config": ..., "options": ...[, "stream": ...][, "tiles": ...]}
+    """
+    # Configure the map for trip/path visualization with animation
+    config = {
+        'version': 'v1',
+        'config': {
+            'visState': {
+                'filters': [
+                    {
+                        'dataId': ['flight_paths'],
+                        'id': 'time_filter',
+                        'name': ['timestamp'],
+                        'type': 'timeRange',
+                        'enlarged': True,
+                        'plotType': 'histogram',
+                        'animationWindow': 'free',
+                        'speed': 1
+                    }
+                ],
+                'layers': [
+                    {
+                        'type': 'trip',
+                        'config': {
+                            'dataId': 'flight_paths',
+                            'label': 'Flight Paths',
+                            'color': [18, 147, 154],
+                            'columns': {
+                                'lat': 'lat',
+                                'lng': 'lon',
+                                'timestamp': 'timestamp'
+                            },
+                            'isVisible': True,
+                            'visConfig': {
+                                'opacity': 0.8,
+                                'thickness': 3,
+                                'trailLength': 180,
+                                'colorRange': {
+                                    'name': 'Global Warming',
+                                    'type': 'sequential',
+                                    'category': 'Uber',
+                                    'colors': [
+                                        '#5A1846',
+                                        '#900C3F',
+                                        '#C70039',
+                                        '#E3611C',
+                                        '#F1920E',
+                                        '#FFC300'
+                                    ]
+                                }
+                            }
+                        }
+                    },
+                    {
+                        'type': 'point',
+                        'config': {
+                            'dataId': 'flight_paths',
+                            'label': 'Aircraft Points',
+                            'color': [255, 203, 153],
+                            'columns': {
+                                'lat': 'lat',
+                                'lng': 'lon',
+                                'altitude': 'altitude'
+                            },
+                            'isVisible': True,
+                            'visConfig': {
+                                'radius': 5,
+                                'opacity': 0.6,
+                                'radiusRange': [0, 50],
+                                'colorRange': {
+                                    'name': 'Global Warming',
+                                    'type': 'sequential',
+                                    'category': 'Uber',
+                                    'colors': [
+                                        '#5A1846',
+                                        '#900C3F',
+                                        '#C70039',
+                                        '#E3611C',
+                                        '#F1920E',
+                                        '#FFC300'
+                                    ]
+                                },
+                                'filled': True
+                            }
+                        }
+                    }
+                ],
+                'interactionConfig': {
+                    'tooltip': {
+                        'fieldsToShow': {
+                            'flight_paths': [
+                                {'name': 'callsign', 'format': None},
+                                {'name': 'flight_id', 'format': None},
+                                {'name': 'origin_country', 'format': None},
+                                {'name': 'altitude', 'format': None},
+                                {'name': 'groundspeed', 'format': None},
+                                {'name': 'track', 'format': None},
+                                {'name': 'timestamp', 'format': None}
+                            ]
+                        },
+                        'enabled': True
+                    }
+                }
+            },
+            'mapState': {
+                'bearing': 0,
+                'dragRotate': False,
+                'latitude': 38.6274,
+                'longitude': -90.1982,
+                'pitch': 0,
+                'zoom': 4,
+                'isSplit': False,
+                "isViewportSynced": True,
+            },
+            'mapStyle': {
+                'styleType': 'dark',
+                'topLayerGroups': {},
+                'visibleLayerGroups': {
+                    'label': True,
+                    'road': True,
+                    'border': False,
+                    'building': True,
+                    'water': True,
+                    'land': True,
+                    '3d building': False
+                }
+            }
+        }
+    }
+    
+    trips_dataset = ''
+    if trips_json:
+        # Trip layer draws the prebuilt paths instead of grouping position rows in the browser
+        trip_layer = config['config']['visState']['layers'][0]['config']
+        trip_layer['dataId'] = 'flight_trips'
+        trip_layer['columns'] = {'geojson': '_geojson'}
+        config['config']['visState']['interactionConfig']['tooltip']['fieldsToShow']['flight_trips'] = [
+            {'name': 'callsign', 'format': None},
+            {'name': 'flight_id', 'format': None},
+            {'name': 'origin_country', 'format': None},
+            {'name': 'icao24', 'format': None}
+        ]
+        trips_dataset = ', {"info": {"id": "flight_trips", "label": "flight_trips"}, "data": ' + trips_json + '}'
+    
+    if tiles:
+        # Points come from vector tiles, which carry only these columns
+        config['config']['visState']['interactionConfig']['tooltip']['fieldsToShow']['flight_paths'] = [
+            {'name': name, 'format': None} for name in tiles['columns'] if name not in ('lat', 'lon')
+        ]
+    
+    # Ship data and config as one JSON payload fetched by the map shell;
+    # the iframe document itself stays a small, cacheable shell
+    payload_json = (
+        '{"datasets": [{"info": {"id": "flight_paths", "label": "flight_paths"}, "data": '
+        + data_json
+        + '}' + trips_dataset + '], "config": ' + json.dumps(config)
+        + ', "options": {"readOnly": false, "centerMap": false}'
+        + (', "stream": ' + json.dumps(stream) if stream else '')
+        + (', "tiles": ' + json.dumps(tiles) if tiles else '')
+        + '}'
+    )
+    return payload_json
+
+
+def split_data_json(df):
+    """
+    Serialize a frame in pandas' split orientation with Kepler-readable timestamps
+    
+    Args:
+        df: pandas DataFrame with flight data
+    
+    Returns:
+        JSON string {"columns": [...], "data": [[...], ...]}
+    """
+    # Make a copy to avoid modifying the original
+    df = df.copy()
+    
+    # Compact frames hold times as epoch seconds
+    for col in EPOCH_COLUMNS:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = format_epoch(df[col]).to_numpy()
+    
+    # CRITICAL: Convert timestamp to string format that Kepler understands
+    # This must be done before passing to Kepler.gl
+    if 'timestamp' in df.columns:
+        # Check if it's already a string
+        if df['timestamp'].dtype != 'object' or not isinstance(df['timestamp'].iloc[0], str):
+            # Convert pandas timestamps to string
+            if pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+                df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            else:
+                # Handle object dtype with Timestamp objects
+                df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    
+    # Convert any other timestamp columns
+    for col in df.columns:
+        if col != 'timestamp' and ('time' in col.lower() or 'date' in col.lower()):
+            try:
+                if pd.api.types.is_datetime64_any_dtype(df[col]):
+                    df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+                elif df[col].dtype == 'object' and len(df[col].dropna()) > 0:
+                    sample_val = df[col].dropna().iloc[0]
+                    if hasattr(sample_val, 'strftime'):
+                        df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
+            except:
+                pass  # If conversion fails, leave as is
+    
+    return df.to_json(orient='split', index=False)
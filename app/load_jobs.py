@@ -0,0 +1,302 @@
+"""
+Cancellable background load jobs
+Long data loads run on job threads instead of inside the Dash callback. The page polls
+a job for progress, and starting a new load cancels the one it supersedes, including
+the warehouse statement it is running (see databricks_utils._execute_query).
+
+Job state is mirrored to JOB_DIR so a poll or cancel that lands on another gunicorn
+worker still finds the job; each worker watches for cancel markers on its own jobs.
+"""
+
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+import traceback
+from contextlib import contextmanager
+
+# Shared by all worker processes on the host
+JOB_DIR = os.getenv("JOB_DIR", os.path.join(tempfile.gettempdir(), "flight-tracker-jobs"))
+
+# Finished job files older than this are removed
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+# How often a worker checks for cancel requests made on other workers
+CANCEL_POLL_SECONDS = 0.5
+
+_current = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled"""
+
+
+class CancelToken:
+    """Cancellation flag plus callbacks that abort blocking work (e.g. cursor.cancel)"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback failed: {e}")
+
+    def add_callback(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+            run_now = self._event.is_set()
+        if run_now:
+            callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def check_cancelled():
+    """Raise JobCancelled if the job running on this thread has been cancelled"""
+    job = getattr(_current, "job", None)
+    if job is not None and job.token.cancelled:
+        raise JobCancelled(f"job {job.job_id} cancelled")
+
+
+@contextmanager
+def on_cancel(callback):
+    """Call callback if the current job is cancelled while the block runs"""
+    job = getattr(_current, "job", None)
+    if job is None:
+        yield
+        return
+    job.token.add_callback(callback)
+    try:
+        yield
+    finally:
+        job.token.remove_callback(callback)
+
+
+def report_progress(text):
+    """Publish a progress message for the job running on this thread (no-op elsewhere)"""
+    job = getattr(_current, "job", None)
+    if job is not None and not getattr(_current, "quiet", False):
+        job.set_progress(text)
+
+
+def bind_job(fn, progress=True):
+    """
+    Wrap fn so it runs as part of the calling thread's job on another thread
+    (cancellation applies to it; its progress messages are dropped unless progress=True)
+    """
+    job = getattr(_current, "job", None)
+
+    def run(*args, **kwargs):
+        previous = getattr(_current, "job", None), getattr(_current, "quiet", False)
+        _current.job, _current.quiet = job, not progress
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.job, _current.quiet = previous
+
+    return run
+
+
+class Job:
+    """One background load"""
+
+    def __init__(self, manager, job_id):
+        self.manager = manager
+        self.job_id = job_id
+        self.token = CancelToken()
+        self.state = "running"
+        self.progress = "Starting"
+        self.result = None
+        self.error = None
+        self.started_at = time.time()
+
+    def snapshot(self):
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "elapsed": round(time.time() - self.started_at, 1),
+        }
+
+    def set_progress(self, text):
+        self.progress = text
+        self.manager._persist(self)
+
+
+class JobManager:
+    """
+    Run functions on background threads with progress, polling and cancellation
+
+    Example:
+        jobs = JobManager("load")
+        job_id = jobs.submit(load, filters, supersedes=previous_job_id)
+        jobs.status(job_id)   # {"state": "running", "progress": "Fetched 200,000 rows", ...}
+    """
+
+    def __init__(self, name, job_dir=JOB_DIR):
+        self.name = name
+        self.job_dir = job_dir
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._counters = {"submitted": 0, "completed": 0, "cancelled": 0, "failed": 0}
+
+    def submit(self, fn, *args, supersedes=None, **kwargs):
+        """
+        Start fn(*args, **kwargs) on a job thread and return its job id
+
+        Args:
+            fn: Function to run; its return value must be JSON-serializable
+            supersedes: Job id to cancel first (the load this one replaces)
+        """
+        if supersedes:
+            self.cancel(supersedes)
+
+        job = Job(self, uuid.uuid4().hex)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._counters["submitted"] += 1
+        self._persist(job)
+        self._prune_files()
+
+        thread = threading.Thread(target=self._run, args=(job, fn, args, kwargs), name=f"{self.name}-{job.job_id[:8]}", daemon=True)
+        thread.start()
+        self._start_watcher()
+        return job.job_id
+
+    def _run(self, job, fn, args, kwargs):
+        _current.job = job
+        try:
+            job.result = fn(*args, **kwargs)
+            job.state = "cancelled" if job.token.cancelled else "done"
+        except JobCancelled:
+            job.state = "cancelled"
+        except Exception as e:
+            if job.token.cancelled:
+                job.state = "cancelled"
+            else:
+                print(f"[{self.name}] job {job.job_id} failed: {e}")
+                traceback.print_exc()
+                job.state = "failed"
+                job.error = str(e)
+        finally:
+            _current.job = None
+
+        if job.state == "cancelled":
+            job.result = None
+            job.progress = "Cancelled"
+            print(f"[{self.name}] job {job.job_id} cancelled after {time.time() - job.started_at:.1f}s")
+        # Persist before dropping the in-memory job so polls never see a stale state
+        self._persist(job)
+        self._remove_cancel_marker(job.job_id)
+        counter = {"done": "completed", "cancelled": "cancelled", "failed": "failed"}[job.state]
+        with self._lock:
+            self._counters[counter] += 1
+            self._jobs.pop(job.job_id, None)
+
+    def cancel(self, job_id):
+        """Cancel a job, whichever worker process is running it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.token.cancel()
+            return
+        # Possibly running on another worker: leave a marker for its watcher
+        try:
+            path = self._path(job_id, ".cancel")
+            if path and os.path.exists(self._path(job_id)):
+                open(path, "w").close()
+        except OSError as e:
+            print(f"[{self.name}] could not request cancel of {job_id}: {e}")
+
+    def status(self, job_id):
+        """Latest snapshot of a job, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        path = self._path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {"running": len(self._jobs), **self._counters}
+
+    def _path(self, job_id, suffix=".json"):
+        if not job_id or not str(job_id).isalnum():
+            return None
+        return os.path.join(self.job_dir, f"{job_id}{suffix}")
+
+    def _persist(self, job):
+        """Write a job snapshot atomically so other workers can read it"""
+        try:
+            os.makedirs(self.job_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.job_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(job.snapshot(), f, default=str)
+            os.replace(tmp_path, self._path(job.job_id))
+        except OSError as e:
+            print(f"[{self.name}] could not persist job {job.job_id}: {e}")
+
+    def _remove_cancel_marker(self, job_id):
+        try:
+            os.remove(self._path(job_id, ".cancel"))
+        except OSError:
+            pass
+
+    def _prune_files(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        try:
+            for name in os.listdir(self.job_dir):
+                path = os.path.join(self.job_dir, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except OSError:
+            pass
+
+    def _start_watcher(self):
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name=f"{self.name}-cancel-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        """Apply cancel markers left by other workers to this worker's running jobs"""
+        while True:
+            time.sleep(CANCEL_POLL_SECONDS)
+            with self._lock:
+                running = list(self._jobs.values())
+            for job in running:
+                marker = self._path(job.job_id, ".cancel")
+                if not job.token.cancelled and os.path.exists(marker):
+                    job.token.cancel()
+                    self._remove_cancel_marker(job.job_id)
@@ -0,0 +1,222 @@
+"""
+Local stand-in for the SQL warehouse
+With LOCAL_WAREHOUSE=1 (see databricks_utils.py), sqlQuery answers the app's queries
+here instead of on Databricks, so the app, query routing and benchmarks run offline.
+A fixed fleet flies deterministic loops, so overlapping queries agree with each
+other; each table reports at its own resolution (the raw table every
+LOCAL_REPORT_SECONDS, the rollups once per bucket), and every query is logged with
+the table it read.
+
+Only the query shapes built by flight_queries.py, flight_stats.py and app.py are
+understood.
+"""
+
+import os
+import re
+import time
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+from flight_queries import QUERY_SOURCES, DEDUP_COUNT_COLUMN
+from load_jobs import check_cancelled
+from server_metrics import register_metric_source
+
+# Size of the simulated fleet and how often each aircraft reports to the raw table
+LOCAL_AIRCRAFT = int(os.getenv("LOCAL_AIRCRAFT", "200"))
+LOCAL_REPORT_SECONDS = int(os.getenv("LOCAL_REPORT_SECONDS", "10"))
+
+# Simulated warehouse latency per query, plus per million rows returned
+LOCAL_LATENCY_MS = float(os.getenv("LOCAL_LATENCY_MS", "0"))
+LOCAL_LATENCY_MS_PER_MROWS = float(os.getenv("LOCAL_LATENCY_MS_PER_MROWS", "0"))
+
+COUNTRIES = ["United States", "Canada", "Mexico", "United Kingdom", "Germany", "France", "Brazil", "Japan"]
+
+# Loop radius (degrees) and period; ~250 m/s along a ~5 degree loop
+LOOP_RADIUS_DEG = 5.0
+LOOP_PERIOD_SECONDS = 3.5 * 3600
+
+# Metres per degree of latitude
+METRES_PER_DEGREE = 111320.0
+
+_log = deque(maxlen=50)
+_log_lock = threading.Lock()
+_counters = {}
+
+
+def _fleet():
+    rng = np.random.default_rng(0)
+    n = LOCAL_AIRCRAFT
+    return pd.DataFrame({
+        "icao24": [f"{i:06x}" for i in rng.choice(0xFFFFFF, n, replace=False)],
+        "callsign": [f"LCL{i:04d}" for i in range(n)],
+        "origin_country": rng.choice(COUNTRIES, n),
+        "lat0": rng.uniform(30, 45, n),
+        "lon0": rng.uniform(-115, -80, n),
+        "phase": rng.uniform(0, 2 * np.pi, n),
+        "offset": rng.uniform(0, 1, n),
+        "altitude": rng.uniform(3000, 12000, n),
+    })
+
+
+FLEET = _fleet()
+
+
+def _table_resolution(table):
+    """Seconds between rows of one aircraft in a table"""
+    for _, (name, bucket_seconds) in QUERY_SOURCES.items():
+        if name == table:
+            return bucket_seconds or LOCAL_REPORT_SECONDS
+    raise ValueError(f"local warehouse has no table {table}")
+
+
+def _in_list(query, column):
+    match = re.search(rf"{column} IN \(([^)]*)\)", query)
+    return re.findall(r"'([^']*)'", match.group(1)) if match else None
+
+
+def _bound(query, ops):
+    match = re.search(rf"last_contact ({ops}) to_utc_timestamp\('([^']+)'", query)
+    if not match:
+        return None, None
+    return match.group(1), pd.Timestamp(match.group(2)).value // 10**9
+
+
+def positions(table, start, end, end_inclusive=True, callsigns=None, countries=None):
+    """
+    Position rows of the simulated fleet between two Eastern epoch seconds
+
+    Returns:
+        DataFrame with the columns of flight_queries.build_flight_query, ordered by time
+    """
+    fleet = FLEET
+    if callsigns:
+        fleet = fleet[fleet["callsign"].isin(callsigns)]
+    if countries:
+        fleet = fleet[fleet["origin_country"].isin(countries)]
+    step = _table_resolution(table)
+
+    # Each aircraft reports at a fixed offset within every step
+    first = start // step - 1
+    ticks = np.arange(first, end // step + 2, dtype=np.int64) * step
+    seconds = ticks[None, :] + (fleet["offset"].to_numpy() * step).astype(np.int64)[:, None]
+    keep = (seconds >= start) & ((seconds <= end) if end_inclusive else (seconds < end))
+    aircraft, _ = np.nonzero(keep)
+    seconds = seconds[keep]
+
+    angle = 2 * np.pi * seconds / LOOP_PERIOD_SECONDS + fleet["phase"].to_numpy()[aircraft]
+    timestamp = pd.to_datetime(seconds, unit="s")
+    df = pd.DataFrame({
+        "icao24": fleet["icao24"].to_numpy()[aircraft],
+        "callsign": fleet["callsign"].to_numpy()[aircraft],
+        "origin_country": fleet["origin_country"].to_numpy()[aircraft],
+        "last_position": timestamp,
+        "timestamp": timestamp,
+        "lon": fleet["lon0"].to_numpy()[aircraft] + LOOP_RADIUS_DEG * np.cos(angle),
+        "lat": fleet["lat0"].to_numpy()[aircraft] + 0.7 * LOOP_RADIUS_DEG * np.sin(angle),
+    })
+    return df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+
+def _sample(df, sample_seconds):
+    """Each aircraft's last report per bucket (see flight_queries.build_sample_condition)"""
+    seconds = df["timestamp"].to_numpy().astype("datetime64[s]").astype(np.int64)
+    keys = pd.DataFrame({"icao24": df["icao24"].to_numpy(), "bucket": seconds // sample_seconds})
+    # Rows are in time order, so the last of each bucket is the freshest
+    return df[~keys.duplicated(keep="last").to_numpy()].reset_index(drop=True)
+
+
+def _aggregate(df, quantiles):
+    """
+    One-row answer to flight_stats.build_stats_query over position rows
+
+    Every simulated aircraft is airborne at its own cruise altitude, flying its loop
+    at the speed the loop's geometry gives.
+    """
+    aircraft = FLEET.set_index("icao24").loc[df["icao24"]]
+    seconds = df["timestamp"].to_numpy().astype("datetime64[s]").astype(np.int64)
+    rate = 2 * np.pi / LOOP_PERIOD_SECONDS
+    angle = rate * seconds + aircraft["phase"].to_numpy()
+    east = LOOP_RADIUS_DEG * rate * np.sin(angle) * np.cos(np.radians(df["lat"].to_numpy()))
+    north = 0.7 * LOOP_RADIUS_DEG * rate * np.cos(angle)
+    values = {
+        "altitude": aircraft["altitude"].to_numpy(),
+        "speed": METRES_PER_DEGREE * np.hypot(east, north),
+    }
+    row = {"raw_records": len(df), "aircraft": df["icao24"].nunique()}
+    for name, column in values.items():
+        empty = not len(column)
+        row[f"{name}_mean"] = None if empty else float(column.mean())
+        row[f"{name}_quantiles"] = None if empty else np.quantile(column, quantiles).tolist()
+        row[f"{name}_max"] = None if empty else float(column.max())
+    return pd.DataFrame([row])
+
+
+def run_query(query):
+    """
+    Answer one of the app's queries
+
+    Args:
+        query: SQL built by flight_queries.py or app.py
+
+    Returns:
+        pandas DataFrame shaped like the warehouse result
+    """
+    check_cancelled()
+    started = time.perf_counter()
+    table = re.search(r"FROM\s+(\S+)", query).group(1)
+    _table_resolution(table)
+
+    if "DISTINCT callsign" in query:
+        df = FLEET[["callsign"]]
+        limit = re.search(r"LIMIT\s+(\d+)", query)
+        if "RAND()" in query:
+            df = df.sample(frac=1, random_state=int(time.time()))
+        if limit:
+            df = df.head(int(limit.group(1)))
+        df = df.reset_index(drop=True)
+    elif "DISTINCT origin_country" in query:
+        df = pd.DataFrame({"origin_country": sorted(FLEET["origin_country"].unique())})
+    else:
+        _, start = _bound(query, ">=")
+        upper_op, end = _bound(query, "<=|<")
+        now = pd.Timestamp.now().value // 10**9
+        start = start if start is not None else now - 6 * 3600
+        end = end if end is not None else now
+        df = positions(table, start, end, upper_op != "<", _in_list(query, "callsign"), _in_list(query, "origin_country"))
+        sample = re.search(r"FLOOR\(unix_timestamp\(last_contact\) / (\d+)\)", query)
+        if sample:
+            df = _sample(df, int(sample.group(1)))
+        if DEDUP_COUNT_COLUMN in query:
+            df[DEDUP_COUNT_COLUMN] = 1
+        quantiles = re.search(r"percentile_approx\(\w+, array\(([^)]*)\)\)", query)
+        if quantiles:
+            df = _aggregate(df, [float(q) for q in quantiles.group(1).split(",")])
+
+    delay = LOCAL_LATENCY_MS + LOCAL_LATENCY_MS_PER_MROWS * len(df) / 1e6
+    if delay:
+        time.sleep(delay / 1000)
+
+    elapsed = time.perf_counter() - started
+    with _log_lock:
+        counter = _counters.setdefault(table, {"queries": 0, "rows": 0})
+        counter["queries"] += 1
+        counter["rows"] += len(df)
+        _log.append({"table": table, "rows": len(df), "seconds": round(elapsed, 3)})
+    return df
+
+
+def run_query_batches(query, batch_rows):
+    """Answer a query as pyarrow RecordBatches (see databricks_utils.iter_arrow_batches)"""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(run_query(query), preserve_index=False)
+    return table.to_batches(max_chunksize=batch_rows) or [pa.RecordBatch.from_pylist([], schema=table.schema)]
+
+
+def stats():
+    """Per-table query counts and the most recent queries"""
+    with _log_lock:
+        return {"tables": {k: dict(v) for k, v in _counters.items()}, "recent": list(_log)}
+
+
+register_metric_source("local_warehouse", stats)
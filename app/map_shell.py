@@ -0,0 +1,278 @@
+"""
+Lightweight Kepler.gl map shell
+The iframe gets a small HTML document that loads the cached, self-hosted bundles and
+fetches its dataset from the server, instead of a multi-megabyte inlined export.
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import flask
+from kepler_assets import asset_url, stylesheet_urls, script_urls
+
+# URL prefix map payloads are served under
+PAYLOAD_ROUTE = "/map-data"
+
+# Number of rendered payloads kept in memory
+MAX_CACHED_PAYLOADS = int(os.getenv("MAX_CACHED_PAYLOADS", "32"))
+
+# Payloads are also written here so any worker process on the host can serve them
+PAYLOAD_DIR = os.getenv("PAYLOAD_DIR", os.path.join(tempfile.gettempdir(), "flight-tracker-payloads"))
+MAX_SPILLED_PAYLOADS = int(os.getenv("MAX_SPILLED_PAYLOADS", "256"))
+
+# Seconds a request for a part still being encoded waits for it
+PART_WAIT_SECONDS = float(os.getenv("PART_WAIT_SECONDS", "30"))
+
+SHELL_TEMPLATE = """<!doctype html>
+<html lang="en"><head><meta charset="utf-8"><title>Kepler.gl</title>
+{stylesheets}
+<style>body {{ margin: 0; padding: 0; overflow: hidden; background-color: #242730; font-family: ff-clan-web-pro, 'Helvetica Neue', Helvetica, sans-serif; font-size: 0.875em; }}
+#shell-message {{ color: #e0e0e0; text-align: center; padding: 50px; position: absolute; width: 100%; z-index: 1; pointer-events: none; }}</style>
+{scripts}
+</head><body>
+{message}<div id="app-content"></div>
+<script>window.__flightTrackerShell = {shell_config};</script>
+<script src="{shell_script}"></script>
+</body></html>"""
+
+_payloads = OrderedDict()
+_payloads_lock = threading.Lock()
+# Signalled whenever a part of a stored payload is filled in (or fails)
+_parts_filled = threading.Condition(_payloads_lock)
+
+
+def store_map_payload(payload_json):
+    """
+    Keep a rendered map payload in memory and return its content-hashed URL
+
+    Args:
+        payload_json: Serialized payload ({"datasets": [...], "config": ..., "options": ...})
+
+    Returns:
+        URL the map shell fetches the payload from
+    """
+    body = payload_json.encode("utf-8")
+    key = hashlib.sha256(body).hexdigest()[:16]
+    with _payloads_lock:
+        entry = _payloads.get(key)
+        if entry is None:
+            entry = {"raw": body, "gzip": gzip.compress(body, compresslevel=6)}
+            _payloads[key] = entry
+        _payloads.move_to_end(key)
+        while len(_payloads) > MAX_CACHED_PAYLOADS:
+            _payloads.popitem(last=False)
+    _spill_payload(key, entry["gzip"])
+    return f"{PAYLOAD_ROUTE}/{key}.json"
+
+
+def store_payload_parts(count, parts, build):
+    """
+    Store a payload now and the parts it references (a streamed map's chunks) as they
+    are produced
+
+    The parts live in the payload's own entry and spill directory, so they are cached,
+    spilled and evicted with it: none disappears while the payload is still served.
+    They are pulled from `parts` on a background thread after the URL is returned; a
+    request for a part that is not ready yet waits for it (see PART_WAIT_SECONDS).
+
+    Args:
+        count: Number of parts
+        parts: Iterator of the serialized parts, in order
+        build: Callable taking the parts' URLs and returning the serialized payload
+
+    Returns:
+        URL the map shell fetches the payload from
+    """
+    # The parts are not known yet, so the key cannot be a content hash; a random key
+    # is never reused, so its URLs still never change content
+    key = uuid.uuid4().hex[:16]
+    body = build([f"{PAYLOAD_ROUTE}/{key}/{i}.json" for i in range(count)]).encode("utf-8")
+    entry = {
+        "raw": body,
+        "gzip": gzip.compress(body, compresslevel=6),
+        # Parts are requested one at a time and kept compressed only
+        "parts": [None] * count,
+        "failed": False,
+    }
+    with _payloads_lock:
+        _payloads[key] = entry
+        while len(_payloads) > MAX_CACHED_PAYLOADS:
+            _payloads.popitem(last=False)
+    _spill_payload(key, entry["gzip"])
+    threading.Thread(target=_fill_parts, args=(key, entry, parts), name=f"payload-parts-{key[:8]}", daemon=True).start()
+    return f"{PAYLOAD_ROUTE}/{key}.json"
+
+
+def _fill_parts(key, entry, parts):
+    """Compress and spill each part as it is produced, waking requests waiting for it"""
+    try:
+        for index, part in enumerate(parts):
+            compressed = gzip.compress(part.encode("utf-8"), compresslevel=6)
+            with _payloads_lock:
+                entry["parts"][index] = compressed
+                _parts_filled.notify_all()
+            _spill_part(key, index, compressed)
+    except Exception as e:
+        print(f"Could not build the parts of map payload {key}: {e}")
+        with _payloads_lock:
+            entry["failed"] = True
+            _parts_filled.notify_all()
+
+
+def _spill_path(key):
+    return os.path.join(PAYLOAD_DIR, f"{key}.json.gz")
+
+
+def _spill_part_path(key, index):
+    return os.path.join(PAYLOAD_DIR, key, f"{index}.json.gz")
+
+
+def _write_atomic(directory, path, compressed):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(compressed)
+    os.replace(tmp_path, path)
+
+
+def _spill_payload(key, compressed):
+    """
+    Write a gzipped payload to PAYLOAD_DIR (atomically) and prune the oldest files
+
+    Parts go to a directory named after the payload (see _spill_part), removed with it.
+    """
+    try:
+        os.makedirs(PAYLOAD_DIR, exist_ok=True)
+        path = _spill_path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        _write_atomic(PAYLOAD_DIR, path, compressed)
+
+        spilled = [os.path.join(PAYLOAD_DIR, name) for name in os.listdir(PAYLOAD_DIR) if name.endswith(".json.gz")]
+        if len(spilled) > MAX_SPILLED_PAYLOADS:
+            spilled.sort(key=os.path.getmtime)
+            for old in spilled[:len(spilled) - MAX_SPILLED_PAYLOADS]:
+                os.remove(old)
+                shutil.rmtree(old[:-len(".json.gz")], ignore_errors=True)
+    except OSError as e:
+        print(f"Could not spill map payload {key}: {e}")
+
+
+def _spill_part(key, index, compressed):
+    """Write one gzipped part next to its spilled payload"""
+    try:
+        part_dir = os.path.join(PAYLOAD_DIR, key)
+        os.makedirs(part_dir, exist_ok=True)
+        _write_atomic(part_dir, _spill_part_path(key, index), compressed)
+    except OSError as e:
+        print(f"Could not spill part {index} of map payload {key}: {e}")
+
+
+def _load_payload(key, part=None):
+    """
+    Payload (or part) entry from memory, or from another worker's spill file
+
+    A part still being produced is waited for, up to PART_WAIT_SECONDS.
+    """
+    deadline = time.monotonic() + PART_WAIT_SECONDS
+    with _payloads_lock:
+        entry = _payloads.get(key)
+        if entry is not None and part is not None:
+            parts = entry.get("parts") or []
+            if part >= len(parts):
+                return None
+            while parts[part] is None and not entry["failed"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                _parts_filled.wait(remaining)
+            return {"raw": None, "gzip": parts[part]} if parts[part] is not None else None
+    if entry is not None:
+        return entry
+
+    path = _spill_path(key) if part is None else _spill_part_path(key, part)
+    while True:
+        try:
+            with open(path, "rb") as f:
+                return {"raw": None, "gzip": f.read()}
+        except OSError:
+            # Another worker may still be writing the parts of a payload it spilled
+            if part is None or time.monotonic() > deadline or not os.path.exists(_spill_path(key)):
+                return None
+            time.sleep(0.1)
+
+
+def has_map_payload(url):
+    """Whether a URL returned by store_map_payload (or store_payload_parts) is still being served"""
+    if not url:
+        return False
+    key = url.rsplit("/", 1)[-1].split(".")[0]
+    with _payloads_lock:
+        if key in _payloads:
+            return True
+    return os.path.exists(_spill_path(key))
+
+
+def register_payload_routes(server):
+    """
+    Serve map payloads stored by store_map_payload and store_payload_parts
+
+    Args:
+        server: Flask app (Dash's app.server)
+    """
+    @server.route(f"{PAYLOAD_ROUTE}/<key>.json")
+    @server.route(f"{PAYLOAD_ROUTE}/<key>/<int:part>.json")
+    def map_payload(key, part=None):
+        if not key.isalnum():
+            flask.abort(404)
+        entry = _load_payload(key, part)
+        if entry is None:
+            flask.abort(404)
+
+        accepted = flask.request.headers.get("Accept-Encoding", "")
+        if "gzip" in accepted:
+            response = flask.Response(entry["gzip"], mimetype="application/json")
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            raw = entry["raw"] if entry["raw"] is not None else gzip.decompress(entry["gzip"])
+            response = flask.Response(raw, mimetype="application/json")
+        response.headers["Vary"] = "Accept-Encoding"
+        # Keys are content hashes, so a payload never changes under the same URL
+        response.headers["Cache-Control"] = "private, max-age=3600, immutable"
+        return response
+
+
+def render_map_shell(data_url=None, message=None):
+    """
+    Build the iframe document for the map
+
+    Args:
+        data_url: URL of a map payload to load on startup (None for an empty map)
+        message: Optional text shown over the map (e.g. "No data loaded")
+
+    Returns:
+        HTML string
+    """
+    shell_config = {
+        "dataUrl": data_url,
+        "mapboxToken": os.environ.get("MAPBOX_API_KEY", ""),
+    }
+    stylesheets = "\n".join(f'<link href="{url}" rel="stylesheet">' for url in stylesheet_urls())
+    scripts = "\n".join(f'<script src="{url}" crossorigin></script>' for url in script_urls())
+    message_html = f'<h3 id="shell-message">{message}</h3>' if message else ""
+
+    return SHELL_TEMPLATE.format(
+        stylesheets=stylesheets,
+        scripts=scripts,
+        message=message_html,
+        shell_config=json.dumps(shell_config).replace("</", "<\\/"),
+        shell_script=asset_url("kepler_shell.js"),
+    )
+
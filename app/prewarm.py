@@ -0,0 +1,185 @@
+"""
+Background refresh of ready-to-serve values
+Keeps an expensive value (e.g. the default "last 6 hours" view) rebuilt on a schedule
+so requests can serve the latest copy immediately instead of waiting on the warehouse.
+
+With a share directory, the gunicorn workers on a host take turns under a file lock:
+one worker builds the value and writes it there, and the others serve that copy, so
+each interval costs one build rather than one per worker.
+"""
+
+import os
+import json
+import time
+import fcntl
+import tempfile
+import threading
+import traceback
+from datetime import datetime
+
+# Shared by all worker processes on the host
+PREWARM_DIR = os.getenv("PREWARM_DIR", os.path.join(tempfile.gettempdir(), "flight-tracker-prewarm"))
+
+
+class BackgroundRefresher:
+    """
+    Rebuild a value every interval_seconds on a daemon thread
+
+    The previous value keeps being served while a refresh runs, and when a refresh
+    fails. With share_dir set, the value must be JSON-serializable: it is built by
+    whichever worker holds the directory's lock and read back by the others.
+
+    Example:
+        view = BackgroundRefresher("default_view", build_default_view, 300, share_dir=PREWARM_DIR)
+        view.start()
+        latest = view.get()   # None until the first build succeeds
+    """
+
+    def __init__(self, name, build, interval_seconds, retry_seconds=30, share_dir=None):
+        self.name = name
+        self.build = build
+        self.interval_seconds = interval_seconds
+        self.retry_seconds = retry_seconds
+        self.share_dir = share_dir
+        self._value = None
+        self._refreshed_at = None
+        self._last_error = None
+        self._refreshes = 0
+        self._adopted = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the refresh loop (idempotent)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"refresh-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def refresh(self):
+        """
+        Bring the value up to date; returns True when it is current
+
+        Without a share directory this always rebuilds. With one, a copy another worker
+        wrote less than interval_seconds ago is adopted as is; otherwise the worker
+        that gets the lock rebuilds and writes it, and the rest adopt whatever copy
+        there is until the next attempt.
+        """
+        if self.share_dir is None:
+            return self._build()
+        try:
+            os.makedirs(self.share_dir, exist_ok=True)
+            lock_file = open(os.path.join(self.share_dir, f"{self.name}.lock"), "w")
+        except OSError as e:
+            print(f"[{self.name}] share directory unavailable, building locally: {e}")
+            return self._build()
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+            except OSError:
+                locked = False
+            shared = self._read_shared()
+            if shared is not None:
+                fresh = (datetime.now() - shared[1]).total_seconds() < self.interval_seconds
+                if fresh or not locked:
+                    self._adopt(*shared)
+                    return fresh
+            if not locked:
+                # Another worker is building the first copy
+                return False
+            if not self._build():
+                return False
+            self._write_shared()
+            return True
+
+    def _shared_path(self):
+        return os.path.join(self.share_dir, f"{self.name}.json")
+
+    def _read_shared(self):
+        """(value, refreshed_at) another worker wrote, or None"""
+        try:
+            with open(self._shared_path()) as f:
+                shared = json.load(f)
+            return shared["value"], datetime.fromisoformat(shared["refreshed_at"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_shared(self):
+        with self._lock:
+            shared = {"value": self._value, "refreshed_at": self._refreshed_at.isoformat()}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.share_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(shared, f, default=str)
+            os.replace(tmp_path, self._shared_path())
+        except (OSError, TypeError) as e:
+            print(f"[{self.name}] could not share the refreshed value: {e}")
+
+    def _adopt(self, value, refreshed_at):
+        with self._lock:
+            if self._refreshed_at is not None and self._refreshed_at >= refreshed_at:
+                return
+            self._value = value
+            self._refreshed_at = refreshed_at
+            self._adopted += 1
+
+    def _build(self):
+        started = time.perf_counter()
+        try:
+            value = self.build()
+        except Exception as e:
+            print(f"[{self.name}] refresh failed: {e}")
+            traceback.print_exc()
+            with self._lock:
+                self._last_error = str(e)
+            return False
+        with self._lock:
+            self._value = value
+            self._refreshed_at = datetime.now()
+            self._last_error = None
+            self._refreshes += 1
+        print(f"[{self.name}] refreshed in {time.perf_counter() - started:.1f}s")
+        return True
+
+    def _run(self):
+        while True:
+            ok = self.refresh()
+            delay = self.retry_seconds
+            if ok:
+                # Check again when the current copy (possibly built elsewhere) goes stale
+                delay = max(self.interval_seconds - (self.age_seconds() or 0), 1)
+            time.sleep(delay)
+
+    def get(self):
+        """Latest value, or None if no refresh has succeeded yet"""
+        with self._lock:
+            return self._value
+
+    def age_seconds(self):
+        """Seconds since the last successful refresh, or None"""
+        with self._lock:
+            if self._refreshed_at is None:
+                return None
+            return (datetime.now() - self._refreshed_at).total_seconds()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                "refreshes": self._refreshes,
+                "adopted": self._adopted,
+                "refreshed_at": self._refreshed_at.isoformat() if self._refreshed_at else None,
+                "last_error": self._last_error,
+            }
+
+
+def describe_age(seconds):
+    """Human-readable staleness, e.g. 'just now', '4 min ago'"""
+    if seconds is None:
+        return "unknown"
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{seconds / 3600:.1f} h ago"
@@ -0,0 +1,122 @@
+"""
+Process pool for CPU-heavy rendering and post-processing
+Keeps large pandas/JSON work off the request threads so one big render does not
+stall every other session, with bounded queueing: when the pool and its queue are
+full, new work waits briefly and then fails fast with RenderPoolBusy.
+"""
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from load_jobs import JobCancelled, check_cancelled
+
+# Worker processes (0 renders inline on the request thread)
+RENDER_PROCESSES = int(os.getenv("RENDER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+# Jobs allowed to wait for a free process beyond the ones running
+RENDER_QUEUE_LIMIT = int(os.getenv("RENDER_QUEUE_LIMIT", "8"))
+
+# Seconds a request waits for a queue slot before giving up
+RENDER_QUEUE_TIMEOUT = float(os.getenv("RENDER_QUEUE_TIMEOUT", "10"))
+
+# Smaller jobs run inline; pickling them to a process costs more than it saves
+RENDER_POOL_MIN_ROWS = int(os.getenv("RENDER_POOL_MIN_ROWS", "50000"))
+
+
+class RenderPoolBusy(Exception):
+    """Raised when the render queue stays full for RENDER_QUEUE_TIMEOUT seconds"""
+
+
+class RenderPool:
+    """
+    Bounded front end for a ProcessPoolExecutor
+
+    Example:
+        pool = RenderPool(processes=4, queue_limit=8)
+        payload = pool.run(build_map_payload, df, rows=len(df))
+    """
+
+    def __init__(self, processes=RENDER_PROCESSES, queue_limit=RENDER_QUEUE_LIMIT,
+                 queue_timeout=RENDER_QUEUE_TIMEOUT, min_rows=RENDER_POOL_MIN_ROWS):
+        self.processes = processes
+        self.queue_timeout = queue_timeout
+        self.min_rows = min_rows
+        self._slots = threading.BoundedSemaphore(max(processes, 1) + queue_limit)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._counters = {"pooled": 0, "inline": 0, "rejected": 0, "in_flight": 0}
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn: forking a multi-threaded server process is unsafe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._executor
+
+    def _count(self, name, delta=1):
+        with self._counter_lock:
+            self._counters[name] += delta
+
+    def run(self, fn, *args, rows=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the pool and wait for the result
+
+        fn must be a module-level function importable without the Dash app.
+
+        Args:
+            fn: Function to run
+            rows: Size hint; jobs under min_rows run inline
+        """
+        if self.processes <= 0 or (rows is not None and rows < self.min_rows):
+            self._count("inline")
+            return fn(*args, **kwargs)
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count("rejected")
+            raise RenderPoolBusy("Server is busy rendering other maps, please try again")
+
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the task finishes, even if its caller stops waiting
+        future.add_done_callback(lambda _: self._slots.release())
+
+        self._count("in_flight")
+        try:
+            while True:
+                try:
+                    result = future.result(timeout=0.25)
+                    break
+                except TimeoutError:
+                    # Stop waiting if the load job is cancelled
+                    try:
+                        check_cancelled()
+                    except JobCancelled:
+                        future.cancel()
+                        raise
+            self._count("pooled")
+            return result
+        finally:
+            self._count("in_flight", -1)
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._counter_lock:
+            return {"processes": self.processes, **self._counters}
+
+    def shutdown(self):
+        """Stop worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+render_pool = RenderPool()
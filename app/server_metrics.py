@@ -0,0 +1,46 @@
+"""
+Server metrics endpoint
+Modules register callables returning JSON-serializable dicts; /metrics reports them all.
+"""
+
+import flask
+
+METRICS_ROUTE = "/metrics"
+
+_sources = {}
+
+
+def register_metric_source(name, collect):
+    """
+    Add a named metrics source
+
+    Args:
+        name: Key the metrics are reported under
+        collect: Callable returning a JSON-serializable dict
+    """
+    _sources[name] = collect
+
+
+def collect_metrics():
+    """Collect every registered source, reporting errors instead of failing"""
+    metrics = {}
+    for name, collect in list(_sources.items()):
+        try:
+            metrics[name] = collect()
+        except Exception as e:
+            metrics[name] = {"error": str(e)}
+    return metrics
+
+
+def register_metrics_route(server):
+    """
+    Serve collected metrics as JSON
+
+    Args:
+        server: Flask app (Dash's app.server)
+    """
+    @server.route(METRICS_ROUTE)
+    def metrics():
+        response = flask.jsonify(collect_metrics())
+        response.headers["Cache-Control"] = "no-store"
+        return response
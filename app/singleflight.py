@@ -0,0 +1,93 @@
+"""
+Single-flight request coalescing
+Concurrent callers asking for the same key wait on one in-flight execution and share
+its result instead of each running the same warehouse query.
+"""
+
+import sys
+import threading
+from load_jobs import JobCancelled, check_cancelled
+
+
+class _Call:
+    """One in-flight execution and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with identical keys
+
+    Example:
+        flights = SingleFlight("sqlQuery")
+        df = flights.do(key, run_query, query)
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless an identical call is already running, in which
+        case wait for it and return its result (or raise its exception)
+
+        DataFrame results are copied for every caller when the result is shared,
+        so callers can modify what they get back. If the leader's load job is
+        cancelled, a waiting caller runs fn itself rather than failing with it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    shared = call.waiters > 0
+                call.done.set()
+            if shared:
+                print(f"[{self.name}] shared one execution with {call.waiters} coalesced caller(s)")
+        else:
+            # Wake up periodically so a waiting job can still be cancelled
+            while not call.done.wait(0.25):
+                check_cancelled()
+            shared = True
+            if isinstance(call.error, JobCancelled):
+                return self.do(key, fn, *args, **kwargs)
+
+        if call.error is not None:
+            raise call.error
+        # A DataFrame result implies pandas is loaded; don't import it just to check
+        pd = sys.modules.get("pandas")
+        if shared and pd is not None and isinstance(call.result, pd.DataFrame):
+            return call.result.copy()
+        return call.result
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
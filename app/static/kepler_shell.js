@@ -0,0 +1,630 @@
+// Kepler.gl map shell: boots the Kepler app once from the self-hosted UMD bundles
+// and loads map payloads ({datasets, config, options}) fetched from the server.
+// The Dash page pushes later payloads over postMessage (see assets/map_bridge.js),
+// so new data is swapped into the live store without reloading the iframe.
+(function () {
+  var shell = window.__flightTrackerShell || {};
+
+  var reducers = Redux.combineReducers({
+    keplerGl: KeplerGl.keplerGlReducer.initialState({
+      uiState: {currentModal: null, activeSidePanel: null}
+    })
+  });
+  var middlewares = KeplerGl.enhanceReduxMiddleware([]);
+  var store = Redux.createStore(reducers, {}, Redux.applyMiddleware.apply(null, middlewares));
+  window.__flightTrackerStore = store;
+
+  function KeplerElement() {
+    var state = React.useState({width: window.innerWidth, height: window.innerHeight});
+    var size = state[0];
+    var setSize = state[1];
+    React.useEffect(function () {
+      var onResize = function () {
+        setSize({width: window.innerWidth, height: window.innerHeight});
+      };
+      window.addEventListener('resize', onResize);
+      return function () { window.removeEventListener('resize', onResize); };
+    }, []);
+    return React.createElement(KeplerGl.KeplerGl, {
+      id: 'map',
+      mapboxApiAccessToken: shell.mapboxToken,
+      width: size.width,
+      height: size.height
+    });
+  }
+
+  ReactDOM.render(
+    React.createElement(ReactRedux.Provider, {store: store}, React.createElement(KeplerElement, null)),
+    document.getElementById('app-content')
+  );
+
+  // Compact datasets (encoding 'delta-v1', see transport.py) carry one entry per column:
+  // dictionaries plus codes for strings, and quantized epoch/coordinate values. All
+  // integer streams are delta-encoded (coordinates twice) and packed polyline-style
+  // (zigzag, 5-bit chunks).
+  function decodeDeltas(text, count, order) {
+    var out = new Array(count);
+    var index = 0;
+    var running = 0;
+    var value = 0;
+    var factor = 1;
+    for (var i = 0; i < text.length; i++) {
+      var chunk = text.charCodeAt(i) - 63;
+      // Arithmetic rather than bit operations: epoch seconds exceed 32 bits
+      value += (chunk & 31) * factor;
+      if (chunk & 0x20) {
+        factor *= 32;
+      } else {
+        running += (value % 2) ? -(value + 1) / 2 : value / 2;
+        out[index++] = running;
+        value = 0;
+        factor = 1;
+      }
+    }
+    for (var pass = 1; pass < (order || 1); pass++) {
+      for (var k = 1; k < out.length; k++) {
+        out[k] += out[k - 1];
+      }
+    }
+    return out;
+  }
+
+  function pad(n) {
+    return n < 10 ? '0' + n : '' + n;
+  }
+
+  // Epoch seconds of Eastern wall-clock time, formatted as the server would ('YYYY-MM-DD HH:MM:SS')
+  function formatTime(seconds) {
+    var d = new Date(seconds * 1000);
+    return d.getUTCFullYear() + '-' + pad(d.getUTCMonth() + 1) + '-' + pad(d.getUTCDate()) + ' ' +
+      pad(d.getUTCHours()) + ':' + pad(d.getUTCMinutes()) + ':' + pad(d.getUTCSeconds());
+  }
+
+  function decodeColumn(spec, count) {
+    if (spec.type === 'dict') {
+      return decodeDeltas(spec.codes, count).map(function (code) {
+        return code < 0 ? null : spec.values[code];
+      });
+    }
+    if (spec.type === 'time') {
+      var formatted = {};
+      return decodeDeltas(spec.delta, count).map(function (seconds) {
+        return formatted[seconds] || (formatted[seconds] = formatTime(seconds));
+      });
+    }
+    if (spec.type === 'float') {
+      var scale = Math.pow(10, spec.precision);
+      return decodeDeltas(spec.delta, count, spec.order).map(function (v) { return v / scale; });
+    }
+    if (spec.type === 'int') {
+      return decodeDeltas(spec.delta, count);
+    }
+    if (spec.type === 'bool') {
+      return decodeDeltas(spec.delta, count).map(function (v) { return v !== 0; });
+    }
+    return spec.values;
+  }
+
+  function decodeRows(data) {
+    var columns = data.columns.map(function (name) { return decodeColumn(data.series[name], data.rows); });
+    var rows = new Array(data.rows);
+    for (var i = 0; i < data.rows; i++) {
+      var row = new Array(columns.length);
+      for (var j = 0; j < columns.length; j++) {
+        row[j] = columns[j][i];
+      }
+      rows[i] = row;
+    }
+    return rows;
+  }
+
+  // Other payloads use pandas' split orientation ({columns, data}), as in keplergl-jupyter;
+  // Kepler infers field types from the rows. Trip paths (see trips.py) arrive as a
+  // GeoJSON FeatureCollection with [lon, lat, altitude, epoch seconds] coordinates.
+  function toKeplerDataset(dataset) {
+    var data = dataset.data;
+    if (data.type === 'FeatureCollection') {
+      return {info: dataset.info, data: KeplerGl.processGeojson(data)};
+    }
+    return {
+      info: dataset.info,
+      data: {
+        fields: data.columns.map(function (name) { return {name: name}; }),
+        rows: data.encoding === 'delta-v1' ? decodeRows(data) : data.data
+      }
+    };
+  }
+
+  // Dataset ids already in the store, and the layout (dataset ids and layer bindings)
+  // they were added with. A payload with the same layout replaces the data in place so
+  // layers, filters and the current view survive a reload; any other layout replaces
+  // the datasets, and with them their layers, before its config is applied.
+  var loadedIds = {};
+  var loadedLayout = null;
+
+  function payloadLayout(payload, datasets) {
+    var layers = (((payload.config || {}).config || {}).visState || {}).layers || [];
+    return JSON.stringify({
+      ids: datasets.map(function (d) { return d.info.id; }).sort(),
+      layers: layers.map(function (layer) { return [layer.type, (layer.config || {}).dataId]; }),
+      tiles: payload.tiles ? payload.tiles.dataId : null
+    });
+  }
+
+  function replaceDataset(dataset) {
+    var options = {keepExistingConfig: true, centerMap: false};
+    if (KeplerGl.replaceDataInMap) {
+      store.dispatch(KeplerGl.replaceDataInMap({
+        datasetToReplaceId: dataset.info.id,
+        datasetToUse: dataset,
+        options: options
+      }));
+    } else {
+      store.dispatch(KeplerGl.updateVisData([dataset], options));
+    }
+  }
+
+  // Streamed payloads (see time_chunks.py) carry the first time chunk inline and a
+  // manifest of the rest: {start, end, chunkSeconds, prefetch, maxChunks, chunks:
+  // [{start, end, rows, url}]}. Chunks are fetched as the time filter's head nears
+  // them and dropped once they leave the window, so only a few are held at once.
+  var stream = null;
+  var streamTimer = null;
+
+  // Rows with no position at the first and last report time keep the time filter's
+  // domain (and so its slider) spanning the whole window while only part is loaded
+  function anchorRow(source, seconds) {
+    var row = new Array(source.fields.length);
+    for (var i = 0; i < row.length; i++) {
+      row[i] = null;
+    }
+    row[source.timeColumn] = formatTime(seconds);
+    return row;
+  }
+
+  function streamDataset(indices) {
+    var rows = [];
+    indices.forEach(function (i) { rows = rows.concat(stream.rows[i]); });
+    rows.push(anchorRow(stream, stream.start), anchorRow(stream, stream.end));
+    return {info: stream.info, data: {fields: stream.fields, rows: rows}};
+  }
+
+  function startStream(manifest, dataset) {
+    var columns = dataset.data.columns;
+    stream = Object.assign({}, manifest, {
+      info: dataset.info,
+      fields: columns.map(function (name) { return {name: name}; }),
+      timeColumn: columns.indexOf('timestamp'),
+      rows: {0: decodeRows(dataset.data)},
+      pending: {},
+      shown: '0'
+    });
+    return streamDataset([0]);
+  }
+
+  // Current [start, end] of the time filter in epoch seconds, or fallback before it exists
+  function timeFilterRange(fallback) {
+    var map = store.getState().keplerGl.map;
+    var filters = (map && map.visState.filters) || [];
+    for (var i = 0; i < filters.length; i++) {
+      if (filters[i].type === 'timeRange' && filters[i].value) {
+        return [filters[i].value[0] / 1000, filters[i].value[1] / 1000];
+      }
+    }
+    return fallback;
+  }
+
+  // Chunks overlapping the filter window plus the prefetch window past its head,
+  // limited to the maxChunks nearest the head
+  function wantedChunks() {
+    var range = timeFilterRange([stream.start, stream.start]);
+    var until = range[1] + stream.prefetch * stream.chunkSeconds;
+    var wanted = [];
+    stream.chunks.forEach(function (chunk, i) {
+      if (chunk.end > range[0] && chunk.start <= until) {
+        wanted.push(i);
+      }
+    });
+    return wanted.slice(-stream.maxChunks);
+  }
+
+  function fetchChunk(index) {
+    var current = stream;
+    if (current.rows[index] || current.pending[index]) {
+      return;
+    }
+    current.pending[index] = true;
+    fetch(current.chunks[index].url, {credentials: 'same-origin'})
+      .then(function (response) {
+        if (!response.ok) { throw new Error('HTTP ' + response.status); }
+        return response.json();
+      })
+      .then(function (data) {
+        delete current.pending[index];
+        if (current === stream) {
+          current.rows[index] = decodeRows(data);
+          scheduleStreamUpdate();
+        }
+      })
+      .catch(function (err) {
+        delete current.pending[index];
+        console.error('Failed to load time chunk ' + index, err);
+      });
+  }
+
+  function updateStream() {
+    if (!stream) {
+      return;
+    }
+    var wanted = wantedChunks();
+    wanted.forEach(fetchChunk);
+    Object.keys(stream.rows).forEach(function (key) {
+      if (wanted.indexOf(Number(key)) < 0) {
+        delete stream.rows[key];
+      }
+    });
+    var shown = wanted.filter(function (i) { return stream.rows[i]; });
+    // After a jump, keep the old chunks on screen until a new one arrives
+    if (!shown.length && Object.keys(stream.pending).length) {
+      return;
+    }
+    if (shown.join(',') !== stream.shown) {
+      stream.shown = shown.join(',');
+      replaceDataset(streamDataset(shown));
+    }
+  }
+
+  // The filter value changes on every animation frame; check at most a few times a second
+  function scheduleStreamUpdate() {
+    if (stream && !streamTimer) {
+      streamTimer = setTimeout(function () {
+        streamTimer = null;
+        updateStream();
+      }, 200);
+    }
+  }
+
+  store.subscribe(scheduleStreamUpdate);
+
+  // Tiled payloads (see tiles.py) leave the point dataset empty and carry a manifest:
+  // {dataId, url, layer, columns, maxZoom, bucketSeconds, maxBuckets, maxTiles, start,
+  // end}. The shell fetches the Mapbox vector tiles covering the viewport for the time
+  // buckets the filter overlaps (all times at once when it spans more than maxBuckets)
+  // and shows their points, so it holds what is in view rather than the whole dataset.
+  var tiles = null;
+  var tileTimer = null;
+
+  // Field types are given, since an empty dataset leaves nothing to infer them from
+  var TILE_FIELD_TYPES = {
+    lat: {type: 'real'},
+    lon: {type: 'real'},
+    callsign: {type: 'string'},
+    timestamp: {type: 'timestamp', format: 'YYYY-M-D H:m:s'}
+  };
+
+  function readVarint(bytes, state) {
+    var value = 0;
+    var factor = 1;
+    var b;
+    do {
+      b = bytes[state.pos++];
+      value += (b & 0x7f) * factor;
+      factor *= 128;
+    } while (b & 0x80);
+    return value;
+  }
+
+  // Calls onField(field, value) for varints and onField(field, null, start, end) for
+  // length-delimited fields of the protobuf message in bytes[start:end]
+  function readMessage(bytes, start, end, onField) {
+    var state = {pos: start};
+    while (state.pos < end) {
+      var key = readVarint(bytes, state);
+      var wire = key & 7;
+      if (wire === 0) {
+        onField(key >> 3, readVarint(bytes, state));
+      } else if (wire === 2) {
+        var length = readVarint(bytes, state);
+        onField(key >> 3, null, state.pos, state.pos + length);
+        state.pos += length;
+      } else {
+        state.pos += wire === 1 ? 8 : 4;
+      }
+    }
+  }
+
+  function readPacked(bytes, start, end) {
+    var state = {pos: start};
+    var values = [];
+    while (state.pos < end) {
+      values.push(readVarint(bytes, state));
+    }
+    return values;
+  }
+
+  var utf8 = new TextDecoder();
+
+  // Point rows (in manifest column order) of the tile's layer; points in the tile's
+  // buffer belong to a neighbour and are skipped
+  function decodeTile(bytes, z, x, y) {
+    var rows = [];
+    var n = Math.pow(2, z);
+    readMessage(bytes, 0, bytes.length, function (field, value, start, end) {
+      if (field !== 3) { return; }
+      var layer = {name: null, keys: [], values: [], features: [], extent: 4096};
+      readMessage(bytes, start, end, function (f, v, a, b) {
+        if (f === 1) {
+          layer.name = utf8.decode(bytes.subarray(a, b));
+        } else if (f === 2) {
+          layer.features.push([a, b]);
+        } else if (f === 3) {
+          layer.keys.push(utf8.decode(bytes.subarray(a, b)));
+        } else if (f === 4) {
+          var decoded = null;
+          readMessage(bytes, a, b, function (vf, vv, va, vb) {
+            decoded = vf === 1 ? utf8.decode(bytes.subarray(va, vb)) : vv;
+          });
+          layer.values.push(decoded);
+        } else if (f === 5) {
+          layer.extent = v;
+        }
+      });
+      if (layer.name !== tiles.layer) { return; }
+      layer.features.forEach(function (span) {
+        var tags = [];
+        var geometry = [];
+        readMessage(bytes, span[0], span[1], function (f, v, a, b) {
+          if (f === 2) { tags = readPacked(bytes, a, b); }
+          if (f === 4) { geometry = readPacked(bytes, a, b); }
+        });
+        // A single MoveTo: command, then zigzag-encoded x and y
+        var px = (geometry[1] % 2) ? -(geometry[1] + 1) / 2 : geometry[1] / 2;
+        var py = (geometry[2] % 2) ? -(geometry[2] + 1) / 2 : geometry[2] / 2;
+        if (geometry[0] !== 9 || px < 0 || py < 0 || px >= layer.extent || py >= layer.extent) { return; }
+        var props = {
+          lon: (x + px / layer.extent) / n * 360 - 180,
+          lat: Math.atan(Math.sinh(Math.PI * (1 - 2 * (y + py / layer.extent) / n))) * 180 / Math.PI
+        };
+        for (var i = 0; i + 1 < tags.length; i += 2) {
+          props[layer.keys[tags[i]]] = layer.values[tags[i + 1]];
+        }
+        if (props.timestamp !== undefined) {
+          props.timestamp = formatTime(props.timestamp);
+        }
+        rows.push(tiles.columns.map(function (name) {
+          return props[name] === undefined ? null : props[name];
+        }));
+      });
+    });
+    return rows;
+  }
+
+  // Tiles covering the viewport at the deepest zoom that stays within maxTiles
+  function visibleTiles() {
+    var map = store.getState().keplerGl.map;
+    var view = map && map.mapState;
+    if (!view || !view.width) {
+      return [];
+    }
+    var z = Math.max(0, Math.min(tiles.maxZoom, Math.floor(view.zoom)));
+    for (; z >= 0; z--) {
+      var n = Math.pow(2, z);
+      // Tile units per screen pixel (the base map draws 512px tiles)
+      var unit = n / (512 * Math.pow(2, view.zoom));
+      var lat = Math.max(-85.05, Math.min(85.05, view.latitude)) * Math.PI / 180;
+      var cx = (view.longitude + 180) / 360 * n;
+      var cy = (1 - Math.log(Math.tan(lat) + 1 / Math.cos(lat)) / Math.PI) / 2 * n;
+      var x0 = Math.floor(cx - view.width / 2 * unit);
+      var x1 = Math.floor(cx + view.width / 2 * unit);
+      var y0 = Math.max(0, Math.floor(cy - view.height / 2 * unit));
+      var y1 = Math.min(n - 1, Math.floor(cy + view.height / 2 * unit));
+      var found = {};
+      for (var x = x0; x <= x1; x++) {
+        for (var y = y0; y <= y1; y++) {
+          var wrapped = ((x % n) + n) % n;
+          found[z + '/' + wrapped + '/' + y] = [z, wrapped, y];
+        }
+      }
+      var list = Object.keys(found).map(function (key) { return found[key]; });
+      if (list.length <= tiles.maxTiles || z === 0) {
+        return list;
+      }
+    }
+    return [];
+  }
+
+  // Bucket starts the time filter overlaps, or [null] (every time) past maxBuckets
+  function wantedBuckets() {
+    var range = timeFilterRange(null);
+    if (!range) {
+      return [null];
+    }
+    var size = tiles.bucketSeconds;
+    var first = Math.floor(Math.max(range[0], tiles.start) / size) * size;
+    var last = Math.floor(Math.min(range[1], tiles.end) / size) * size;
+    if (last < first || (last - first) / size + 1 > tiles.maxBuckets) {
+      return [null];
+    }
+    var buckets = [];
+    for (var t = first; t <= last; t += size) {
+      buckets.push(t);
+    }
+    return buckets;
+  }
+
+  function tileUrl(coords, bucket) {
+    var url = tiles.url.replace('{z}', coords[0]).replace('{x}', coords[1]).replace('{y}', coords[2]);
+    return bucket === null ? url : url + '?t=' + bucket;
+  }
+
+  function fetchTile(url, coords) {
+    var current = tiles;
+    if (current.rows[url] || current.pending[url]) {
+      return;
+    }
+    current.pending[url] = true;
+    fetch(url, {credentials: 'same-origin'})
+      .then(function (response) {
+        if (!response.ok) { throw new Error('HTTP ' + response.status); }
+        return response.arrayBuffer();
+      })
+      .then(function (buffer) {
+        delete current.pending[url];
+        if (current === tiles) {
+          current.rows[url] = decodeTile(new Uint8Array(buffer), coords[0], coords[1], coords[2]);
+          scheduleTileUpdate();
+        }
+      })
+      .catch(function (err) {
+        delete current.pending[url];
+        console.error('Failed to load tile ' + url, err);
+      });
+  }
+
+  function tileDataset(urls) {
+    var rows = [];
+    urls.forEach(function (url) { rows = rows.concat(tiles.rows[url]); });
+    rows.push(anchorRow(tiles, tiles.start), anchorRow(tiles, tiles.end));
+    return {info: tiles.info, data: {fields: tiles.fields, rows: rows}};
+  }
+
+  function startTiles(manifest, dataset) {
+    tiles = Object.assign({}, manifest, {
+      info: dataset.info,
+      fields: manifest.columns.map(function (name) {
+        return Object.assign({name: name}, TILE_FIELD_TYPES[name] || {type: 'string'});
+      }),
+      timeColumn: manifest.columns.indexOf('timestamp'),
+      rows: {},
+      pending: {},
+      shown: ''
+    });
+    return tileDataset([]);
+  }
+
+  function updateTiles() {
+    if (!tiles) {
+      return;
+    }
+    var wanted = [];
+    var buckets = wantedBuckets();
+    visibleTiles().forEach(function (coords) {
+      buckets.forEach(function (bucket) {
+        var url = tileUrl(coords, bucket);
+        wanted.push(url);
+        fetchTile(url, coords);
+      });
+    });
+    Object.keys(tiles.rows).forEach(function (url) {
+      if (wanted.indexOf(url) < 0) {
+        delete tiles.rows[url];
+      }
+    });
+    var shown = wanted.filter(function (url) { return tiles.rows[url]; });
+    // After a pan or zoom, keep the old points on screen until a new tile arrives
+    if (!shown.length && Object.keys(tiles.pending).length) {
+      return;
+    }
+    if (shown.join(',') !== tiles.shown) {
+      tiles.shown = shown.join(',');
+      replaceDataset(tileDataset(shown));
+    }
+  }
+
+  // Panning and the animation update the store continuously; check a few times a second
+  function scheduleTileUpdate() {
+    if (tiles && !tileTimer) {
+      tileTimer = setTimeout(function () {
+        tileTimer = null;
+        updateTiles();
+      }, 200);
+    }
+  }
+
+  store.subscribe(scheduleTileUpdate);
+
+  function applyPayload(payload) {
+    stream = null;
+    tiles = null;
+    var datasets = payload.stream ?
+      [startStream(payload.stream, payload.datasets[0])] :
+      payload.datasets.map(function (dataset) {
+        return payload.tiles && dataset.info.id === payload.tiles.dataId ?
+          startTiles(payload.tiles, dataset) : toKeplerDataset(dataset);
+      });
+    var layout = payloadLayout(payload, datasets);
+    if (layout === loadedLayout) {
+      datasets.forEach(replaceDataset);
+    } else {
+      // Removing a dataset also removes its layers, so none are stacked or left stale
+      Object.keys(loadedIds).forEach(function (id) {
+        store.dispatch(KeplerGl.removeDataset(id));
+      });
+      loadedIds = {};
+      store.dispatch(KeplerGl.addDataToMap({
+        datasets: datasets,
+        config: payload.config,
+        options: payload.options || {}
+      }));
+    }
+    loadedLayout = layout;
+    datasets.forEach(function (d) { loadedIds[d.info.id] = true; });
+    scheduleStreamUpdate();
+    scheduleTileUpdate();
+  }
+
+  function showMessage(text) {
+    var el = document.getElementById('shell-message');
+    if (!el) {
+      el = document.createElement('h3');
+      el.id = 'shell-message';
+      document.body.insertBefore(el, document.body.firstChild);
+    }
+    el.textContent = text || '';
+    el.style.display = text ? 'block' : 'none';
+  }
+
+  // URL of the payload currently shown; re-sends of the same payload are ignored
+  var currentUrl = null;
+
+  function loadPayload(url) {
+    if (url === currentUrl) {
+      return Promise.resolve();
+    }
+    return fetch(url, {credentials: 'same-origin'})
+      .then(function (response) {
+        if (!response.ok) { throw new Error('HTTP ' + response.status); }
+        return response.json();
+      })
+      .then(function (payload) {
+        applyPayload(payload);
+        currentUrl = url;
+      })
+      .catch(function (err) {
+        console.error('Failed to load map data from ' + url, err);
+        showMessage('Failed to load map data');
+      });
+  }
+
+  // Messages from the Dash page: {type: 'flight-tracker:load', payload: {url, message}}
+  window.addEventListener('message', function (event) {
+    if (event.source !== window.parent || !event.data || event.data.type !== 'flight-tracker:load') {
+      return;
+    }
+    var update = event.data.payload || {};
+    showMessage(update.message);
+    if (update.url) {
+      loadPayload(update.url);
+    }
+  });
+
+  window.__flightTrackerLoad = loadPayload;
+  if (shell.dataUrl) {
+    loadPayload(shell.dataUrl);
+  }
+
+  // Tell the page the bridge is listening so it can (re)send the latest payload
+  if (window.parent !== window) {
+    window.parent.postMessage({type: 'flight-tracker:ready'}, '*');
+  }
+})();
@@ -0,0 +1,289 @@
+"""
+Answering narrower fetches from frames already loaded
+Users often load a country for a window and then narrow it to a few callsigns or a
+shorter range. Every fetched frame is remembered here with its filters and
+per-column indexes; a request whose window lies inside a remembered frame's window
+and whose callsigns/countries are within its filters is answered by filtering that
+frame locally, and only true misses go to the warehouse. Subsets get their flights
+renumbered and kinematics derived again within the narrower window (see
+refit_flights). Frames are kept per identity, so a subset never crosses data
+permissions. Remembered frames go through the host-wide frame store (frame_store.py)
+under their dataset id, so they are the same mapped memory the dataset cache holds.
+"""
+
+import os
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from trajectory import DERIVE_KINEMATICS, epoch_seconds, key_codes, group_starts, label_flights, derive_kinematics
+from flight_queries import TIME_FORMAT
+from time_slices import MIXED_SOURCE, window_source
+from dataset_cache import scoped_dataset_id
+from frame_store import store_frame, release_frame, is_shared
+from server_metrics import register_metric_source
+
+# Memory budget for remembered frames held privately (shared frames cost only their indexes)
+SUPERSET_CACHE_MB = int(os.getenv("SUPERSET_CACHE_MB", "1024"))
+
+# Most frames remembered per app instance
+MAX_SUPERSETS = int(os.getenv("MAX_SUPERSETS", "32"))
+
+# Filters answered from an index: filter name -> frame column
+INDEXED_FILTERS = {"callsigns": "callsign", "countries": "origin_country"}
+
+WINDOW_FILTERS = ("start_date", "end_date")
+
+_frames = OrderedDict()
+_frames_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "rows_served": 0}
+
+
+def _epoch(value):
+    """Epoch seconds of an Eastern 'YYYY-MM-DD HH:MM:SS' string, as epoch_seconds reads the frame"""
+    return calendar.timegm(datetime.strptime(value, TIME_FORMAT).timetuple())
+
+
+class ColumnIndex:
+    """Row positions of every value of a column, grouped by value"""
+
+    def __init__(self, series):
+        values = series.astype("category")
+        self.codes = values.cat.codes.to_numpy()
+        self.code_of = {str(v): code for code, v in enumerate(values.cat.categories)}
+        # Missing values (code -1) form group 0; category c is group c + 1
+        self.order = np.argsort(self.codes, kind="stable")
+        counts = np.bincount(self.codes + 1, minlength=len(self.code_of) + 1)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def _codes(self, values):
+        return [self.code_of[v] for v in {str(v).strip() for v in values} if v in self.code_of]
+
+    def count(self, values):
+        """Rows holding any of values"""
+        return int(sum(self.offsets[c + 2] - self.offsets[c + 1] for c in self._codes(values)))
+
+    def positions(self, values):
+        """Row positions holding any of values, ascending"""
+        parts = [self.order[self.offsets[c + 1]:self.offsets[c + 2]] for c in self._codes(values)]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def matches(self, rows, values):
+        """Boolean mask over rows: whether each holds one of values"""
+        allowed = np.zeros(len(self.offsets) - 1, dtype=bool)
+        allowed[[c + 1 for c in self._codes(values)]] = True
+        return allowed[self.codes[rows] + 1]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.order.nbytes + self.offsets.nbytes
+
+
+class FrameIndex:
+    """Time and per-column indexes over a fetched frame"""
+
+    def __init__(self, df):
+        self.seconds = epoch_seconds(df["timestamp"])
+        self.time_order = np.argsort(self.seconds, kind="stable")
+        self.sorted_seconds = self.seconds[self.time_order]
+        self.columns = {
+            name: ColumnIndex(df[column])
+            for name, column in INDEXED_FILTERS.items()
+            if column in df.columns
+        }
+
+    def select(self, filters):
+        """
+        Row positions (in frame order) matching filters
+
+        Candidates come from whichever index narrows the frame most; the remaining
+        predicates are checked on those rows only.
+        """
+        start = _epoch(filters["start_date"])
+        end = _epoch(filters["end_date"])
+        lo = np.searchsorted(self.sorted_seconds, start, side="left")
+        hi = np.searchsorted(self.sorted_seconds, end, side="right")
+
+        narrowest = None
+        for name, index in self.columns.items():
+            values = filters.get(name)
+            if values and index.count(values) < (hi - lo if narrowest is None else len(narrowest)):
+                narrowest = index.positions(values)
+        rows = np.sort(self.time_order[lo:hi]) if narrowest is None else narrowest
+
+        keep = (self.seconds[rows] >= start) & (self.seconds[rows] <= end)
+        for name, index in self.columns.items():
+            if filters.get(name):
+                keep &= index.matches(rows, filters[name])
+        return rows[keep]
+
+    @property
+    def nbytes(self):
+        return (
+            self.seconds.nbytes + self.time_order.nbytes + self.sorted_seconds.nbytes
+            + sum(index.nbytes for index in self.columns.values())
+        )
+
+
+def covers(held, wanted):
+    """
+    Whether a frame fetched with `held` filters contains every row `wanted` asks for
+
+    Both are normalize_filters dicts. Windows must be bounded on both ends, and
+    other fetch options (e.g. dedup) must match exactly.
+    """
+    if any(held.get(key) != wanted.get(key) for key in set(held) | set(wanted)
+           if key not in INDEXED_FILTERS and key not in WINDOW_FILTERS):
+        return False
+    if not all(held.get(key) and wanted.get(key) for key in WINDOW_FILTERS):
+        return False
+    # TIME_FORMAT strings order like the times they hold
+    if wanted["start_date"] < held["start_date"] or wanted["end_date"] > held["end_date"]:
+        return False
+    for name in INDEXED_FILTERS:
+        if held.get(name) and not (wanted.get(name) and set(wanted[name]) <= set(held[name])):
+            return False
+    return True
+
+
+def remember_frame(identity, filters, df):
+    """
+    Keep a fetched frame so narrower requests can be answered from it
+
+    Args:
+        identity: identity_key of the caller
+        filters: normalize_filters dict the frame was fetched with
+        df: Fetched (post-processed) frame; empty frames are not kept
+
+    Returns:
+        The frame as kept (the frame store's mapping of df when sharing is on)
+    """
+    if df.empty or "timestamp" not in df.columns or not all(filters.get(key) for key in WINDOW_FILTERS):
+        return df
+    # The id the dataset cache uses for the same load, so both hold one stored copy
+    dataset_id = scoped_dataset_id(identity, filters)
+    df = store_frame(dataset_id, df, filters, holder="supersets")
+    index = FrameIndex(df)
+    # Shared frames are bounded by the frame store; only the indexes are private
+    size = index.nbytes + (0 if is_shared(dataset_id, df) else int(df.memory_usage(deep=True).sum()))
+    key = (identity, dataset_id)
+    evicted = []
+    with _frames_lock:
+        _frames[key] = {
+            "identity": identity,
+            "filters": filters,
+            "df": df,
+            "index": index,
+            "source": df.attrs.get("source", "raw"),
+            "bytes": size,
+        }
+        _frames.move_to_end(key)
+        budget = SUPERSET_CACHE_MB * 1024 * 1024
+        while _frames and (
+            len(_frames) > MAX_SUPERSETS
+            or sum(entry["bytes"] for entry in _frames.values()) > budget
+        ):
+            (_, old_id), _ = _frames.popitem(last=False)
+            evicted.append(old_id)
+    # Dataset ids are scoped to one identity, so no other entry holds an evicted frame
+    for old_id in evicted:
+        release_frame(old_id, holder="supersets")
+    return df
+
+
+def refit_flights(subset):
+    """
+    Redo a subset's per-flight values as a fresh fetch of its window would
+
+    Flight boundaries carry over, since gap splits depend only on consecutive reports
+    of an aircraft. Flights are renumbered from each aircraft's first flight in the
+    subset, and kinematics are derived again, so a flight cut at the window start
+    takes its first speed and heading from the hop to its second report rather than
+    from a report outside the window.
+
+    Args:
+        subset: Rows of a prepare_trajectories frame, in its aircraft and time order
+
+    Returns:
+        The subset with fresh `flight_id` (and kinematics when DERIVE_KINEMATICS is on)
+    """
+    if subset.empty or "flight_id" not in subset.columns:
+        return subset
+    subset = label_flights(subset, group_starts(key_codes(subset["flight_id"])))
+    return derive_kinematics(subset) if DERIVE_KINEMATICS else subset
+
+
+def find_subset(identity, filters):
+    """
+    Answer a fetch from a remembered frame that covers it
+
+    The frame must have been read from the source the request itself would use
+    (see time_slices.window_source), so its resolution matches a fresh fetch.
+    Windows mixing a rollup with raw slices are never reused: where one switches to
+    raw depends on its slice boundaries.
+    Flight ids and kinematics are refit to the subset (refit_flights). Stationary
+    pruning is not redone: a stationary run crossing the window start keeps only its
+    last report, where a fresh fetch also keeps its first one inside the window. Flights
+    of one aircraft that a callsign change split stay split after filtering to one
+    of the callsigns. Both affect only a few points per flight.
+
+    Args:
+        identity: identity_key of the caller
+        filters: normalize_filters dict of the request
+
+    Returns:
+        New DataFrame of the matching rows, or None on a miss
+    """
+    if not all(filters.get(key) for key in WINDOW_FILTERS):
+        return None
+    source = window_source(filters["start_date"], filters["end_date"])
+    if source == MIXED_SOURCE:
+        return None
+    with _frames_lock:
+        candidates = [
+            (len(entry["df"]), key)
+            for key, entry in _frames.items()
+            if entry["identity"] == identity and entry["source"] == source and covers(entry["filters"], filters)
+        ]
+        if not candidates:
+            _counters["misses"] += 1
+            return None
+        # The smallest covering frame has the least to filter
+        _, key = min(candidates)
+        _frames.move_to_end(key)
+        entry = _frames[key]
+
+    df = entry["df"]
+    subset = df.take(entry["index"].select(filters)).reset_index(drop=True)
+    subset = refit_flights(subset.assign(**{
+        col: subset[col].cat.remove_unused_categories()
+        for col in subset.columns
+        if isinstance(subset[col].dtype, pd.CategoricalDtype)
+    }))
+    subset.attrs = {
+        **df.attrs,
+        "window": (filters["start_date"], filters["end_date"]),
+        # Repeats were removed from the superset as a whole; they are not attributed per subset
+        "dedup_removed": 0,
+        "subset_of": entry["filters"],
+    }
+    with _frames_lock:
+        _counters["hits"] += 1
+        _counters["rows_served"] += len(subset)
+    return subset
+
+
+def stats():
+    """Counters and remembered frames for monitoring"""
+    with _frames_lock:
+        return {
+            "frames": len(_frames),
+            "bytes": sum(entry["bytes"] for entry in _frames.values()),
+            "budget_bytes": SUPERSET_CACHE_MB * 1024 * 1024,
+            **_counters,
+        }
+
+
+register_metric_source("superset_reuse", stats)
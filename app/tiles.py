@@ -0,0 +1,353 @@
+"""
+Vector tiles for the aircraft point layer
+Large maps no longer ship every position for the browser to draw as points. The
+cached dataset is cut into Mapbox vector tiles (MVT) by z/x/y and time bucket: rows
+are projected to Web Mercator and clipped once per tile with numpy, reports falling
+in the same grid cell keep only the latest, and the tile is protobuf-encoded in bulk.
+The map shell requests only the tiles covering its viewport and time window, so what
+the browser holds scales with the view instead of the dataset. Encoded tiles are kept
+in an LRU keyed by the tile index they were cut from, so replacing a dataset (which
+rebuilds its index) retires its old tiles.
+"""
+
+import os
+import gzip
+import itertools
+import threading
+from collections import OrderedDict
+import numpy as np
+import flask
+from dataset_cache import get_artifact
+from trajectory import epoch_seconds
+from server_metrics import register_metric_source
+
+# URL prefix tiles are served under
+TILE_ROUTE = "/tiles"
+
+# Frames with fewer rows ship their points whole (0 turns tiling off)
+TILE_MIN_ROWS = int(os.getenv("TILE_MIN_ROWS", "100000"))
+
+# Time bucket length; the shell requests the buckets its time filter overlaps
+TILE_BUCKET_MINUTES = int(os.getenv("TILE_BUCKET_MINUTES", "15"))
+
+# Deepest zoom tiles are cut at (the shell overzooms past it)
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "12"))
+
+# Memory budget for encoded tiles
+TILE_CACHE_MB = int(os.getenv("TILE_CACHE_MB", "128"))
+
+# Most tiles and buckets the shell requests for one view
+TILE_MAX_VIEW_TILES = int(os.getenv("TILE_MAX_VIEW_TILES", "24"))
+TILE_MAX_BUCKETS = int(os.getenv("TILE_MAX_BUCKETS", "4"))
+
+TILE_LAYER = "aircraft"
+TILE_EXTENT = 4096
+
+# Points within this many tile units of an edge are repeated in the neighbour tile
+TILE_BUFFER = 64
+
+# Cells per tile side; one report (the latest) is kept per cell
+TILE_GRID = 512
+
+# Columns of the point dataset the shell assembles from tiles
+TILE_COLUMNS = ["lat", "lon", "callsign", "timestamp"]
+
+MVT_MIME = "application/vnd.mapbox-vector-tile"
+
+# Web Mercator's latitude limit
+MAX_LATITUDE = 85.05112878
+
+_tiles = OrderedDict()
+_tiles_lock = threading.Lock()
+# Encoded bytes (raw plus gzip) held in _tiles
+_tiles_bytes = 0
+_counters = {"hits": 0, "misses": 0, "points": 0}
+_index_serials = itertools.count()
+
+
+def should_tile(df, min_rows=TILE_MIN_ROWS):
+    """Whether a frame's points go to the map as vector tiles"""
+    return min_rows > 0 and len(df) >= min_rows and {"lat", "lon", "timestamp"} <= set(df.columns)
+
+
+def mercator(lon, lat):
+    """Web Mercator position of lon/lat degrees as fractions of the world (0..1, y down)"""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    x = (lon + 180.0) / 360.0
+    y = 0.5 - np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) / (2 * np.pi)
+    return x, y
+
+
+class TileIndex:
+    """Projected positions of a frame in report-time order, cut into tiles on demand"""
+
+    def __init__(self, df):
+        # Distinguishes indexes of successive frames put under one dataset id
+        self.serial = next(_index_serials)
+        seconds = epoch_seconds(df["timestamp"])
+        order = np.argsort(seconds, kind="stable")
+        self.seconds = seconds[order]
+        x, y = mercator(df["lon"].to_numpy()[order], df["lat"].to_numpy()[order])
+        valid = np.isfinite(x) & np.isfinite(y)
+        self.seconds, self.x, self.y = self.seconds[valid], x[valid], y[valid]
+        if "callsign" in df.columns:
+            callsign = df["callsign"].astype("category")
+            self.labels = [str(v).strip() for v in callsign.cat.categories] + [""]
+            # Missing callsigns (code -1) take the trailing empty label
+            codes = callsign.cat.codes.to_numpy()[order][valid].astype(np.int64)
+            self.callsign = np.where(codes < 0, len(self.labels) - 1, codes)
+        else:
+            self.labels = [""]
+            self.callsign = np.zeros(len(self.seconds), dtype=np.int64)
+
+    @property
+    def nbytes(self):
+        return self.seconds.nbytes + self.x.nbytes + self.y.nbytes + self.callsign.nbytes
+
+    def tile(self, z, x, y, bucket=None, bucket_seconds=TILE_BUCKET_MINUTES * 60):
+        """
+        Encode one tile
+
+        Args:
+            z, x, y: Tile coordinates
+            bucket: Start (epoch seconds) of the time bucket to cut, or None for all times
+            bucket_seconds: Bucket length
+
+        Returns:
+            (MVT bytes, number of points)
+        """
+        lo, hi = 0, len(self.seconds)
+        if bucket is not None:
+            lo = np.searchsorted(self.seconds, bucket, side="left")
+            hi = np.searchsorted(self.seconds, bucket + bucket_seconds, side="left")
+
+        scale = float(1 << z) * TILE_EXTENT
+        px = self.x[lo:hi] * scale - x * TILE_EXTENT
+        py = self.y[lo:hi] * scale - y * TILE_EXTENT
+        inside = np.flatnonzero(
+            (px >= -TILE_BUFFER) & (px < TILE_EXTENT + TILE_BUFFER)
+            & (py >= -TILE_BUFFER) & (py < TILE_EXTENT + TILE_BUFFER)
+        )
+        px = np.floor(px[inside]).astype(np.int64)
+        py = np.floor(py[inside]).astype(np.int64)
+
+        # Rows are in time order, so the last row of each cell is its latest report
+        cell_size = TILE_EXTENT // TILE_GRID
+        margin = TILE_BUFFER // cell_size + 1
+        side = TILE_GRID + 2 * margin
+        cells = (py // cell_size + margin) * side + (px // cell_size + margin)
+        _, last = np.unique(cells[::-1], return_index=True)
+        keep = np.sort(len(cells) - 1 - last)
+
+        rows = lo + inside[keep]
+        body = encode_points(px[keep], py[keep], self.callsign[rows], self.labels, self.seconds[rows])
+        return body, len(keep)
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _message(field, payload):
+    """Length-delimited protobuf field"""
+    return _varint((field << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _varints(values):
+    """Varint encodings of non-negative ints as a (rows, bytes) matrix plus each row's length"""
+    values = np.asarray(values, dtype=np.uint64)
+    width = 1
+    while width < 10 and (values >> np.uint64(7 * width)).any():
+        width += 1
+    lengths = np.ones(len(values), dtype=np.int64)
+    matrix = np.empty((len(values), width), dtype=np.uint8)
+    for k in range(width):
+        matrix[:, k] = (values >> np.uint64(7 * k)) & np.uint64(0x7F)
+        if k:
+            lengths += (values >> np.uint64(7 * k)) > 0
+    # Every byte before a value's last one carries the continuation bit
+    matrix |= np.where(np.arange(width) < lengths[:, None] - 1, 0x80, 0).astype(np.uint8)
+    return matrix, lengths
+
+
+def _constant(count, data):
+    matrix = np.tile(np.frombuffer(bytes(data), dtype=np.uint8), (count, 1))
+    return matrix, np.full(count, len(data), dtype=np.int64)
+
+
+def _join(parts):
+    """Concatenate variable-length byte parts row by row; returns (flat bytes, row lengths)"""
+    matrix = np.hstack([m for m, _ in parts])
+    mask = np.hstack([np.arange(m.shape[1]) < lengths[:, None] for m, lengths in parts])
+    return matrix[mask], sum(lengths for _, lengths in parts)
+
+
+def _zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return (values << 1) ^ (values >> 63)
+
+
+def encode_points(px, py, label_codes, labels, seconds, layer=TILE_LAYER, extent=TILE_EXTENT):
+    """
+    Encode point features as a one-layer MVT tile
+
+    Every feature is a single MoveTo with callsign and timestamp tags; feature
+    messages are built for all points at once from varint byte matrices.
+
+    Args:
+        px, py: Integer positions in tile units
+        label_codes: Index into labels of each point's callsign
+        labels: Callsign strings
+        seconds: Epoch seconds of each point's report
+
+    Returns:
+        Tile bytes
+    """
+    count = len(px)
+    if not count:
+        return b""
+    # Tag values: the tile's callsigns, then its distinct report times
+    used_labels, label_index = np.unique(np.asarray(label_codes, dtype=np.int64), return_inverse=True)
+    used_times, time_index = np.unique(np.asarray(seconds, dtype=np.int64), return_inverse=True)
+    time_index = time_index + len(used_labels)
+
+    tags = [_constant(count, [0]), _varints(label_index), _constant(count, [1]), _varints(time_index)]
+    geometry = [_constant(count, [9]), _varints(_zigzag(px)), _varints(_zigzag(py))]
+    tag_lengths = sum(lengths for _, lengths in tags)
+    geometry_lengths = sum(lengths for _, lengths in geometry)
+    feature = [
+        _constant(count, [0x12]), _varints(tag_lengths), *tags,
+        _constant(count, [0x18, 0x01]),
+        _constant(count, [0x22]), _varints(geometry_lengths), *geometry,
+    ]
+    feature_lengths = sum(lengths for _, lengths in feature)
+    features, _ = _join([_constant(count, [0x12]), _varints(feature_lengths), *feature])
+
+    values = [_message(1, labels[code].encode("utf-8")) for code in used_labels.tolist()]
+    values += [_varint(5 << 3) + _varint(t) for t in used_times.tolist()]
+    body = (
+        _varint((15 << 3) | 0) + _varint(2)
+        + _message(1, layer.encode("utf-8"))
+        + features.tobytes()
+        + _message(3, b"callsign") + _message(3, b"timestamp")
+        + b"".join(_message(4, value) for value in values)
+        + _varint((5 << 3) | 0) + _varint(extent)
+    )
+    return _message(3, body)
+
+
+def tile_source(dataset_id, df, bucket_minutes=TILE_BUCKET_MINUTES):
+    """
+    Tile manifest for a map payload (see kepler_map.assemble_map_payload)
+
+    Returns:
+        dict with the tile URL template, the point layer's columns, tiling limits and
+        the frame's first and last report (epoch seconds)
+    """
+    seconds = epoch_seconds(df["timestamp"])
+    return {
+        "dataId": "flight_paths",
+        "url": f"{TILE_ROUTE}/{dataset_id}/{{z}}/{{x}}/{{y}}.mvt",
+        "layer": TILE_LAYER,
+        "columns": TILE_COLUMNS,
+        "maxZoom": TILE_MAX_ZOOM,
+        "bucketSeconds": bucket_minutes * 60,
+        "maxBuckets": TILE_MAX_BUCKETS,
+        "maxTiles": TILE_MAX_VIEW_TILES,
+        "start": int(seconds.min()),
+        "end": int(seconds.max()),
+    }
+
+
+def get_tile(dataset_id, z, x, y, bucket=None):
+    """
+    Encoded tile entry ({"raw", "gzip", "points"}), or None if the dataset is not cached
+    """
+    index = get_artifact(dataset_id, "tile_index", TileIndex)
+    if index is None:
+        return None
+    key = (dataset_id, index.serial, z, x, y, bucket)
+    with _tiles_lock:
+        entry = _tiles.get(key)
+        if entry is not None:
+            _tiles.move_to_end(key)
+            _counters["hits"] += 1
+            return entry
+
+    raw, points = index.tile(z, x, y, bucket)
+    entry = {"raw": raw, "gzip": gzip.compress(raw, compresslevel=6), "points": points}
+    entry["bytes"] = len(entry["raw"]) + len(entry["gzip"])
+
+    global _tiles_bytes
+    with _tiles_lock:
+        _counters["misses"] += 1
+        _counters["points"] += points
+        # Tiles of an earlier frame under this id can no longer be requested; a
+        # concurrent miss may also have stored this key already
+        for old in [k for k in _tiles if k[0] == dataset_id and k[1] != index.serial] + [key]:
+            if old in _tiles:
+                _tiles_bytes -= _tiles.pop(old)["bytes"]
+        _tiles[key] = entry
+        _tiles_bytes += entry["bytes"]
+        budget = TILE_CACHE_MB * 1024 * 1024
+        while _tiles and _tiles_bytes > budget:
+            _, evicted = _tiles.popitem(last=False)
+            _tiles_bytes -= evicted["bytes"]
+    return entry
+
+
+def register_tile_routes(server, can_read):
+    """
+    Serve vector tiles of cached datasets
+
+    Args:
+        server: Flask app (Dash's app.server)
+        can_read: Callable taking a dataset id; whether the requesting session may read it
+    """
+    @server.route(f"{TILE_ROUTE}/<dataset_id>/<int:z>/<int:x>/<int:y>.mvt")
+    def vector_tile(dataset_id, z, x, y):
+        if not dataset_id.replace("-", "").isalnum() or z > TILE_MAX_ZOOM or x >= (1 << z) or y >= (1 << z):
+            flask.abort(404)
+        if not can_read(dataset_id):
+            flask.abort(403)
+        bucket = flask.request.args.get("t", type=int)
+        if bucket is not None and bucket % (TILE_BUCKET_MINUTES * 60):
+            flask.abort(400, description=f"t must be a multiple of {TILE_BUCKET_MINUTES * 60}")
+
+        entry = get_tile(dataset_id, z, x, y, bucket)
+        if entry is None:
+            flask.abort(404)
+
+        if "gzip" in flask.request.headers.get("Accept-Encoding", ""):
+            response = flask.Response(entry["gzip"], mimetype=MVT_MIME)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = flask.Response(entry["raw"], mimetype=MVT_MIME)
+        response.headers["Vary"] = "Accept-Encoding"
+        # A dataset id can be reloaded with newer rows, so tiles are only briefly fresh
+        response.headers["Cache-Control"] = "private, max-age=300"
+        response.headers["X-Points"] = str(entry["points"])
+        return response
+
+
+def stats():
+    """Tile cache size and counters for monitoring"""
+    with _tiles_lock:
+        return {
+            "tiles": len(_tiles),
+            "bytes": _tiles_bytes,
+            "budget_bytes": TILE_CACHE_MB * 1024 * 1024,
+            **_counters,
+        }
+
+
+register_metric_source("tiles", stats)
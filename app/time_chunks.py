@@ -0,0 +1,158 @@
+"""
+Time-chunked map streaming
+Long datasets go to the map shell as aligned time chunks rather than one payload. The
+frame is bucketed by report time once, each non-empty bucket is encoded on its own
+(transport.py) and stored with the map payload, and the shell fetches chunks as the
+time filter's animation head approaches them, keeping only a window of them in memory.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from trajectory import epoch_seconds
+from transport import encode_frame
+from kepler_map import TRANSPORT_ENCODING, assemble_map_payload
+from render_pool import RenderPoolBusy
+
+# Frames with fewer rows are sent whole
+STREAM_MIN_ROWS = int(os.getenv("STREAM_MIN_ROWS", "200000"))
+
+# Chunk length; chunk boundaries fall on whole multiples of it
+STREAM_CHUNK_MINUTES = int(os.getenv("STREAM_CHUNK_MINUTES", "60"))
+
+# Chunks the map shell fetches ahead of the animation head
+STREAM_PREFETCH_CHUNKS = int(os.getenv("STREAM_PREFETCH_CHUNKS", "2"))
+
+# Most chunks the map shell holds at once (those nearest the head are kept)
+STREAM_MAX_LOADED_CHUNKS = int(os.getenv("STREAM_MAX_LOADED_CHUNKS", "8"))
+
+
+def build_time_index(seconds, chunk_seconds):
+    """
+    Bucket rows by report time
+
+    Args:
+        seconds: int64 epoch seconds per row
+        chunk_seconds: Bucket length
+
+    Returns:
+        dict with "starts" (start of each non-empty bucket, ascending), "order" (row
+        positions grouped by bucket, frame order kept within a bucket) and "offsets"
+        (bucket i is order[offsets[i]:offsets[i + 1]])
+    """
+    buckets = np.asarray(seconds, dtype=np.int64) // chunk_seconds
+    order = np.argsort(buckets, kind="stable")
+    ids, counts = np.unique(buckets, return_counts=True)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return {"starts": ids * chunk_seconds, "order": order, "offsets": offsets}
+
+
+def should_stream(df, encoding=TRANSPORT_ENCODING, min_rows=STREAM_MIN_ROWS, chunk_minutes=STREAM_CHUNK_MINUTES):
+    """Whether a frame is large and long enough (three or more chunks) to stream"""
+    if encoding != "delta" or chunk_minutes <= 0 or len(df) < min_rows or "timestamp" not in df.columns:
+        return False
+    seconds = epoch_seconds(df["timestamp"])
+    return int(seconds.max() - seconds.min()) > 2 * chunk_minutes * 60
+
+
+def plan_time_chunks(df, chunk_minutes=STREAM_CHUNK_MINUTES):
+    """
+    Bucket a frame into time chunks without encoding them
+
+    Returns:
+        dict with "start"/"end" (epoch seconds of the first and last report),
+        "chunkSeconds", "chunks": [{"start", "end", "rows"}] and "positions" (each
+        chunk's row positions in df)
+    """
+    chunk_seconds = chunk_minutes * 60
+    seconds = epoch_seconds(df["timestamp"])
+    index = build_time_index(seconds, chunk_seconds)
+    positions = [
+        index["order"][index["offsets"][i]:index["offsets"][i + 1]]
+        for i in range(len(index["starts"]))
+    ]
+    return {
+        "start": int(seconds.min()),
+        "end": int(seconds.max()),
+        "chunkSeconds": chunk_seconds,
+        "chunks": [
+            {"start": int(start), "end": int(start) + chunk_seconds, "rows": int(len(rows))}
+            for start, rows in zip(index["starts"], positions)
+        ],
+        "positions": positions,
+    }
+
+
+def chunk_frame(df, positions):
+    """Rows of one chunk; each chunk carries only the dictionary entries it uses"""
+    chunk = df.iloc[positions]
+    return chunk.assign(**{
+        col: chunk[col].cat.remove_unused_categories()
+        for col in chunk.columns
+        if isinstance(chunk[col].dtype, pd.CategoricalDtype)
+    })
+
+
+def encode_chunk(chunk):
+    """
+    Encode one chunk as its transport payload JSON (encode_frame)
+
+    Pure pandas/JSON work, so it can run in the render process pool.
+    """
+    return json.dumps(encode_frame(chunk), separators=(",", ":"))
+
+
+def build_streamed_payload(df, plan, store, run=None):
+    """
+    Store a streamed dataset's map payload now and its chunks as they are encoded
+
+    Only the first chunk, which the payload carries inline, is encoded before the
+    payload is stored. The rest are encoded in time order after its URL has been
+    returned, so the map opens without waiting for the whole window and only one
+    chunk's JSON is held at a time.
+
+    Args:
+        df: Frame being streamed
+        plan: Output of plan_time_chunks for df
+        store: Callable taking the number of chunks, an iterator of their JSON and a
+            builder of the payload from their URLs, and returning the payload's URL
+            (map_shell.store_payload_parts). The chunks are stored with the payload,
+            so they are served as long as it is.
+        run: Optional runner for the encoding, called as run(encode_chunk, chunk, rows=n)
+            (e.g. render_pool.run)
+
+    Returns:
+        URL of the map payload carrying the first chunk inline and a manifest of all chunks
+    """
+    def encode(positions):
+        chunk = chunk_frame(df, positions)
+        return run(encode_chunk, chunk, rows=len(chunk)) if run else encode_chunk(chunk)
+
+    first = encode(plan["positions"][0])
+
+    def parts():
+        yield first
+        for positions in plan["positions"][1:]:
+            while True:
+                try:
+                    part = encode(positions)
+                    break
+                except RenderPoolBusy:
+                    # No request waits on the later chunks; wait for the pool rather than drop one
+                    continue
+            yield part
+
+    def build(urls):
+        chunks = [{**c, "url": url} for c, url in zip(plan["chunks"], urls)]
+        stream = {
+            "start": plan["start"],
+            "end": plan["end"],
+            "chunkSeconds": plan["chunkSeconds"],
+            "prefetch": STREAM_PREFETCH_CHUNKS,
+            "maxChunks": max(STREAM_MAX_LOADED_CHUNKS, STREAM_PREFETCH_CHUNKS + 1),
+            "chunks": chunks,
+        }
+        return assemble_map_payload(first, stream=stream)
+
+    return store(len(plan["chunks"]), parts(), build)
@@ -0,0 +1,244 @@
+"""
+Parallel time-sliced fetching
+Long windows are split into fixed, aligned sub-ranges that are queried concurrently over
+separate warehouse connections and concatenated in time order. Aligned slices repeat
+across requests, so completed (past) slices are kept in a small cache and reused.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import pandas as pd
+from databricks_utils import sqlQuery, get_databricks_token, identity_key, use_access_token
+from flight_queries import QUERY_SOURCES, DEDUP_COUNT_COLUMN, build_flight_query, choose_source, rollup_covers
+from dataset_cache import normalize_filters, scoped_dataset_id
+from trajectory import position_keys
+from load_jobs import bind_job, check_cancelled, report_progress
+from server_metrics import register_metric_source
+
+# Concurrent slice queries per fetch (1 fetches slices one after another)
+FETCH_PARALLELISM = int(os.getenv("FETCH_PARALLELISM", "4"))
+
+# Slice length; windows up to this long are fetched with a single query
+FETCH_SLICE_HOURS = float(os.getenv("FETCH_SLICE_HOURS", "6"))
+
+# Slices ending less than this long ago may still receive reports and are not cached
+SLICE_SETTLE_MINUTES = int(os.getenv("SLICE_SETTLE_MINUTES", "30"))
+
+# Number of completed slices kept in memory
+MAX_CACHED_SLICES = int(os.getenv("MAX_CACHED_SLICES", "64"))
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Source of a window whose slices read different tables (a rollup and, for slices
+# the rollup does not cover yet, the raw table)
+MIXED_SOURCE = "mixed"
+
+_slices = OrderedDict()
+_slices_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0}
+
+
+def split_time_range(start_date, end_date, slice_hours=FETCH_SLICE_HOURS):
+    """
+    Split [start_date, end_date] into slices aligned to multiples of slice_hours
+
+    Args:
+        start_date: Start timestamp ('YYYY-MM-DD HH:MM:SS') or None
+        end_date: End timestamp ('YYYY-MM-DD HH:MM:SS') or None
+        slice_hours: Slice length
+
+    Returns:
+        List of (start, end, end_inclusive); a single entry covering the whole
+        range when it is open-ended or no longer than one slice
+    """
+    if not start_date or not end_date or slice_hours <= 0:
+        return [(start_date, end_date, True)]
+    start = datetime.strptime(start_date, TIME_FORMAT)
+    end = datetime.strptime(end_date, TIME_FORMAT)
+    step = timedelta(hours=slice_hours)
+    if end - start <= step:
+        return [(start_date, end_date, True)]
+
+    # Boundaries at whole multiples of the slice length since midnight
+    day = datetime(start.year, start.month, start.day)
+    boundary = day + step * ((start - day) // step + 1)
+    slices = []
+    lower = start
+    while boundary < end:
+        slices.append((lower.strftime(TIME_FORMAT), boundary.strftime(TIME_FORMAT), False))
+        lower = boundary
+        boundary += step
+    slices.append((lower.strftime(TIME_FORMAT), end_date, True))
+    return slices
+
+
+def slice_hours_for(source):
+    """Slice length for a query source; rollups hold far fewer rows per hour, so their slices are longer"""
+    bucket_seconds = QUERY_SOURCES[source][1]
+    return FETCH_SLICE_HOURS * max(bucket_seconds / 60, 1)
+
+
+def slice_source(source, end_date):
+    """Source a slice ending at end_date actually reads: raw where the rollups do not cover it yet"""
+    if source != "raw" and not rollup_covers(end_date):
+        return "raw"
+    return source
+
+
+def combine_sources(sources):
+    """Source of a window from its slices' sources: theirs if they agree, else MIXED_SOURCE"""
+    sources = set(sources)
+    return sources.pop() if len(sources) == 1 else MIXED_SOURCE
+
+
+def window_source(start_date, end_date):
+    """Source a fetch of the window reads, routed and sliced as app._fetch_flight_data does"""
+    source = choose_source(start_date, end_date)
+    slices = split_time_range(start_date, end_date, slice_hours=slice_hours_for(source))
+    return combine_sources(slice_source(source, end) for _, end, _ in slices)
+
+
+def _slice_settled(end_date):
+    """Whether a slice ends far enough in the past for its contents to be final"""
+    end = datetime.strptime(end_date, TIME_FORMAT)
+    return end < datetime.now() - timedelta(minutes=SLICE_SETTLE_MINUTES)
+
+
+def get_cached_slice(slice_id):
+    """Cached frame for a slice id, or None"""
+    with _slices_lock:
+        df = _slices.get(slice_id)
+        if df is not None:
+            _slices.move_to_end(slice_id)
+        return df
+
+
+def put_cached_slice(slice_id, df):
+    """Keep a completed slice for reuse by later fetches"""
+    with _slices_lock:
+        _slices[slice_id] = df
+        _slices.move_to_end(slice_id)
+        while len(_slices) > MAX_CACHED_SLICES:
+            _slices.popitem(last=False)
+
+
+def slice_id(identity, callsigns, countries, start_date, end_date, end_inclusive, dedup, source="raw", sample_seconds=0):
+    """Cache key for one slice; includes the identity so results are never shared across users"""
+    filters = normalize_filters(
+        callsigns, countries, start_date, end_date,
+        dedup=dedup, end_inclusive=end_inclusive, source=source, sample=sample_seconds or None
+    )
+    return scoped_dataset_id(identity, filters)
+
+
+def fetch_slice(callsigns, countries, start_date, end_date, end_inclusive=True, dedup=None, source="raw", sample_seconds=0):
+    """
+    Fetch one time slice, from the slice cache when possible
+
+    Slices the rollups do not cover yet (see flight_queries.rollup_covers) read
+    the raw table instead of the requested source.
+
+    Returns:
+        (DataFrame ordered by timestamp (shared with the cache; do not modify in
+        place), key of QUERY_SOURCES the slice was read from)
+    """
+    source = slice_source(source, end_date)
+    key = slice_id(identity_key(get_databricks_token()), callsigns, countries, start_date, end_date, end_inclusive, dedup, source, sample_seconds)
+    df = get_cached_slice(key)
+    with _slices_lock:
+        _counters["hits" if df is not None else "misses"] += 1
+    if df is not None:
+        return df, source
+
+    query = build_flight_query(
+        callsigns=callsigns,
+        countries=countries,
+        start_date=start_date,
+        end_date=end_date,
+        dedup=dedup,
+        end_inclusive=end_inclusive,
+        source=source,
+        sample_seconds=sample_seconds
+    )
+    df = sqlQuery(query)
+    if _slice_settled(end_date):
+        put_cached_slice(key, df)
+    return df, source
+
+
+def fetch_time_slices(callsigns, countries, slices, dedup=None, parallelism=FETCH_PARALLELISM, source="raw", sample_seconds=0):
+    """
+    Fetch slices concurrently, each over its own warehouse connection
+
+    Args:
+        callsigns: List of callsigns to filter
+        countries: List of origin countries to filter
+        slices: Output of split_time_range
+        dedup: Dedup mode passed to build_flight_query
+        parallelism: Maximum concurrent queries
+        source: Query source for the window (see flight_queries.choose_source)
+        sample_seconds: Sparse-fetch bucket passed to build_flight_query
+
+    Returns:
+        (list of DataFrames, list of the QUERY_SOURCES keys each was read from),
+        both in slice (time) order; see combine_sources
+    """
+    # Worker threads have no request context: pass the caller's token and job along
+    token = get_databricks_token()
+
+    def fetch(start_date, end_date, end_inclusive):
+        with use_access_token(token):
+            return fetch_slice(callsigns, countries, start_date, end_date, end_inclusive, dedup, source, sample_seconds)
+
+    fetch = bind_job(fetch, progress=False)
+    frames = [None] * len(slices)
+    sources = [None] * len(slices)
+    with ThreadPoolExecutor(max_workers=max(parallelism, 1), thread_name_prefix="time-slice") as executor:
+        futures = {executor.submit(fetch, *s): i for i, s in enumerate(slices)}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                frames[futures[future]], sources[futures[future]] = future.result()
+                check_cancelled()
+                report_progress(f"Fetched {done}/{len(slices)} time slices")
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return frames, sources
+
+
+def concat_time_slices(frames, dedup=None):
+    """
+    Concatenate slice frames in time order (each is already sorted, so no re-sort)
+
+    With SQL dedup each slice is deduplicated on its own, so a position whose
+    heartbeats straddle a slice boundary appears once per slice; those repeats are
+    dropped here and their report counts folded into the row that is kept.
+    """
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+
+    if dedup == "sql" and len(frames) > 1 and "last_position" in df.columns:
+        keys = position_keys(df)
+        duplicate = keys.duplicated().to_numpy()
+        if duplicate.any():
+            if DEDUP_COUNT_COLUMN in df.columns:
+                df[DEDUP_COUNT_COLUMN] = df[DEDUP_COUNT_COLUMN].groupby(
+                    [keys["aircraft"].to_numpy(), keys["position_time"].to_numpy()]
+                ).transform("sum")
+            df = df[~duplicate].reset_index(drop=True)
+    return df
+
+
+def stats():
+    """Counters for monitoring"""
+    with _slices_lock:
+        return {"cached": len(_slices), **_counters}
+
+
+register_metric_source("time_slices", stats)
@@ -0,0 +1,460 @@
+"""
+Trajectory post-processing for flight position reports
+Splits each aircraft's reports into distinct flights, prunes redundant points and
+derives kinematics (speed, heading, climb rate) from consecutive positions
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# A new flight starts when consecutive reports are further apart than either limit
+SEGMENT_MAX_GAP_SECONDS = int(os.getenv("SEGMENT_MAX_GAP_SECONDS", "900"))
+SEGMENT_MAX_GAP_KM = float(os.getenv("SEGMENT_MAX_GAP_KM", "150"))
+
+# Positions closer than this (in degrees, ~10 m) are treated as the same point
+STATIONARY_EPSILON_DEG = 1e-4
+
+# Spacing of positions interpolated between sparse reports (see interpolate_positions)
+INTERPOLATE_SECONDS = int(os.getenv("INTERPOLATE_SECONDS", "10"))
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Derive groundspeed/track (and vertical_rate when altitude is present) from positions
+DERIVE_KINEMATICS = os.getenv("DERIVE_KINEMATICS", "1") == "1"
+
+# Derived speeds above this (m/s) come from position glitches; neighbouring values are used instead
+MAX_DERIVED_SPEED_MS = 400.0
+
+# Hops shorter than this (m) give no usable heading
+MIN_HEADING_DISTANCE_M = 5.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres between arrays of coordinates"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    """Initial great-circle bearing in degrees clockwise from north (0-360) between arrays of coordinates"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    dlon = lon2 - lon1
+    y = np.sin(dlon) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+
+def epoch_seconds(values):
+    """Convert a timestamp column (strings, datetimes or epoch ints) to int64 epoch seconds"""
+    series = pd.Series(values)
+    if pd.api.types.is_integer_dtype(series):
+        return series.to_numpy(dtype=np.int64)
+    return pd.to_datetime(series).to_numpy().astype("datetime64[s]").astype(np.int64)
+
+
+def key_codes(series):
+    """Array to compare keys by: category codes for categoricals, raw values otherwise"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy()
+    return series.to_numpy()
+
+
+def group_starts(keys):
+    """Boolean mask marking the first row of each run of equal keys in a sorted array"""
+    keys = np.asarray(keys)
+    starts = np.ones(len(keys), dtype=bool)
+    if len(keys) > 1:
+        starts[1:] = keys[1:] != keys[:-1]
+    return starts
+
+
+def segment_flights(df, max_gap_seconds=SEGMENT_MAX_GAP_SECONDS, max_gap_km=SEGMENT_MAX_GAP_KM,
+                    time_col="timestamp", aircraft_col="icao24"):
+    """
+    Split each aircraft's position reports into distinct flights
+
+    Reports are sorted by aircraft and time once, then a new flight starts wherever
+    the aircraft changes, the callsign changes, or consecutive reports are further
+    apart than max_gap_seconds or max_gap_km.
+
+    Args:
+        df: DataFrame with aircraft, time, lat and lon columns
+        max_gap_seconds: Time gap that splits a trajectory into two flights
+        max_gap_km: Distance jump that splits a trajectory into two flights
+        time_col: Column holding the report timestamp
+        aircraft_col: Column identifying the aircraft
+
+    Returns:
+        Sorted DataFrame copy with a categorical `flight_id` column ("<icao24>-<n>")
+    """
+    if df.empty:
+        return df.assign(flight_id=pd.Series(dtype="category"))
+
+    t = epoch_seconds(df[time_col])
+    df = df.assign(_t=t).sort_values([aircraft_col, "_t"], kind="stable").reset_index(drop=True)
+
+    keys = key_codes(df[aircraft_col])
+    t = df["_t"].to_numpy()
+    lat = df["lat"].to_numpy(dtype=np.float64)
+    lon = df["lon"].to_numpy(dtype=np.float64)
+
+    starts = group_starts(keys)
+    if len(df) > 1:
+        gap = (np.diff(t) > max_gap_seconds) | (haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:]) > max_gap_km)
+        if "callsign" in df.columns:
+            gap |= group_starts(key_codes(df["callsign"]))[1:]
+        starts[1:] |= gap
+
+    return label_flights(df, starts, aircraft_col).drop(columns="_t")
+
+
+def label_flights(df, starts, aircraft_col="icao24"):
+    """
+    Set `flight_id` from the rows where flights start
+
+    Args:
+        df: Frame sorted by aircraft and time
+        starts: Boolean mask of rows starting a flight (every aircraft's first row included)
+        aircraft_col: Column identifying the aircraft
+
+    Returns:
+        df with a categorical `flight_id` column ("<icao24>-<n>", n counting each
+        aircraft's flights from 0)
+    """
+    new_aircraft = group_starts(key_codes(df[aircraft_col]))
+    starts = starts | new_aircraft
+
+    # Number flights per aircraft: global segment index minus the aircraft's first segment index
+    segment = np.cumsum(starts) - 1
+    first_segment = segment[new_aircraft][np.cumsum(new_aircraft) - 1]
+    sequence = segment - first_segment
+
+    # One label per flight rather than one string per report
+    first_rows = np.flatnonzero(starts)
+    labels = (
+        pd.Series(df[aircraft_col].to_numpy()[first_rows]).astype(str)
+        + "-" + pd.Series(sequence[first_rows]).astype(str)
+    )
+    return df.assign(flight_id=pd.Categorical.from_codes(segment, categories=pd.Index(labels)))
+
+
+def _repeats_previous(values):
+    """Boolean mask marking rows whose value equals the previous row's"""
+    repeats = np.zeros(len(values), dtype=bool)
+    repeats[1:] = values[1:] == values[:-1]
+    return repeats
+
+
+def _same_position_as_previous(df, epsilon):
+    """Boolean mask marking rows at the same position as the previous row of the same flight"""
+    flight = key_codes(df["flight_id"])
+    lat = df["lat"].to_numpy(dtype=np.float64)
+    lon = df["lon"].to_numpy(dtype=np.float64)
+    same = np.zeros(len(df), dtype=bool)
+    same[1:] = (
+        (flight[1:] == flight[:-1])
+        & (np.abs(lat[1:] - lat[:-1]) <= epsilon)
+        & (np.abs(lon[1:] - lon[:-1]) <= epsilon)
+    )
+    return same
+
+
+def prune_stationary(df, epsilon=STATIONARY_EPSILON_DEG, time_col="timestamp", min_points=1):
+    """
+    Drop duplicate and stationary position reports within each flight
+
+    Exact repeats (same time and position) are removed, and runs of reports at the
+    same position keep only their first and last point so dwell time is preserved
+    while the interior of the run is discarded. Flights left with fewer than
+    min_points reports are dropped; by default every flight is kept, since a single
+    report still belongs on the points layer and in the stats (path builders such as
+    trips.py skip flights too short to draw).
+
+    Args:
+        df: Output of segment_flights (sorted, with `flight_id`)
+        epsilon: Coordinate tolerance in degrees for "same position"
+        time_col: Column holding the report timestamp
+        min_points: Minimum reports a flight needs to be kept
+
+    Returns:
+        Filtered DataFrame
+    """
+    if df.empty:
+        return df
+
+    # Exact repeats first, so they cannot hide the end of a stationary run
+    t = epoch_seconds(df[time_col])
+    df = df[~(_same_position_as_previous(df, epsilon) & _repeats_previous(t))]
+
+    # Interior of a stationary run: same position as both neighbours
+    same_prev = _same_position_as_previous(df, epsilon)
+    same_next = np.zeros(len(df), dtype=bool)
+    same_next[:-1] = same_prev[1:]
+    df = df[~(same_prev & same_next)]
+
+    if min_points > 1:
+        counts = df.groupby("flight_id", sort=False, observed=True)["flight_id"].transform("size")
+        df = df[counts.to_numpy() >= min_points]
+
+    df = df.reset_index(drop=True)
+    if isinstance(df["flight_id"].dtype, pd.CategoricalDtype):
+        df["flight_id"] = df["flight_id"].cat.remove_unused_categories()
+    return df
+
+
+def _is_sorted(aircraft, flight, seconds):
+    """Whether rows are already ordered by aircraft, then flight, then time"""
+    if len(seconds) < 2:
+        return True
+    try:
+        same_aircraft = aircraft[1:] == aircraft[:-1]
+        same_flight = same_aircraft & (flight[1:] == flight[:-1])
+        return bool(np.all(
+            (aircraft[1:] > aircraft[:-1])
+            | (same_aircraft & (flight[1:] > flight[:-1]))
+            | (same_flight & (seconds[1:] >= seconds[:-1]))
+        ))
+    except TypeError:
+        return False
+
+
+def _fill_within_groups(values, valid, starts):
+    """
+    Replace invalid values with the nearest earlier valid value of their group
+    (or the next one when there is none before); groups with no valid value get 0
+    """
+    if valid.all():
+        return values
+    positions = np.arange(len(values))
+    group_start = np.maximum.accumulate(np.where(starts, positions, 0))
+    group_end = np.minimum.accumulate(np.where(np.append(starts[1:], True), positions, len(values))[::-1])[::-1]
+
+    previous = np.maximum.accumulate(np.where(valid, positions, -1))
+    following = np.minimum.accumulate(np.where(valid, positions, len(values))[::-1])[::-1]
+    use_previous = previous >= group_start
+    use_following = ~use_previous & (following <= group_end)
+
+    filled = np.zeros(len(values), dtype=values.dtype)
+    filled[use_previous] = values[previous[use_previous]]
+    filled[use_following] = values[following[use_following]]
+    return filled
+
+
+def derive_kinematics(df, time_col="timestamp", aircraft_col="icao24"):
+    """
+    Derive groundspeed, track and climb rate from consecutive positions
+
+    Each report takes the hop from the previous report of its flight (a flight's
+    first report takes the hop to its second). Hops with no elapsed time, glitch
+    speeds above MAX_DERIVED_SPEED_MS, and headings over hops shorter than
+    MIN_HEADING_DISTANCE_M are replaced by the nearest usable value of the same
+    flight, so every value is defined. One sort and a handful of array passes,
+    with no per-group Python.
+
+    Args:
+        df: Frame with aircraft, time, lat and lon columns (flight_id and altitude optional)
+
+    Returns:
+        Copy of df with float32 `groundspeed` (m/s), `track` (degrees from north)
+        and, when the frame has altitude, `vertical_rate` (m/s)
+    """
+    if df.empty:
+        return df
+
+    seconds = epoch_seconds(df[time_col])
+    aircraft = key_codes(df[aircraft_col])
+    flight = key_codes(df["flight_id"]) if "flight_id" in df.columns else aircraft
+    # prepare_trajectories output is already in order; only sort when it is not
+    order = None if _is_sorted(aircraft, flight, seconds) else np.lexsort((seconds, flight, aircraft))
+    sort = (lambda values: values) if order is None else (lambda values: values[order])
+    t = sort(seconds)
+    starts = group_starts(sort(aircraft)) | group_starts(sort(flight))
+
+    # Hop i runs from sorted row i to row i + 1; distance and bearing share their trig
+    phi = np.radians(sort(df["lat"].to_numpy(dtype=np.float64)))
+    lam = np.radians(sort(df["lon"].to_numpy(dtype=np.float64)))
+    sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+    dlam = np.diff(lam)
+    a = np.sin(np.diff(phi) / 2.0) ** 2 + cos_phi[:-1] * cos_phi[1:] * np.sin(dlam / 2.0) ** 2
+    distance = 2000.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    hop_track = np.degrees(np.arctan2(
+        np.sin(dlam) * cos_phi[1:],
+        cos_phi[:-1] * sin_phi[1:] - sin_phi[:-1] * cos_phi[1:] * np.cos(dlam),
+    )) % 360.0
+
+    dt = np.diff(t).astype(np.float64)
+    hop_ok = ~starts[1:] & (dt > 0)
+    elapsed = np.where(hop_ok, dt, 1.0)
+    hop_speed = distance / elapsed
+    hop_ok &= hop_speed <= MAX_DERIVED_SPEED_MS
+
+    # Row r uses hop r - 1, or hop r when it starts its flight
+    hop = np.arange(len(t)) - 1
+    hop[starts] += 1
+    has_hop = (hop >= 0) & (hop < len(dt))
+    hop = np.clip(hop, 0, max(len(dt) - 1, 0))
+
+    def per_row(values, usable):
+        if len(dt) == 0:
+            return np.zeros(len(t), dtype=np.float32)
+        valid = has_hop & usable[hop]
+        return _fill_within_groups(values[hop], valid, starts).astype(np.float32)
+
+    columns = {
+        "groundspeed": per_row(hop_speed, hop_ok),
+        "track": per_row(hop_track, hop_ok & (distance >= MIN_HEADING_DISTANCE_M)),
+    }
+    if "altitude" in df.columns:
+        climb = np.diff(sort(df["altitude"].to_numpy(dtype=np.float64))) / elapsed
+        columns["vertical_rate"] = per_row(climb, hop_ok & ~np.isnan(climb))
+
+    if order is not None:
+        # Back to the frame's own row order
+        for name, values in columns.items():
+            columns[name] = np.empty_like(values)
+            columns[name][order] = values
+    return df.assign(**columns)
+
+
+def prepare_trajectories(df):
+    """
+    Segment raw reports into flights, prune stationary points and derive kinematics for rendering
+
+    Args:
+        df: DataFrame with icao24, timestamp, lat and lon columns
+
+    Returns:
+        DataFrame with `flight_id` (and groundspeed/track, see derive_kinematics),
+        sorted by aircraft and time
+    """
+    if df.empty:
+        return df
+
+    rows_in = len(df)
+    df = prune_stationary(segment_flights(df))
+    if DERIVE_KINEMATICS:
+        df = derive_kinematics(df)
+    print(
+        f"Segmented {rows_in} reports into {df['flight_id'].nunique()} flights, "
+        f"pruned {rows_in - len(df)} stationary/duplicate points"
+    )
+    return df
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)
+
+
+def interpolate_positions(df, step_seconds=INTERPOLATE_SECONDS, time_col="timestamp", aircraft_col="icao24"):
+    """
+    Fill in positions between sparse reports along great circles
+
+    Within each flight, consecutive reports more than step_seconds apart get
+    evenly spaced positions in between (spherical linear interpolation; altitude
+    linearly), so animation stays smooth on a decimated fetch. Flights are already
+    split at long gaps (see segment_flights), so nothing is bridged across them.
+
+    Args:
+        df: Frame from prepare_trajectories
+        step_seconds: Target spacing of positions
+
+    Returns:
+        New DataFrame sorted by aircraft, flight and time; inserted rows copy the
+        earlier report's other columns. df.attrs["interpolated_rows"] holds how
+        many were inserted.
+    """
+    if df.empty or step_seconds <= 0:
+        return df
+
+    seconds = epoch_seconds(df[time_col])
+    aircraft = key_codes(df[aircraft_col])
+    flight = key_codes(df["flight_id"]) if "flight_id" in df.columns else aircraft
+    order = np.lexsort((seconds, flight, aircraft))
+    seconds = seconds[order]
+    flight = flight[order]
+    n = len(order)
+
+    # Positions to insert after each report, before the next report of its flight
+    gap = np.zeros(n, dtype=np.int64)
+    gap[:-1] = seconds[1:] - seconds[:-1]
+    same_flight = np.zeros(n, dtype=bool)
+    same_flight[:-1] = flight[1:] == flight[:-1]
+    inserts = np.where(same_flight, np.maximum(-(-gap // step_seconds) - 1, 0), 0)
+    if not inserts.any():
+        return df
+
+    # Each report followed by its inserts; step is 0 for the report itself
+    source = np.repeat(np.arange(n), inserts + 1)
+    first = np.repeat(np.cumsum(inserts + 1) - (inserts + 1), inserts + 1)
+    step = np.arange(len(source)) - first
+    fraction = step / (inserts[source] + 1)
+    inserted = step > 0
+    nxt = np.minimum(source + 1, n - 1)
+
+    lat = df["lat"].to_numpy(dtype=np.float64)[order]
+    lon = df["lon"].to_numpy(dtype=np.float64)[order]
+    ax, ay, az = _unit_vectors(lat[source], lon[source])
+    bx, by, bz = _unit_vectors(lat[nxt], lon[nxt])
+    omega = np.arccos(np.clip(ax * bx + ay * by + az * bz, -1.0, 1.0))
+    sin_omega = np.sin(omega)
+    # Nearly coincident points fall back to linear weights
+    close = sin_omega < 1e-12
+    safe = np.where(close, 1.0, sin_omega)
+    wa = np.where(close, 1.0 - fraction, np.sin((1.0 - fraction) * omega) / safe)
+    wb = np.where(close, fraction, np.sin(fraction * omega) / safe)
+    x, y, z = wa * ax + wb * bx, wa * ay + wb * by, wa * az + wb * bz
+
+    out = df.take(order[source]).reset_index(drop=True)
+    out["lat"] = np.where(inserted, np.degrees(np.arctan2(z, np.hypot(x, y))), lat[source]).astype(df["lat"].dtype)
+    out["lon"] = np.where(inserted, np.degrees(np.arctan2(y, x)), lon[source]).astype(df["lon"].dtype)
+    if "altitude" in df.columns:
+        altitude = df["altitude"].to_numpy(dtype=np.float64)[order]
+        blended = altitude[source] + fraction * (altitude[nxt] - altitude[source])
+        out["altitude"] = blended.astype(df["altitude"].dtype)
+
+    times = seconds[source] + np.rint(fraction * gap[source]).astype(np.int64)
+    for col in (time_col, "last_position"):
+        if col not in df.columns:
+            continue
+        if pd.api.types.is_integer_dtype(df[col]):
+            values = np.where(inserted, times, out[col].to_numpy()).astype(df[col].dtype)
+        else:
+            values = out[col].where(~inserted, pd.to_datetime(times, unit="s"))
+        out[col] = values
+
+    out.attrs = {**df.attrs, "interpolated_rows": int(inserted.sum())}
+    return out
+
+
+def dedupe_positions(df, aircraft_col="icao24", position_time_col="last_position", time_col="timestamp"):
+    """
+    Keep one report per (aircraft, position time), dropping repeated heartbeats
+
+    Rows are expected in report order, so the first heartbeat for each position
+    is kept. Rows without a position time fall back to their report time.
+
+    Args:
+        df: DataFrame of raw position reports
+        aircraft_col: Column identifying the aircraft
+        position_time_col: Column holding the time the position was measured
+        time_col: Column holding the report timestamp
+
+    Returns:
+        Tuple of (deduplicated DataFrame, number of rows removed)
+    """
+    if df.empty or position_time_col not in df.columns:
+        return df, 0
+
+    duplicate = position_keys(df, aircraft_col, position_time_col, time_col).duplicated().to_numpy()
+    return df[~duplicate].reset_index(drop=True), int(duplicate.sum())
+
+
+def position_keys(df, aircraft_col="icao24", position_time_col="last_position", time_col="timestamp"):
+    """(aircraft, position time) key per report, as used by dedupe_positions"""
+    return pd.DataFrame({
+        "aircraft": df[aircraft_col].to_numpy(),
+        "position_time": df[position_time_col].fillna(df[time_col]).to_numpy(),
+    })
@@ -0,0 +1,160 @@
+"""
+Compact transport encoding for flight frames sent to the map shell
+Columns travel separately instead of as row arrays. Strings become a dictionary plus
+codes, coordinates are quantized (1e-5 degrees, ~1 m) and times kept as epoch seconds.
+Every integer stream is delta-encoded along the frame (rows are sorted by aircraft,
+flight and time, so deltas stay small within a trajectory) and packed with the
+polyline varint scheme into a printable string. Coordinates are delta-encoded twice:
+aircraft move at near-constant velocity, so the second difference is close to zero.
+static/kepler_shell.js decodes it.
+"""
+
+import numpy as np
+import pandas as pd
+from frame_schema import EPOCH_COLUMNS
+from trajectory import epoch_seconds
+
+ENCODING = "delta-v1"
+
+# Decimal places kept per float column (others default to DEFAULT_FLOAT_PRECISION)
+FLOAT_PRECISION = {"lat": 5, "lon": 5, "altitude": 0, "groundspeed": 1, "track": 0, "vertical_rate": 1}
+DEFAULT_FLOAT_PRECISION = 2
+
+# Float columns encoded as second differences
+SECOND_ORDER_COLUMNS = {"lat", "lon"}
+
+# 64-bit values need at most 13 five-bit chunks
+_MAX_CHUNKS = 13
+
+
+def polyline_encode(values):
+    """
+    Pack int64 values as a polyline-style string (zigzag, 5-bit chunks, offset 63)
+
+    Args:
+        values: Integer array (already delta-encoded)
+
+    Returns:
+        ASCII string
+    """
+    v = np.asarray(values, dtype=np.int64)
+    if len(v) == 0:
+        return ""
+    zigzag = ((v << 1) ^ (v >> 63)).view(np.uint64)
+
+    # Chunks per value: one, plus one for each further 5 bits in use
+    nchunks = np.ones(len(zigzag), dtype=np.int64)
+    for k in range(1, _MAX_CHUNKS):
+        nchunks += zigzag >= np.uint64(1) << np.uint64(5 * k)
+    width = int(nchunks.max())
+
+    shifts = (np.arange(width, dtype=np.uint64) * np.uint64(5))[None, :]
+    chunks = ((zigzag[:, None] >> shifts) & np.uint64(31)).astype(np.uint8)
+    position = np.arange(width)[None, :]
+    chunks[position < (nchunks[:, None] - 1)] |= 0x20
+    chunks += 63
+    keep = position < nchunks[:, None]
+    return chunks[keep].tobytes().decode("ascii")
+
+
+def polyline_decode(text):
+    """Inverse of polyline_encode (reference implementation, mirrors the JS decoder)"""
+    values = []
+    value = shift = 0
+    for byte in text.encode("ascii"):
+        chunk = byte - 63
+        value |= (chunk & 31) << shift
+        shift += 5
+        if not chunk & 0x20:
+            values.append((value >> 1) ^ -(value & 1))
+            value = shift = 0
+    return np.array(values, dtype=np.int64)
+
+
+def _delta(values, order=1):
+    out = np.asarray(values, dtype=np.int64)
+    for _ in range(order):
+        previous = out
+        out = np.empty_like(previous)
+        if len(previous):
+            out[0] = previous[0]
+            out[1:] = np.diff(previous)
+    return out
+
+
+def _undelta(deltas, order=1):
+    values = np.asarray(deltas, dtype=np.int64)
+    for _ in range(order):
+        values = np.cumsum(values)
+    return values
+
+
+def _encode_column(name, series):
+    """Encode one column; returns a JSON-serializable spec"""
+    if name in EPOCH_COLUMNS:
+        return {"type": "time", "delta": polyline_encode(_delta(epoch_seconds(series)))}
+
+    if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(series) or series.dtype == object:
+        categorical = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+        return {
+            "type": "dict",
+            "values": [str(v) for v in categorical.cat.categories],
+            "codes": polyline_encode(_delta(categorical.cat.codes.to_numpy())),
+        }
+
+    if pd.api.types.is_bool_dtype(series):
+        return {"type": "bool", "delta": polyline_encode(_delta(series.to_numpy(dtype=np.int64)))}
+
+    if pd.api.types.is_integer_dtype(series):
+        return {"type": "int", "delta": polyline_encode(_delta(series.to_numpy()))}
+
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype=np.float64)
+        missing = np.isnan(values)
+        if missing.any():
+            # Rare for floats here; keep them exact rather than invent a null code
+            return {"type": "plain", "values": [None if m else float(v) for v, m in zip(values, missing)]}
+        precision = FLOAT_PRECISION.get(name, DEFAULT_FLOAT_PRECISION)
+        order = 2 if name in SECOND_ORDER_COLUMNS else 1
+        quantized = np.rint(values * 10 ** precision).astype(np.int64)
+        return {"type": "float", "precision": precision, "order": order, "delta": polyline_encode(_delta(quantized, order))}
+
+    return {"type": "plain", "values": series.astype(object).where(series.notna(), None).tolist()}
+
+
+def encode_frame(df):
+    """
+    Encode a frame for the map shell
+
+    Returns:
+        {"encoding": "delta-v1", "rows": n, "columns": [...], "series": {name: spec}}
+    """
+    return {
+        "encoding": ENCODING,
+        "rows": int(len(df)),
+        "columns": [str(col) for col in df.columns],
+        "series": {str(col): _encode_column(str(col), df[col]) for col in df.columns},
+    }
+
+
+def decode_frame(encoded):
+    """
+    Decode encode_frame output back into a DataFrame (times as epoch seconds)
+
+    Mirrors the map shell's decoder; test_transport.py round-trips frames through it.
+    """
+    columns = {}
+    for name in encoded["columns"]:
+        spec = encoded["series"][name]
+        kind = spec["type"]
+        if kind == "dict":
+            codes = _undelta(polyline_decode(spec["codes"]))
+            columns[name] = pd.Categorical.from_codes(codes, categories=spec["values"])
+        elif kind in ("time", "int", "bool"):
+            values = _undelta(polyline_decode(spec["delta"]))
+            columns[name] = values.astype(bool) if kind == "bool" else values
+        elif kind == "float":
+            columns[name] = _undelta(polyline_decode(spec["delta"]), spec.get("order", 1)) / 10 ** spec["precision"]
+        else:
+            columns[name] = spec["values"]
+    return pd.DataFrame(columns)
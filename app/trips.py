@@ -0,0 +1,153 @@
+"""
+Trip-layer GeoJSON
+Kepler's trip layer natively takes LineStrings whose coordinates carry a timestamp
+([lon, lat, altitude, epoch seconds]). Building them here spares the browser from
+grouping and sorting raw rows into paths on every load. Features are cached per
+aircraft and window, so a reload or an overlapping filter only builds the aircraft
+it has not seen.
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+from trajectory import epoch_seconds, key_codes, group_starts
+from server_metrics import register_metric_source
+
+# Aircraft (per window) whose features are kept in memory
+MAX_CACHED_TRIPS = int(os.getenv("MAX_CACHED_TRIPS", "20000"))
+
+# Decimal places kept for longitude/latitude (altitude is rounded to whole meters)
+TRIP_COORD_PRECISION = 5
+
+TRIP_PROPERTIES = ["icao24", "callsign", "origin_country", "flight_id"]
+
+_trips = OrderedDict()
+_trips_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0}
+
+
+def trip_features(df):
+    """
+    Build trip features, one LineString per flight
+
+    Pure numpy/JSON work, so it can run in the render process pool. Flights with
+    fewer than two positions have no path and are left to the point layer.
+
+    Args:
+        df: Flight frame with icao24, lat, lon and timestamp (flight_id optional)
+
+    Returns:
+        dict mapping icao24 to the comma-joined JSON of its features
+    """
+    if df.empty:
+        return {}
+
+    seconds = epoch_seconds(df["timestamp"])
+    aircraft = key_codes(df["icao24"])
+    flight = key_codes(df["flight_id"]) if "flight_id" in df.columns else aircraft
+    order = np.lexsort((seconds, flight, aircraft))
+
+    altitude = df["altitude"].to_numpy(dtype=np.float64) if "altitude" in df.columns else np.zeros(len(df))
+    # One formatting pass over the whole frame; altitude and time stay integers
+    coords = list(map(
+        "[{},{},{},{}]".format,
+        np.round(df["lon"].to_numpy(dtype=np.float64), TRIP_COORD_PRECISION)[order].tolist(),
+        np.round(df["lat"].to_numpy(dtype=np.float64), TRIP_COORD_PRECISION)[order].tolist(),
+        np.rint(np.nan_to_num(altitude)).astype(np.int64)[order].tolist(),
+        seconds[order].tolist(),
+    ))
+    properties = df[[c for c in TRIP_PROPERTIES if c in df.columns]].iloc[order]
+
+    starts = np.flatnonzero(group_starts(flight[order]))
+    ends = np.append(starts[1:], len(order))
+    features = {}
+    for start, end in zip(starts, ends):
+        if end - start < 2:
+            continue
+        props = {k: (None if v != v else str(v)) for k, v in properties.iloc[start].items()}
+        feature = (
+            '{"type":"Feature","geometry":{"type":"LineString","coordinates":'
+            + "[" + ",".join(coords[start:end]) + "]"
+            + '},"properties":' + json.dumps(props, separators=(",", ":")) + '}'
+        )
+        features.setdefault(props["icao24"], []).append(feature)
+    return {icao24: ",".join(parts) for icao24, parts in features.items()}
+
+
+def _trip_key(icao24, window, seconds):
+    """
+    Cache key for one aircraft's features in a window
+
+    The row count and time span guard against reusing a trajectory built from a
+    different subset of the aircraft's reports (e.g. under a callsign filter).
+    """
+    return (icao24, tuple(window), len(seconds), int(seconds.min()), int(seconds.max()))
+
+
+def build_trip_collection(df, window=None, run=None):
+    """
+    GeoJSON FeatureCollection of trips for a frame, reusing cached aircraft
+
+    Args:
+        df: Flight frame
+        window: (start, end) the frame was fetched for; defaults to df.attrs["window"]
+            or the frame's own time span
+        run: Optional runner for the build step, called as run(trip_features, df, rows=n)
+            (e.g. render_pool.run)
+
+    Returns:
+        JSON string
+    """
+    if df.empty:
+        return '{"type":"FeatureCollection","features":[]}'
+
+    seconds = epoch_seconds(df["timestamp"])
+    if window is None:
+        window = df.attrs.get("window") or (int(seconds.min()), int(seconds.max()))
+
+    aircraft = df["icao24"].astype("category")
+    codes = key_codes(aircraft)
+    labels = aircraft.cat.categories
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(group_starts(codes[order]))
+    ends = np.append(starts[1:], len(order))
+
+    keys = {}
+    for start, end in zip(starts, ends):
+        icao24 = str(labels[codes[order[start]]])
+        keys[icao24] = _trip_key(icao24, window, seconds[order[start:end]])
+
+    fragments = {}
+    with _trips_lock:
+        for icao24, key in keys.items():
+            if key in _trips:
+                _trips.move_to_end(key)
+                fragments[icao24] = _trips[key]
+        _counters["hits"] += len(fragments)
+        _counters["misses"] += len(keys) - len(fragments)
+
+    missing = [icao24 for icao24 in keys if icao24 not in fragments]
+    if missing:
+        subset = df[df["icao24"].astype(str).isin(missing).to_numpy()]
+        built = run(trip_features, subset, rows=len(subset)) if run else trip_features(subset)
+        with _trips_lock:
+            for icao24 in missing:
+                # Aircraft without a two-point flight cache as empty
+                fragments[icao24] = _trips[keys[icao24]] = built.get(icao24, "")
+                _trips.move_to_end(keys[icao24])
+            while len(_trips) > MAX_CACHED_TRIPS:
+                _trips.popitem(last=False)
+
+    features = ",".join(f for f in fragments.values() if f)
+    return '{"type":"FeatureCollection","features":[' + features + ']}'
+
+
+def stats():
+    """Counters for monitoring"""
+    with _trips_lock:
+        return {"cached": len(_trips), **_counters}
+
+
+register_metric_source("trip_cache", stats)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Derived kinematics at scale
+Times trajectory.derive_kinematics (one sort plus array passes over group
+boundaries) against the idiomatic pandas version (groupby + shift per flight) on
+synthetic frames in the app's compact schema, and checks that both give the same
+speeds. The baseline leaves each flight's first report undefined and does not
+screen glitches; the engine fills both from neighbouring hops.
+
+Usage: python benchmarks/bench_kinematics.py [--rows 1000000,5000000] [--repeat 3]
+"""
+
+import argparse
+import time
+import numpy as np
+
+from synthetic_flights import make_flights
+from trajectory import derive_kinematics, segment_flights, haversine_km, bearing_deg, epoch_seconds
+from frame_schema import compact_frame
+
+
+def pandas_kinematics(df):
+    """Baseline: previous report per flight via groupby().shift()"""
+    df = df.assign(_t=epoch_seconds(df["timestamp"]))
+    previous = df.groupby("flight_id", sort=False, observed=True)[["lat", "lon", "_t"]].shift()
+    dt = (df["_t"] - previous["_t"]).to_numpy(dtype=np.float64)
+    distance = haversine_km(previous["lat"], previous["lon"], df["lat"], df["lon"]) * 1000.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = distance / dt
+    track = bearing_deg(previous["lat"], previous["lon"], df["lat"], df["lon"])
+    return df.assign(groundspeed=speed, track=track).drop(columns="_t")
+
+
+def best_of(repeat, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="1000000,5000000")
+    parser.add_argument("--aircraft", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'flights':>8}  {'numpy s':>8}  {'M rows/s':>8}  {'pandas s':>8}  {'speedup':>7}  {'max |dv| m/s':>12}")
+    for rows in [int(r) for r in args.rows.split(",")]:
+        # The compact schema and flight order prepare_trajectories works on
+        df = segment_flights(compact_frame(make_flights(rows=rows, aircraft=args.aircraft)))
+        numpy_s, derived = best_of(args.repeat, derive_kinematics, df)
+        pandas_s, baseline = best_of(args.repeat, pandas_kinematics, df)
+
+        # The baseline leaves each flight's first report undefined; compare the rest
+        defined = ~np.isnan(baseline["groundspeed"].to_numpy())
+        diff = np.abs(derived["groundspeed"].to_numpy(dtype=np.float64)[defined] - baseline["groundspeed"].to_numpy()[defined])
+        print(f"{len(df):>10,}  {df['flight_id'].nunique():>8,}  {numpy_s:>8.3f}  {len(df) / numpy_s / 1e6:>8.1f}  "
+              f"{pandas_s:>8.3f}  {pandas_s / numpy_s:>6.1f}x  {np.nanmax(diff):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
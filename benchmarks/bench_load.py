@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Concurrent dashboard sessions against a running app
+Starts the app (gunicorn, or the Flask development server) with the local warehouse
+stand-in (LOCAL_WAREHOUSE=1, see local_warehouse.py) answering queries after a
+configurable latency, then drives N simulated sessions through the real Dash
+callback endpoints. Each session loads the page and its filter options
+(load_filter_options) and the initial view (load_flight_data), then changes the
+filters and clicks Load repeatedly: the load is polled to completion,
+update_map_and_stats is called with the new dataset and the map payload is fetched,
+as the browser would. The server is restarted for every concurrency level.
+
+Reports p50/p95/p99 latency per step, loads and requests per second, and the
+resident memory of the server's process tree (workers and render processes).
+
+Usage: python benchmarks/bench_load.py [--sessions 1,4,16] [--clicks 5] [--latency-ms 500] [--server gunicorn]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import requests
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from local_warehouse import COUNTRIES, LOCAL_AIRCRAFT
+
+STEPS = ["page", "filter_options", "load_click", "load_poll", "map_and_stats", "map_payload", "click_to_map"]
+
+
+class Recorder:
+    """Latencies per step and request/error counts, shared by all sessions"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {step: [] for step in STEPS}
+        self.requests = 0
+        self.loads = 0
+        self.errors = []
+
+    def add(self, step, seconds):
+        with self.lock:
+            self.latencies[step].append(seconds)
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def error(self, text):
+        with self.lock:
+            self.errors.append(text)
+
+
+class DashClient:
+    """One browser session talking to the Dash endpoints"""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.http = requests.Session()
+        self.http.headers["Accept-Encoding"] = "gzip"
+        self.dependencies = {}
+
+    def get(self, path):
+        self.recorder.count_request()
+        response = self.http.get(self.base_url + path, timeout=300)
+        response.raise_for_status()
+        return response
+
+    def load_page(self):
+        """Fetch the page, layout and callback graph"""
+        self.get("/")
+        self.get("/_dash-layout")
+        for dep in self.get("/_dash-dependencies").json():
+            for output in dep["output"].strip(".").split("..."):
+                self.dependencies[output] = dep
+
+    def callback(self, output, changed, values):
+        """
+        Fire the callback producing `output` as the renderer would
+
+        Args:
+            output: Any one of the callback's outputs, e.g. "map-payload.data"
+            changed: Triggering "id.property"
+            values: Current "id.property" values of its inputs and states (others are None)
+
+        Returns:
+            dict of updated "id.property" values (empty when the update was prevented)
+        """
+        dep = self.dependencies[output]
+        outputs = [
+            {"id": o.split(".")[0], "property": o.split(".")[1]}
+            for o in dep["output"].strip(".").split("...")
+        ]
+
+        def props(items):
+            return [{"id": i["id"], "property": i["property"], "value": values.get(f"{i['id']}.{i['property']}")} for i in items]
+
+        body = {
+            "output": dep["output"],
+            "outputs": outputs if dep["output"].startswith("..") else outputs[0],
+            "inputs": props(dep["inputs"]),
+            "state": props(dep["state"]),
+            "changedPropIds": [changed],
+        }
+        self.recorder.count_request()
+        response = self.http.post(self.base_url + "/_dash-update-component", json=body, timeout=300)
+        if response.status_code == 204:
+            return {}
+        response.raise_for_status()
+        result = response.json()["response"]
+        return {f"{i}.{p}": v for i, updates in result.items() for p, v in updates.items()}
+
+
+def pick_filters(rng, now):
+    """A Load click's filters: some countries or callsigns over a recent window of 1-6 hours"""
+    hours = rng.choice([1, 2, 3, 6])
+    end = now - timedelta(minutes=10 * rng.randrange(0, 36))
+    filters = {
+        "callsign-filter.value": None,
+        "country-filter.value": None,
+        "start-datetime-filter.value": (end - timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M"),
+        "end-datetime-filter.value": end.strftime("%Y-%m-%dT%H:%M"),
+    }
+    if rng.random() < 0.7:
+        filters["country-filter.value"] = rng.sample(COUNTRIES, rng.randint(1, 3))
+    else:
+        filters["callsign-filter.value"] = [f"LCL{i:04d}" for i in rng.sample(range(LOCAL_AIRCRAFT), rng.randint(5, 40))]
+    return filters
+
+
+class Session:
+    """Simulated user: initial view, then filter changes and Load clicks"""
+
+    def __init__(self, base_url, recorder, views, rng, poll_seconds, think_seconds):
+        self.client = DashClient(base_url, recorder)
+        self.recorder = recorder
+        self.views = views
+        self.rng = rng
+        self.poll_seconds = poll_seconds
+        self.think_seconds = think_seconds
+        self.state = {"initial-load-complete.data": False}
+
+    def timed(self, step, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.recorder.add(step, time.perf_counter() - started)
+        return result
+
+    def fire(self, step, output, changed):
+        updates = self.timed(step, self.client.callback, output, changed, self.state)
+        self.state.update(updates)
+        return updates
+
+    def wait_for_load(self):
+        """Poll the running load like the page's interval until it hands over a dataset"""
+        polls = 0
+        while self.state.get("load-job.data"):
+            time.sleep(self.poll_seconds)
+            polls += 1
+            self.state["load-poll.n_intervals"] = polls
+            self.fire("load_poll", "flight-data-store.data", "load-poll.n_intervals")
+        text = self.state.get("status-text.children")
+        if not self.state.get("flight-data-store.data"):
+            self.recorder.error(f"load: {text}")
+
+    def show_map(self):
+        """What the page does once flight-data-store changes"""
+        updates = self.fire("map_and_stats", "map-payload.data", "flight-data-store.data")
+        payload = updates.get("map-payload.data") or {}
+        if payload.get("url"):
+            self.timed("map_payload", self.client.get, payload["url"])
+        elif self.state.get("flight-data-store.data"):
+            self.recorder.error(f"map: {payload.get('message')}")
+
+    def finish_load(self, started):
+        self.wait_for_load()
+        self.show_map()
+        self.recorder.add("click_to_map", time.perf_counter() - started)
+        with self.recorder.lock:
+            self.recorder.loads += 1
+
+    def run(self, clicks):
+        self.timed("page", self.client.load_page)
+        # The initial-load interval fires both callbacks at once, so the load still
+        # sees initial-load-complete unset
+        self.state["initial-load-trigger.n_intervals"] = 1
+        started = time.perf_counter()
+        self.fire("load_click", "flight-data-store.data", "initial-load-trigger.n_intervals")
+        self.fire("filter_options", "callsign-filter.options", "initial-load-trigger.n_intervals")
+        self.finish_load(started)
+
+        for click in range(clicks):
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_seconds)
+            self.state.update(self.rng.choice(self.views))
+            # Changing a filter fires load_flight_data too (it only cancels a running load)
+            self.client.callback("flight-data-store.data", "country-filter.value", self.state)
+            self.state["load-button.n_clicks"] = click + 1
+            started = time.perf_counter()
+            self.fire("load_click", "flight-data-store.data", "load-button.n_clicks")
+            self.finish_load(started)
+
+
+def process_tree_rss(pid):
+    """Resident memory (bytes) of a process and all its descendants (Linux /proc)"""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after its ')'
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    tree = {pid}
+    grew = True
+    while grew:
+        children = {p for p, parent in parents.items() if parent in tree} - tree
+        tree |= children
+        grew = bool(children)
+    page = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for p in tree:
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1]) * page
+        except OSError:
+            continue
+    return total
+
+
+class MemorySampler(threading.Thread):
+    """Peak resident memory of the server process tree while a level runs"""
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, process_tree_rss(self.pid))
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peak
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, workdir):
+    """Start the app on a free port; returns (process, base URL, log path)"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        LOCAL_WAREHOUSE="1",
+        LOCAL_LATENCY_MS=str(args.latency_ms),
+        LOCAL_LATENCY_MS_PER_MROWS=str(args.latency_ms_per_mrows),
+        LOAD_POLL_INTERVAL_MS=str(args.poll_ms),
+        PREWARM_DEFAULT_VIEW="1" if args.prewarm else "0",
+        WEB_CONCURRENCY=str(args.workers),
+        JOB_DIR=os.path.join(workdir, "jobs"),
+        PAYLOAD_DIR=os.path.join(workdir, "payloads"),
+    )
+    if args.server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app:server"]
+    else:
+        command = [sys.executable, "app.py"]
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with {process.returncode}, see {log_path}")
+        try:
+            if requests.get(base_url + "/_dash-layout", timeout=5).status_code == 200:
+                return process, base_url, log_path
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    process.kill()
+    raise RuntimeError(f"server did not start, see {log_path}")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_level(args, sessions, views, workdir):
+    """Run `sessions` concurrent sessions against a fresh server"""
+    process, base_url, log_path = start_server(args, workdir)
+    try:
+        baseline = process_tree_rss(process.pid)
+        sampler = MemorySampler(process.pid)
+        sampler.start()
+        recorder = Recorder()
+
+        def session(i):
+            rng = random.Random(args.seed * 1000 + i)
+            try:
+                Session(base_url, recorder, views, rng, args.poll_ms / 1000, args.think_seconds).run(args.clicks)
+            except Exception as e:
+                recorder.error(f"session {i}: {e}")
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+        for t in threads:
+            t.start()
+            # Sessions arrive over the ramp rather than all at once
+            time.sleep(args.ramp_seconds / sessions)
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        peak = sampler.stop()
+        metrics = requests.get(base_url + "/metrics", timeout=30).json()
+    finally:
+        stop_server(process)
+
+    return {
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "loads_per_s": recorder.loads / elapsed,
+        "requests_per_s": recorder.requests / elapsed,
+        "latencies": recorder.latencies,
+        "errors": recorder.errors,
+        "rss_baseline_mb": baseline / 2**20,
+        "rss_peak_mb": peak / 2**20,
+        "warehouse": metrics.get("local_warehouse", {}).get("tables", {}),
+        "log": log_path,
+    }
+
+
+def percentiles(values):
+    if not values:
+        return [float("nan")] * 3
+    return [float(np.percentile(values, q)) for q in (50, 95, 99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", default="1,4,16", help="concurrency levels")
+    parser.add_argument("--clicks", type=int, default=5, help="Load clicks per session after the initial view")
+    parser.add_argument("--latency-ms", type=float, default=500, help="warehouse latency per query")
+    parser.add_argument("--latency-ms-per-mrows", type=float, default=2000, help="extra warehouse latency per million rows")
+    parser.add_argument("--views", type=int, default=20, help="distinct filter sets clicks choose from (0: every click is new)")
+    parser.add_argument("--think-seconds", type=float, default=2.0, help="mean pause between clicks")
+    parser.add_argument("--ramp-seconds", type=float, default=2.0, help="time over which sessions arrive")
+    parser.add_argument("--poll-ms", type=int, default=1000, help="load progress poll interval (LOAD_POLL_INTERVAL_MS)")
+    parser.add_argument("--server", choices=["gunicorn", "dev"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers (WEB_CONCURRENCY)")
+    parser.add_argument("--prewarm", action="store_true", help="serve the pre-warmed default view on first load")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.server == "gunicorn" and shutil.which("gunicorn") is None:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            print("gunicorn is not installed, using the development server\n")
+            args.server = "dev"
+
+    rng = random.Random(args.seed)
+    now = datetime.now().replace(second=0, microsecond=0)
+    levels = [int(s) for s in args.sessions.split(",")]
+    # With --views 0 there are enough filter sets for every click to be (almost surely) new
+    views = [pick_filters(rng, now) for _ in range(args.views or max(levels) * args.clicks)]
+
+    server = f"gunicorn ({args.workers} workers)" if args.server == "gunicorn" else "development server"
+    print(f"{server}, warehouse latency {args.latency_ms:.0f} ms "
+          f"+ {args.latency_ms_per_mrows:.0f} ms/M rows, {args.clicks} clicks per session, "
+          f"{len(views)} filter sets\n")
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    try:
+        for sessions in levels:
+            level_dir = os.path.join(workdir, str(sessions))
+            os.makedirs(level_dir)
+            results.append(run_level(args, sessions, views, level_dir))
+
+            r = results[-1]
+            queries = sum(t["queries"] for t in r["warehouse"].values())
+            print(f"{sessions} sessions: {r['loads_per_s']:.2f} loads/s, {r['requests_per_s']:.1f} requests/s, "
+                  f"server RSS {r['rss_baseline_mb']:.0f} MB idle / {r['rss_peak_mb']:.0f} MB peak, "
+                  f"{queries} warehouse queries, {len(r['errors'])} errors")
+            print(f"  {'step':<15} {'n':>5}  {'p50 s':>7}  {'p95 s':>7}  {'p99 s':>7}")
+            for step in STEPS:
+                p50, p95, p99 = percentiles(r["latencies"][step])
+                print(f"  {step:<15} {len(r['latencies'][step]):>5}  {p50:>7.3f}  {p95:>7.3f}  {p99:>7.3f}")
+            for error in r["errors"][:5]:
+                print(f"  error: {error}")
+            if r["errors"]:
+                print(f"  (server log: {r['log']})")
+            print()
+    finally:
+        if not any(r["errors"] for r in results):
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Map rendering throughput under concurrent sessions
+Compares rendering inline on request threads (the dev-server behaviour) with the
+render process pool. Each "session" is a thread rendering map payloads back to back;
+a probe thread measures how long a trivial request waits meanwhile.
+
+Usage: python benchmarks/bench_render_pool.py [--rows 200000] [--renders 4] [--sessions 1,2,4,8]
+"""
+
+import argparse
+import os
+import threading
+import time
+import numpy as np
+
+from synthetic_flights import make_flights
+from kepler_map import build_map_payload
+from trajectory import segment_flights, prune_stationary
+from render_pool import RenderPool
+
+
+def quiet_prepare(df):
+    """prepare_trajectories without its per-call summary line"""
+    return prune_stationary(segment_flights(df))
+
+
+def render(pool, df):
+    """What the app does per load: post-process, then build the map payload"""
+    df = pool.run(quiet_prepare, df, rows=len(df))
+    return pool.run(build_map_payload, df, rows=len(df))
+
+
+def probe(stop, latencies):
+    """A light callback: small Python work every 50 ms, timed end to end"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        sum(range(10_000))
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.05)
+
+
+def run(pool, df, sessions, renders):
+    """Run `sessions` concurrent threads doing `renders` renders each"""
+    latencies = []
+    probe_latencies = []
+    lock = threading.Lock()
+
+    def session():
+        for _ in range(renders):
+            started = time.perf_counter()
+            render(pool, df)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    stop = threading.Event()
+    probe_thread = threading.Thread(target=probe, args=(stop, probe_latencies), daemon=True)
+    probe_thread.start()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    probe_thread.join()
+
+    return {
+        "renders_per_s": len(latencies) / elapsed,
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p95_s": float(np.percentile(latencies, 95)),
+        "probe_p95_ms": float(np.percentile(probe_latencies, 95) * 1000) if probe_latencies else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--renders", type=int, default=4, help="renders per session")
+    parser.add_argument("--sessions", default="1,2,4,8")
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    df = make_flights(rows=args.rows)
+    print(f"{len(df):,} rows, {args.renders} renders per session, {args.processes} pool processes\n")
+
+    inline = RenderPool(processes=0)
+    pooled = RenderPool(processes=args.processes, queue_limit=64, queue_timeout=600, min_rows=0)
+    pooled.run(len, [])  # start the workers outside the timed runs
+
+    print(f"{'sessions':>8}  {'mode':<6}  {'renders/s':>9}  {'p50 s':>7}  {'p95 s':>7}  {'probe p95 ms':>12}")
+    try:
+        for sessions in [int(s) for s in args.sessions.split(",")]:
+            for mode, pool in (("inline", inline), ("pool", pooled)):
+                r = run(pool, df, sessions, args.renders)
+                print(f"{sessions:>8}  {mode:<6}  {r['renders_per_s']:>9.2f}  {r['p50_s']:>7.2f}  "
+                      f"{r['p95_s']:>7.2f}  {r['probe_p95_ms']:>12.1f}")
+    finally:
+        pooled.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Bytes scanned per dashboard query
+Runs the queries a typical dashboard session issues (raw-table loads by country and
+by callsign, rollup loads for long windows, and the statistics aggregate) on the SQL
+warehouse, with the result cache off. Per query it reports the bytes and files read
+and the files pruned, taken from the warehouse's query history. Each query is run
+with the original predicates and with the shaped ones (flight_queries.SHAPE_PREDICATES).
+
+To measure the table layout, save a run before the maintenance job
+(resources/maintenance_jobs.yml) has clustered the tables and one after, then
+compare them:
+
+    python benchmarks/bench_scan.py --save before.json
+    (run the ingest-flights-maintenance job)
+    python benchmarks/bench_scan.py --save after.json
+    python benchmarks/bench_scan.py --compare before.json after.json
+
+Needs DATABRICKS_HOST, DATABRICKS_TOKEN and DATABRICKS_WAREHOUSE_ID (see app.yml);
+--print-queries only prints the SQL.
+
+Usage: python benchmarks/bench_scan.py [--country "United States"] [--callsigns 20] [--end "YYYY-MM-DD HH:MM:SS"] [--save run.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import flight_queries
+from flight_queries import TABLE_NAME, TIME_FORMAT, build_flight_query, choose_source
+from flight_stats import build_stats_query
+
+VARIANTS = {"original": False, "shaped": True}
+
+# Seconds to wait for a statement's metrics to reach the query history
+HISTORY_TIMEOUT = 60
+
+
+def dashboard_queries(end, country, callsigns):
+    """(name, builder) of the queries a session issues, each routed as the app routes it"""
+    def load(hours, **filters):
+        start = (end - timedelta(hours=hours)).strftime(TIME_FORMAT)
+        stop = end.strftime(TIME_FORMAT)
+        source = choose_source(start, stop)
+        return lambda: build_flight_query(start_date=start, end_date=stop, source=source, **filters)
+
+    def stats(hours, **filters):
+        start = (end - timedelta(hours=hours)).strftime(TIME_FORMAT)
+        return lambda: build_stats_query(start_date=start, end_date=end.strftime(TIME_FORMAT), **filters)
+
+    def label(hours):
+        start = (end - timedelta(hours=hours)).strftime(TIME_FORMAT)
+        return choose_source(start, end.strftime(TIME_FORMAT))
+
+    return [
+        (f"1h, 1 country ({label(1)})", load(1, countries=[country])),
+        (f"1h, {len(callsigns)} callsigns ({label(1)})", load(1, callsigns=callsigns)),
+        (f"6h, 1 country ({label(6)})", load(6, countries=[country])),
+        (f"1d, 1 country ({label(24)})", load(24, countries=[country])),
+        (f"7d, {len(callsigns)} callsigns ({label(168)})", load(168, callsigns=callsigns)),
+        ("1h, 1 country (stats aggregate)", stats(1, countries=[country])),
+    ]
+
+
+class Warehouse:
+    """SQL connection with the result cache off, plus query-history metrics"""
+
+    def __init__(self):
+        from databricks import sql
+        from databricks.sdk import WorkspaceClient
+        from databricks_utils import DATABRICKS_WAREHOUSE_ID, get_databricks_server_hostname, get_databricks_token
+        host = get_databricks_server_hostname()
+        token = get_databricks_token()
+        self.connection = sql.connect(
+            http_path=f"/sql/1.0/warehouses/{DATABRICKS_WAREHOUSE_ID}",
+            server_hostname=host,
+            access_token=token,
+        )
+        self.cursor = self.connection.cursor()
+        # Cached results read no files and would hide the layout
+        self.cursor.execute("SET use_cached_result = false")
+        self.workspace = WorkspaceClient(host=f"https://{host}", token=token)
+
+    def query(self, sql_text):
+        self.cursor.execute(sql_text)
+        return self.cursor.fetchall_arrow()
+
+    def run(self, sql_text):
+        """Run a query to completion and return its scan metrics"""
+        started = time.perf_counter()
+        rows = self.query(sql_text).num_rows
+        elapsed = time.perf_counter() - started
+        return {"rows": rows, "seconds": elapsed, **self.metrics(self.cursor.query_id)}
+
+    def metrics(self, statement_id):
+        from databricks.sdk.service.sql import QueryFilter
+        deadline = time.monotonic() + HISTORY_TIMEOUT
+        while True:
+            found = self.workspace.query_history.list(
+                filter_by=QueryFilter(statement_ids=[statement_id]),
+                include_metrics=True,
+            )
+            for info in found.res or []:
+                m = info.metrics
+                if m is not None and m.read_bytes is not None:
+                    return {
+                        "read_bytes": m.read_bytes,
+                        "read_files": m.read_files_count,
+                        "pruned_files": m.pruned_files_count,
+                        "pruned_bytes": m.pruned_bytes,
+                        "rows_read": m.rows_read_count,
+                    }
+            if time.monotonic() > deadline:
+                return {"read_bytes": None, "read_files": None, "pruned_files": None, "pruned_bytes": None, "rows_read": None}
+            time.sleep(2)
+
+    def busiest_callsigns(self, end, count):
+        start = (end - timedelta(hours=1)).strftime(TIME_FORMAT)
+        table = self.query(f"""
+            SELECT callsign, COUNT(*) AS reports
+            FROM {TABLE_NAME}
+            WHERE callsign IS NOT NULL
+              AND last_contact >= to_utc_timestamp('{start}', 'America/New_York')
+              AND last_contact <= to_utc_timestamp('{end.strftime(TIME_FORMAT)}', 'America/New_York')
+            GROUP BY callsign
+            ORDER BY reports DESC
+            LIMIT {int(count)}
+        """)
+        return [str(v) for v in table.column("callsign").to_pylist()]
+
+    def close(self):
+        self.cursor.close()
+        self.connection.close()
+
+
+def megabytes(value):
+    return "n/a" if value is None else f"{value / 1e6:,.1f}"
+
+
+def run_benchmark(args):
+    end = datetime.strptime(args.end, TIME_FORMAT) if args.end else (datetime.now() - timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    callsigns = [c.strip() for c in args.callsign_list.split(",")] if args.callsign_list else None
+
+    if args.print_queries:
+        placeholders = [f"CALLSIGN{i}" for i in range(args.callsigns)]
+        for name, build in dashboard_queries(end, args.country, callsigns or placeholders):
+            for variant, shaped in VARIANTS.items():
+                flight_queries.SHAPE_PREDICATES = shaped
+                print(f"-- {name} [{variant}]\n{build().strip()}\n")
+        return None
+
+    warehouse = Warehouse()
+    try:
+        callsigns = callsigns or warehouse.busiest_callsigns(end, args.callsigns)
+        results = []
+        print(f"{'query':<34}  {'variant':<8}  {'MB read':>10}  {'files read':>10}  {'pruned':>8}  {'rows':>10}  {'seconds':>7}")
+        for name, build in dashboard_queries(end, args.country, callsigns):
+            for variant, shaped in VARIANTS.items():
+                flight_queries.SHAPE_PREDICATES = shaped
+                result = {"query": name, "variant": variant, **warehouse.run(build())}
+                results.append(result)
+                print(f"{name:<34}  {variant:<8}  {megabytes(result['read_bytes']):>10}  {result['read_files'] or 0:>10,}  "
+                      f"{result['pruned_files'] or 0:>8,}  {result['rows']:>10,}  {result['seconds']:>7.2f}")
+    finally:
+        warehouse.close()
+
+    for variant in VARIANTS:
+        total = sum(r["read_bytes"] or 0 for r in results if r["variant"] == variant)
+        print(f"Total {variant}: {total / 1e6:,.1f} MB read")
+    return {"end": end.strftime(TIME_FORMAT), "country": args.country, "callsigns": callsigns, "results": results}
+
+
+def compare(before_path, after_path):
+    """Bytes read per query and variant in two saved runs"""
+    with open(before_path) as f:
+        before = {(r["query"], r["variant"]): r for r in json.load(f)["results"]}
+    with open(after_path) as f:
+        after = {(r["query"], r["variant"]): r for r in json.load(f)["results"]}
+
+    print(f"{'query':<34}  {'variant':<8}  {'MB before':>10}  {'MB after':>10}  {'ratio':>6}")
+    for key in [k for k in before if k in after]:
+        old, new = before[key]["read_bytes"], after[key]["read_bytes"]
+        ratio = f"{old / new:>5.1f}x" if old and new else "   n/a"
+        print(f"{key[0]:<34}  {key[1]:<8}  {megabytes(old):>10}  {megabytes(new):>10}  {ratio}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--country", default="United States")
+    parser.add_argument("--callsigns", type=int, default=20, help="Busiest callsigns of the last hour to filter on")
+    parser.add_argument("--callsign-list", help="Comma-separated callsigns to use instead")
+    parser.add_argument("--end", help="Window end (Eastern, 'YYYY-MM-DD HH:MM:SS'); defaults to a day ago")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two saved runs")
+    parser.add_argument("--print-queries", action="store_true", help="Print the queries without running them")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    run = run_benchmark(args)
+    if run and args.save:
+        with open(args.save, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Saved {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Cold-start time of the Dash app
+Each run starts a fresh interpreter in app/ and reports the time until app.py is
+imported and until the first page and layout requests are answered (via Flask's
+test client). The pre-warmed default view is disabled so no warehouse is needed.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--importtime]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+CHILD = """
+import json, time
+started = time.time()
+import app
+imported = time.time()
+client = app.server.test_client()
+assert client.get("/").status_code == 200
+assert client.get("/_dash-layout").status_code == 200
+responded = time.time()
+print("STARTUP " + json.dumps({"import": imported - started, "first_response": responded - started, "imported_at": imported, "responded_at": responded}))
+"""
+
+
+def run_once(env):
+    launched = time.time()
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    line = next(l for l in out.stdout.splitlines() if l.startswith("STARTUP "))
+    result = json.loads(line[len("STARTUP "):])
+    result["process_to_response"] = result["responded_at"] - launched
+    return result
+
+
+def top_imports(env, count=12):
+    """Slowest top-level imports under app.py according to -X importtime"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=APP_DIR, env=env, capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Direct imports of app.py are nested one level (two spaces after the separator)
+        if not name.startswith("   ") or name.startswith("     "):
+            continue
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="list the slowest imports")
+    args = parser.parse_args()
+
+    env = {**os.environ, "PREWARM_DEFAULT_VIEW": "0", "RENDER_PROCESSES": "0"}
+    results = [run_once(env) for _ in range(args.runs)]
+
+    print(f"{args.runs} cold starts (median / max seconds)")
+    for key, label in (("import", "import app"), ("first_response", "import + first page/layout"),
+                       ("process_to_response", "process launch to first response")):
+        values = [r[key] for r in results]
+        print(f"  {label:<34} {statistics.median(values):6.2f} / {max(values):6.2f}")
+
+    if args.importtime:
+        print("\nSlowest direct imports of app.py (cumulative seconds)")
+        for seconds, name in top_imports(env):
+            print(f"  {seconds:6.2f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
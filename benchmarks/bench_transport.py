@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Map payload size and encode time: split-orientation JSON vs the delta transport encoding
+Sizes are reported raw and gzipped (what /map-data actually sends), and each encoded
+frame is decoded again to check the round trip.
+
+Usage: python benchmarks/bench_transport.py [--rows 10000,100000,500000]
+"""
+
+import argparse
+import gzip
+import json
+import time
+import numpy as np
+
+from synthetic_flights import make_flights
+from frame_schema import compact_frame
+from trajectory import segment_flights, prune_stationary
+from kepler_map import split_data_json
+from transport import encode_frame, decode_frame
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def check_round_trip(df, encoded):
+    """Decoded frame must match the source within the quantization step"""
+    decoded = decode_frame(json.loads(encoded))
+    for col in ("icao24", "callsign", "flight_id"):
+        assert (decoded[col].astype(str).to_numpy() == df[col].astype(str).to_numpy()).all(), col
+    assert (decoded["timestamp"].to_numpy() == df["timestamp"].to_numpy()).all(), "timestamp"
+    for col in ("lat", "lon"):
+        error = np.abs(decoded[col].to_numpy() - df[col].to_numpy(dtype=np.float64)).max()
+        assert error <= 1e-5, f"{col} error {error}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", default="10000,100000,500000")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'format':<6}  {'raw KB':>9}  {'gzip KB':>8}  {'encode s':>8}  {'vs json (gzip)':>14}")
+    for rows in [int(r) for r in args.rows.split(",")]:
+        df = prune_stationary(segment_flights(compact_frame(make_flights(rows=rows))))
+
+        split, split_s = timed(split_data_json, df)
+        delta, delta_s = timed(lambda frame: json.dumps(encode_frame(frame), separators=(",", ":")), df)
+        check_round_trip(df, delta)
+
+        split_gz = len(gzip.compress(split.encode(), 6))
+        delta_gz = len(gzip.compress(delta.encode(), 6))
+        print(f"{len(df):>8}  {'json':<6}  {len(split) / 1024:>9.0f}  {split_gz / 1024:>8.0f}  {split_s:>8.2f}  {'':>14}")
+        print(f"{len(df):>8}  {'delta':<6}  {len(delta) / 1024:>9.0f}  {delta_gz / 1024:>8.0f}  {delta_s:>8.2f}  "
+              f"{split_gz / delta_gz:>13.1f}x")
+
+
+if __name__ == "__main__":
+    main()
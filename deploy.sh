@@ -20,6 +20,16 @@ echo "   Target: $TARGET"
 echo "   Workspace: $DATABRICKS_HOST"
 echo ""
 
+# Vendor the Kepler.gl/React bundles so the app serves them itself
+echo "📥 Vendoring Kepler.gl assets..."
+(cd app && python kepler_assets.py)
+
+if [ $? -ne 0 ]; then
+    echo "⚠️  Could not vendor Kepler.gl assets; the map will load them from public CDNs"
+fi
+
+echo ""
+
 # Validate the bundle
 echo "✅ Validating Databricks Asset Bundle..."
 databricks bundle validate
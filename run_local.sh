@@ -50,7 +50,11 @@ echo ""
 echo "Press Ctrl+C to stop the application"
 echo ""
 
-# Run the application
+# Run the application (set DEV_SERVER=1 for the Flask development server)
 cd app
-python app.py
+if [ "$DEV_SERVER" = "1" ]; then
+    python app.py
+else
+    gunicorn app:server -c gunicorn.conf.py --bind "${HOST}:${PORT}"
+fi
 
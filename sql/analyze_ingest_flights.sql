@@ -0,0 +1,12 @@
+-- Column statistics for the optimizer, refreshed after each OPTIMIZE by the
+-- ingest_flights_maintenance job (resources/maintenance_jobs.yml). They cover the
+-- filtered columns and icao24, the key of every per-aircraft window.
+
+ANALYZE TABLE justinm.opensky.ingest_flights
+  COMPUTE STATISTICS FOR COLUMNS last_contact, origin_country, callsign, icao24;
+
+ANALYZE TABLE justinm.opensky.flight_positions_1m
+  COMPUTE STATISTICS FOR COLUMNS bucket, last_contact, origin_country, callsign, icao24;
+
+ANALYZE TABLE justinm.opensky.flight_positions_10m
+  COMPUTE STATISTICS FOR COLUMNS bucket, last_contact, origin_country, callsign, icao24;
@@ -0,0 +1,19 @@
+-- Layout maintenance for the raw position table and its rollups. Run daily by the
+-- ingest_flights_maintenance job (resources/maintenance_jobs.yml).
+--
+-- Every dashboard query filters ingest_flights on a last_contact range and usually
+-- on origin_country and/or callsign (see app/flight_queries.py), so the table is
+-- liquid-clustered on those columns. OPTIMIZE is incremental: it only rewrites
+-- files written since the last run. Setting the clustering keys again is a no-op.
+-- If the table is partitioned (liquid clustering needs an unpartitioned table),
+-- replace the first two statements with:
+--   OPTIMIZE justinm.opensky.ingest_flights ZORDER BY (last_contact, origin_country, callsign);
+
+ALTER TABLE justinm.opensky.ingest_flights CLUSTER BY (last_contact, origin_country, callsign);
+
+OPTIMIZE justinm.opensky.ingest_flights;
+
+-- The rollups are merged every 10 minutes, which leaves many small files behind
+OPTIMIZE justinm.opensky.flight_positions_1m;
+
+OPTIMIZE justinm.opensky.flight_positions_10m;
@@ -0,0 +1,39 @@
+-- Per-10-minute position rollup, built from the per-minute rollup: the last report
+-- of each aircraft in each 10-minute bucket, with the raw report count summed.
+-- Runs after rollup_positions_1m.sql in the flight_position_rollups job.
+
+CREATE TABLE IF NOT EXISTS justinm.opensky.flight_positions_10m (
+  icao24 STRING,
+  bucket TIMESTAMP,
+  callsign STRING,
+  origin_country STRING,
+  time_position TIMESTAMP,
+  last_contact TIMESTAMP,
+  latitude DOUBLE,
+  longitude DOUBLE,
+  reports BIGINT
+)
+CLUSTER BY (bucket, icao24);
+
+MERGE INTO justinm.opensky.flight_positions_10m AS t
+USING (
+  SELECT
+    icao24,
+    timestamp_seconds(floor(unix_timestamp(bucket) / 600) * 600) AS bucket,
+    max_by(callsign, last_contact) AS callsign,
+    max_by(origin_country, last_contact) AS origin_country,
+    max_by(time_position, last_contact) AS time_position,
+    max(last_contact) AS last_contact,
+    max_by(latitude, last_contact) AS latitude,
+    max_by(longitude, last_contact) AS longitude,
+    sum(reports) AS reports
+  FROM justinm.opensky.flight_positions_1m
+  WHERE bucket >= coalesce(
+      (SELECT max(bucket) FROM justinm.opensky.flight_positions_10m) - INTERVAL 2 HOURS,
+      TIMESTAMP '1970-01-01'
+    )
+  GROUP BY icao24, timestamp_seconds(floor(unix_timestamp(bucket) / 600) * 600)
+) AS s
+ON t.icao24 = s.icao24 AND t.bucket = s.bucket
+WHEN MATCHED THEN UPDATE SET *
+WHEN NOT MATCHED THEN INSERT *;
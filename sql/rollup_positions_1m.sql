@@ -0,0 +1,42 @@
+-- Per-minute position rollup: the last report of each aircraft in each minute.
+-- Run by the flight_position_rollups job (resources/rollup_jobs.yml). Each run
+-- re-merges the trailing two hours so late-arriving reports are folded in; the
+-- first run backfills the whole raw table.
+
+CREATE TABLE IF NOT EXISTS justinm.opensky.flight_positions_1m (
+  icao24 STRING,
+  bucket TIMESTAMP,
+  callsign STRING,
+  origin_country STRING,
+  time_position TIMESTAMP,
+  last_contact TIMESTAMP,
+  latitude DOUBLE,
+  longitude DOUBLE,
+  reports BIGINT
+)
+CLUSTER BY (bucket, icao24);
+
+MERGE INTO justinm.opensky.flight_positions_1m AS t
+USING (
+  SELECT
+    icao24,
+    date_trunc('MINUTE', last_contact) AS bucket,
+    max_by(callsign, last_contact) AS callsign,
+    max_by(origin_country, last_contact) AS origin_country,
+    max_by(time_position, last_contact) AS time_position,
+    max(last_contact) AS last_contact,
+    max_by(latitude, last_contact) AS latitude,
+    max_by(longitude, last_contact) AS longitude,
+    count(*) AS reports
+  FROM justinm.opensky.ingest_flights
+  WHERE latitude IS NOT NULL
+    AND longitude IS NOT NULL
+    AND last_contact >= coalesce(
+      (SELECT max(bucket) FROM justinm.opensky.flight_positions_1m) - INTERVAL 2 HOURS,
+      TIMESTAMP '1970-01-01'
+    )
+  GROUP BY icao24, date_trunc('MINUTE', last_contact)
+) AS s
+ON t.icao24 = s.icao24 AND t.bucket = s.bucket
+WHEN MATCHED THEN UPDATE SET *
+WHEN NOT MATCHED THEN INSERT *;
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Checks for cancellable load jobs (app/load_jobs.py)
+Runs jobs that poll check_cancelled and cancels them mid-run, both on the worker
+running them and from a second manager sharing the job directory (another gunicorn
+worker): the job sees JobCancelled, ends "cancelled" and its cancel marker is
+removed. Runs offline.
+Usage: python test_load_jobs.py (or pytest test_load_jobs.py)
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import load_jobs
+from load_jobs import JobCancelled, JobManager, check_cancelled, report_progress
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _polling_job():
+    """A job function that runs until cancelled and records what it saw"""
+    started, seen = threading.Event(), []
+
+    def run():
+        report_progress("Fetching")
+        started.set()
+        try:
+            while True:
+                check_cancelled()
+                time.sleep(0.01)
+        except JobCancelled as e:
+            seen.append(e)
+            raise
+
+    return run, started, seen
+
+
+def test_cancel_mid_run_on_the_same_worker():
+    with tempfile.TemporaryDirectory() as job_dir:
+        jobs = JobManager("test", job_dir)
+        run, started, seen = _polling_job()
+        job_id = jobs.submit(run)
+        assert started.wait(5)
+        assert jobs.status(job_id)["progress"] == "Fetching"
+        jobs.cancel(job_id)
+        _wait_for(lambda: jobs.stats()["running"] == 0)
+        assert jobs.status(job_id)["state"] == "cancelled"
+        assert len(seen) == 1
+        assert jobs.status(job_id)["progress"] == "Cancelled"
+        assert jobs.stats()["cancelled"] == 1
+
+
+def test_cancel_from_another_worker_removes_the_marker():
+    original = load_jobs.CANCEL_POLL_SECONDS
+    load_jobs.CANCEL_POLL_SECONDS = 0.05
+    try:
+        with tempfile.TemporaryDirectory() as job_dir:
+            running, other = JobManager("running", job_dir), JobManager("other", job_dir)
+            run, started, seen = _polling_job()
+            job_id = running.submit(run)
+            assert started.wait(5)
+            # The other worker only knows the job from its file
+            assert other.status(job_id)["state"] == "running"
+            other.cancel(job_id)
+            marker = os.path.join(job_dir, f"{job_id}.cancel")
+            assert os.path.exists(marker)
+            _wait_for(lambda: running.stats()["running"] == 0)
+            assert other.status(job_id)["state"] == "cancelled"
+            assert len(seen) == 1
+            assert not os.path.exists(marker)
+    finally:
+        load_jobs.CANCEL_POLL_SECONDS = original
+
+
+def test_superseded_job_is_cancelled_and_the_new_one_completes():
+    with tempfile.TemporaryDirectory() as job_dir:
+        jobs = JobManager("test", job_dir)
+        run, started, seen = _polling_job()
+        first = jobs.submit(run)
+        assert started.wait(5)
+        second = jobs.submit(lambda: {"rows": 3}, supersedes=first)
+        _wait_for(lambda: jobs.stats()["running"] == 0)
+        assert jobs.status(first)["state"] == "cancelled"
+        assert jobs.status(second)["state"] == "done"
+        assert jobs.status(second)["result"] == {"rows": 3}
+        assert len(seen) == 1
+        assert os.listdir(job_dir) and not [name for name in os.listdir(job_dir) if name.endswith(".cancel")]
+
+
+def test_check_cancelled_outside_a_job_is_a_no_op():
+    check_cancelled()
+    report_progress("ignored")
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_") and callable(check):
+            check()
+            print(f"✅ {name}")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Checks for request coalescing (app/singleflight.py)
+Starts many threads on the same key while the first call is held open and checks the
+function runs once, every caller gets its result (or its exception), DataFrames are
+copied per caller and a finished key runs again. Runs offline.
+Usage: python test_singleflight.py (or pytest test_singleflight.py)
+"""
+
+import os
+import sys
+import threading
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import pandas as pd
+from singleflight import SingleFlight
+
+CALLERS = 8
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _call_concurrently(flights, fn):
+    """Call flights.do("key", fn) from CALLERS threads; fn is held open until all have joined"""
+    release = threading.Event()
+    runs = []
+
+    def held():
+        runs.append(threading.current_thread().name)
+        release.wait(5)
+        return fn()
+
+    outcomes = [None] * CALLERS
+
+    def caller(i):
+        try:
+            outcomes[i] = ("ok", flights.do("key", held))
+        except Exception as e:
+            outcomes[i] = ("error", e)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    _wait_for(lambda: flights.stats()["coalesced"] == CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return runs, outcomes
+
+
+def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight("test")
+    result = object()
+    runs, outcomes = _call_concurrently(flights, lambda: result)
+    assert len(runs) == 1
+    assert all(outcome == ("ok", result) for outcome in outcomes)
+    assert flights.stats() == {"executions": 1, "coalesced": CALLERS - 1, "in_flight": 0}
+
+
+def test_shared_dataframes_are_copied_per_caller():
+    flights = SingleFlight("test")
+    runs, outcomes = _call_concurrently(flights, lambda: pd.DataFrame({"x": [1, 2, 3]}))
+    frames = [df for _, df in outcomes]
+    assert len(runs) == 1
+    assert len({id(df) for df in frames}) == CALLERS
+    frames[0].loc[0, "x"] = 99
+    assert all(df["x"].tolist() == [1, 2, 3] for df in frames[1:])
+
+
+def test_exceptions_reach_every_caller():
+    flights = SingleFlight("test")
+
+    def fail():
+        raise ValueError("warehouse unavailable")
+
+    runs, outcomes = _call_concurrently(flights, fail)
+    assert len(runs) == 1
+    errors = [e for kind, e in outcomes if kind == "error"]
+    assert len(errors) == CALLERS and all(isinstance(e, ValueError) for e in errors)
+
+
+def test_finished_keys_run_again():
+    flights = SingleFlight("test")
+    calls = []
+    assert flights.do("key", lambda: calls.append(1) or len(calls)) == 1
+    assert flights.do("key", lambda: calls.append(1) or len(calls)) == 2
+    assert flights.stats()["executions"] == 2
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_") and callable(check):
+            check()
+            print(f"✅ {name}")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Checks for superset reuse (app/supersets.py)
+Compares frames answered from a remembered superset with fresh fetches of the same
+filters on the local warehouse stand-in, and checks the window, index and flight
+renumbering logic underneath. Runs offline.
+Usage: python test_supersets.py (or pytest test_supersets.py)
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# Offline, inline, unshared: set before the app modules read them
+os.environ.setdefault("LOCAL_WAREHOUSE", "1")
+os.environ.setdefault("PREWARM_DEFAULT_VIEW", "0")
+os.environ.setdefault("RENDER_PROCESSES", "0")
+os.environ.setdefault("SHARED_FRAMES", "0")
+
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import supersets
+from dataset_cache import normalize_filters
+from flight_queries import DEDUP_MODE, TIME_FORMAT
+from time_slices import MIXED_SOURCE, window_source
+from trajectory import prepare_trajectories
+
+IDENTITY = "test"
+START, END = "2024-01-01 00:00:00", "2024-01-01 02:00:00"
+
+
+def _filters(callsigns=None, countries=None, start_date=START, end_date=END):
+    return normalize_filters(callsigns, countries, start_date, end_date, dedup=DEDUP_MODE, sample=None)
+
+
+def _fetch(filters):
+    from app import _fetch_flight_data
+    return _fetch_flight_data(
+        callsigns=filters["callsigns"],
+        countries=filters["countries"],
+        start_date=filters["start_date"],
+        end_date=filters["end_date"],
+        dedup=filters["dedup"],
+    )
+
+
+def _remember(filters):
+    supersets._frames.clear()
+    supersets.remember_frame(IDENTITY, filters, _fetch(filters))
+
+
+def _assert_same_frame(subset, fresh):
+    assert subset is not None, "expected a superset hit"
+    assert len(subset) == len(fresh), (len(subset), len(fresh))
+    subset = subset.sort_values(["icao24", "timestamp"]).reset_index(drop=True)
+    fresh = fresh.sort_values(["icao24", "timestamp"]).reset_index(drop=True)
+    for col in ["icao24", "callsign", "timestamp", "flight_id"]:
+        assert (subset[col].astype(str).to_numpy() == fresh[col].astype(str).to_numpy()).all(), col
+    for col in ["lat", "lon", "groundspeed", "track"]:
+        if col in fresh.columns:
+            assert np.allclose(subset[col].to_numpy(np.float64), fresh[col].to_numpy(np.float64), equal_nan=True), col
+
+
+def test_narrowed_callsigns_match_fresh_fetch():
+    _remember(_filters())
+    wanted = _filters(callsigns=["LCL0003", "LCL0042", "LCL0117"])
+    _assert_same_frame(supersets.find_subset(IDENTITY, wanted), _fetch(wanted))
+
+
+def test_narrowed_window_matches_fresh_fetch():
+    _remember(_filters(countries=["United States"]))
+    wanted = _filters(countries=["United States"], start_date="2024-01-01 00:37:00", end_date="2024-01-01 01:12:30")
+    _assert_same_frame(supersets.find_subset(IDENTITY, wanted), _fetch(wanted))
+
+
+def test_fetch_reports_the_sources_its_slices_read():
+    # Settled slices read the rollup; a window reaching now also reads recent raw slices
+    settled = _filters(callsigns=["LCL0001"], end_date="2024-01-04 00:00:00")
+    df = _fetch(settled)
+    assert df.attrs["source"] == window_source(START, "2024-01-04 00:00:00") != "raw"
+    now = datetime.now().replace(microsecond=0)
+    recent = _filters(
+        callsigns=["LCL0001", "LCL0002"],
+        start_date=(now - timedelta(days=5)).strftime(TIME_FORMAT), end_date=now.strftime(TIME_FORMAT),
+    )
+    _remember(recent)
+    assert supersets._frames and next(iter(supersets._frames.values()))["source"] == MIXED_SOURCE
+    # Where a mixed window switches to raw depends on its slices, so it is never reused
+    assert supersets.find_subset(IDENTITY, {**recent, "callsigns": ["LCL0001"]}) is None
+
+
+def test_covers_window_edges_and_filters():
+    held = _filters(countries=["Canada", "Mexico"])
+    assert supersets.covers(held, held)
+    assert supersets.covers(held, _filters(countries=["Canada"], start_date="2024-01-01 01:00:00"))
+    assert supersets.covers(held, _filters(countries=["Mexico"], callsigns=["LCL0001"]))
+    assert not supersets.covers(held, _filters(countries=["Canada"], end_date="2024-01-01 02:00:01"))
+    assert not supersets.covers(held, _filters(countries=["Japan"]))
+    assert not supersets.covers(held, _filters())
+    assert not supersets.covers(held, {**_filters(countries=["Canada"]), "dedup": "off" if DEDUP_MODE != "off" else "sql"})
+
+
+def test_column_index_groups_missing_values():
+    series = pd.Series(["B", None, "A", "B", None, "C"])
+    index = supersets.ColumnIndex(series)
+    assert index.count(["B"]) == 2
+    assert list(index.positions(["A", "B"])) == [0, 2, 3]
+    assert list(index.positions(["missing"])) == []
+    assert list(index.matches(np.arange(6), ["C", "A"])) == [False, False, True, False, False, True]
+
+
+def test_select_is_inclusive_and_index_independent():
+    seconds = np.arange(0, 600, 60)
+    df = pd.DataFrame({
+        "timestamp": pd.to_datetime(seconds + 1704067200, unit="s"),
+        "callsign": ["A", "B"] * 5,
+        "origin_country": ["X"] * 9 + ["Y"],
+    })
+    index = supersets.FrameIndex(df)
+    # Both bounds are inclusive, like the warehouse query's
+    rows = index.select({"start_date": "2024-01-01 00:01:00", "end_date": "2024-01-01 00:05:00"})
+    assert list(rows) == [1, 2, 3, 4, 5]
+    # The callsign index is narrower for "A", the country index for "Y"; both agree with a scan
+    for filters in [{"callsigns": ["A"], "countries": ["X", "Y"]}, {"callsigns": ["A", "B"], "countries": ["Y"]}]:
+        filters = {"start_date": "2024-01-01 00:00:00", "end_date": "2024-01-01 00:09:00", **filters}
+        expected = np.flatnonzero(df["callsign"].isin(filters["callsigns"]) & df["origin_country"].isin(filters["countries"]))
+        assert list(index.select(filters)) == list(expected), filters
+
+
+def test_refit_renumbers_flights_cut_by_the_window():
+    # One aircraft, two flights split by a two-hour gap
+    minutes = np.concatenate([np.arange(0, 30), np.arange(150, 180)])
+    df = pd.DataFrame({
+        "icao24": "abc123",
+        "callsign": "TEST1",
+        "timestamp": pd.to_datetime(minutes * 60 + 1704067200, unit="s"),
+        "lat": 40.0 + minutes * 0.05,
+        "lon": -100.0 + minutes * 0.05,
+    })
+    superset = prepare_trajectories(df)
+    assert sorted(superset["flight_id"].astype(str).unique()) == ["abc123-0", "abc123-1"]
+    later = superset.iloc[40:].reset_index(drop=True)
+    refit = supersets.refit_flights(later)
+    assert list(refit["flight_id"].astype(str).unique()) == ["abc123-0"]
+    assert np.allclose(refit["groundspeed"].to_numpy(), prepare_trajectories(df.iloc[40:])["groundspeed"].to_numpy())
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_") and callable(check):
+            check()
+            print(f"✅ {name}")
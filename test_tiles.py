@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Checks for the vector tile encoder (app/tiles.py)
+Cuts tiles from a small frame and decodes them with a minimal protobuf reader (the
+Mapbox Vector Tile 2.1 layout): layer header, point geometry commands, zigzag
+coordinates, tags, buffer clipping and the latest-report-per-cell rule. Runs offline.
+Usage: python test_tiles.py (or pytest test_tiles.py)
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# Offline, inline, unshared: set before the app modules read them
+os.environ.setdefault("LOCAL_WAREHOUSE", "1")
+os.environ.setdefault("PREWARM_DEFAULT_VIEW", "0")
+os.environ.setdefault("RENDER_PROCESSES", "0")
+os.environ.setdefault("SHARED_FRAMES", "0")
+
+import numpy as np
+import pandas as pd
+import tiles
+
+EPOCH = 1704067200
+
+
+def _fields(data):
+    """(field number, value) pairs of a protobuf message; varints as ints, the rest as bytes"""
+    pos = 0
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _varint(data, pos)
+        elif wire == 2:
+            length, pos = _varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        else:
+            raise AssertionError(f"unexpected wire type {wire}")
+        yield field, value
+
+
+def _varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = _varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_tile(body):
+    """Decode a one-layer point tile into its header and [(x, y, {tag: value})] features"""
+    layers = [value for field, value in _fields(body) if field == 3]
+    assert len(layers) == 1
+    layer = {"features": [], "keys": [], "values": []}
+    for field, value in _fields(layers[0]):
+        if field == 15:
+            layer["version"] = value
+        elif field == 1:
+            layer["name"] = value.decode()
+        elif field == 2:
+            layer["features"].append(value)
+        elif field == 3:
+            layer["keys"].append(value.decode())
+        elif field == 4:
+            (kind, v), = list(_fields(value))
+            layer["values"].append(v.decode() if kind == 1 else v)
+        elif field == 5:
+            layer["extent"] = value
+
+    points = []
+    for feature in layer["features"]:
+        parts = dict(_fields(feature))
+        assert parts[3] == 1, "POINT geometry type"
+        command, dx, dy = _packed(parts[4])
+        assert command == (1 << 3) | 1, "one MoveTo"
+        tags = _packed(parts[2])
+        properties = {layer["keys"][k]: layer["values"][v] for k, v in zip(tags[::2], tags[1::2])}
+        points.append((_unzigzag(dx), _unzigzag(dy), properties))
+    return layer, points
+
+
+def _expected_xy(lon, lat, z, x, y):
+    mx, my = tiles.mercator(lon, lat)
+    scale = float(1 << z) * tiles.TILE_EXTENT
+    return int(np.floor(mx * scale - x * tiles.TILE_EXTENT)), int(np.floor(my * scale - y * tiles.TILE_EXTENT))
+
+
+def _frame(rows):
+    lon, lat, callsign, seconds = zip(*rows)
+    return pd.DataFrame({
+        "lon": lon, "lat": lat, "callsign": list(callsign),
+        "timestamp": pd.to_datetime(np.array(seconds) + EPOCH, unit="s"),
+    })
+
+
+def test_header_geometry_and_tags():
+    df = _frame([(10.0, 20.0, "AAA1", 100), (120.0, 60.0, "BBB2", 50)])
+    body, count = tiles.TileIndex(df).tile(1, 1, 0)
+    layer, points = decode_tile(body)
+    assert count == 2
+    assert (layer["version"], layer["name"], layer["extent"]) == (2, tiles.TILE_LAYER, tiles.TILE_EXTENT)
+    assert layer["keys"] == ["callsign", "timestamp"]
+    got = sorted(points, key=lambda p: p[2]["callsign"])
+    assert got[0] == (*_expected_xy(10.0, 20.0, 1, 1, 0), {"callsign": "AAA1", "timestamp": EPOCH + 100})
+    assert got[1] == (*_expected_xy(120.0, 60.0, 1, 1, 0), {"callsign": "BBB2", "timestamp": EPOCH + 50})
+
+
+def test_clipping_keeps_the_buffer_only():
+    df = _frame([
+        (-0.1, 10.0, "EDGE", 1),      # just west of the tile, inside the buffer
+        (-90.0, 10.0, "WEST", 2),     # a neighbouring tile
+        (45.0, -10.0, "SOUTH", 3),    # below the tile and its buffer
+    ])
+    _, points = decode_tile(tiles.TileIndex(df).tile(1, 1, 0)[0])
+    assert [p[2]["callsign"] for p in points] == ["EDGE"]
+    x, y, _ = points[0]
+    assert -tiles.TILE_BUFFER <= x < 0, "negative coordinates survive the zigzag round trip"
+    assert (x, y) == _expected_xy(-0.1, 10.0, 1, 1, 0)
+
+
+def test_one_report_per_cell_keeps_the_latest():
+    df = _frame([(30.0, 30.0, "OLD", 10), (30.00001, 30.0, "NEW", 20), (31.0, 30.0, "OTHER", 15)])
+    _, points = decode_tile(tiles.TileIndex(df).tile(2, 2, 1)[0])
+    assert sorted(p[2]["callsign"] for p in points) == ["NEW", "OTHER"]
+
+
+def test_time_buckets_and_empty_tiles():
+    bucket = tiles.TILE_BUCKET_MINUTES * 60
+    df = _frame([(5.0, 5.0, "EARLY", 0), (6.0, 5.0, "LATE", bucket + 1)])
+    index = tiles.TileIndex(df)
+    _, points = decode_tile(index.tile(0, 0, 0, bucket=EPOCH + bucket)[0])
+    assert [p[2]["callsign"] for p in points] == ["LATE"]
+    assert index.tile(0, 0, 0, bucket=EPOCH + 10 * bucket) == (b"", 0)
+
+
+def test_tile_cache_tracks_bytes_and_retires_replaced_datasets():
+    from dataset_cache import put_dataset
+    put_dataset("test-tiles", _frame([(5.0, 5.0, "A", 0), (-5.0, 5.0, "B", 1)]))
+    first = tiles.get_tile("test-tiles", 1, 1, 0)
+    tiles.get_tile("test-tiles", 1, 0, 0)
+    put_dataset("test-tiles", _frame([(5.0, 5.0, "C", 0)]))
+    replaced = tiles.get_tile("test-tiles", 1, 1, 0)
+    assert decode_tile(first["raw"])[1][0][2]["callsign"] == "A"
+    assert decode_tile(replaced["raw"])[1][0][2]["callsign"] == "C"
+    stats = tiles.stats()
+    assert stats["tiles"] == 1 and stats["bytes"] == replaced["bytes"]
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_") and callable(check):
+            check()
+            print(f"✅ {name}")
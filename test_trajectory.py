@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Checks for flight segmentation and pruning (app/trajectory.py)
+Splits reports into flights on time, distance and callsign changes, numbers each
+aircraft's flights from zero, collapses stationary runs to their endpoints and keeps
+single-report flights. Runs offline.
+Usage: python test_trajectory.py (or pytest test_trajectory.py)
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import numpy as np
+import pandas as pd
+from trajectory import (
+    SEGMENT_MAX_GAP_KM, SEGMENT_MAX_GAP_SECONDS, epoch_seconds, label_flights, prepare_trajectories,
+    prune_stationary, segment_flights,
+)
+
+EPOCH = 1704067200
+
+
+def _reports(rows):
+    """Frame from (icao24, seconds, lat, lon) rows, callsign taken from the aircraft"""
+    icao24, seconds, lat, lon = zip(*rows)
+    return pd.DataFrame({
+        "icao24": list(icao24),
+        "callsign": [f"CS{a.upper()}" for a in icao24],
+        "timestamp": pd.to_datetime(np.array(seconds) + EPOCH, unit="s"),
+        "lat": np.array(lat, dtype=np.float64),
+        "lon": np.array(lon, dtype=np.float64),
+    })
+
+
+def _flight_ids(df):
+    return df["flight_id"].astype(str).tolist()
+
+
+def test_time_gap_splits_a_flight():
+    gap = SEGMENT_MAX_GAP_SECONDS
+    # Out of order on purpose: segment_flights sorts by aircraft and time
+    df = _reports([
+        ("b2", 0, 10.0, 10.0),
+        ("a1", 60 + gap + 1, 40.02, -100.02),
+        ("a1", 0, 40.0, -100.0),
+        ("a1", 60, 40.01, -100.01),
+        ("a1", 120 + gap + 1, 40.03, -100.03),
+    ])
+    out = segment_flights(df)
+    assert out["icao24"].tolist() == ["a1"] * 4 + ["b2"]
+    assert _flight_ids(out) == ["a1-0", "a1-0", "a1-1", "a1-1", "b2-0"]
+    # A gap of exactly the threshold does not split
+    same = segment_flights(_reports([("a1", 0, 40.0, -100.0), ("a1", gap, 40.01, -100.01)]))
+    assert _flight_ids(same) == ["a1-0", "a1-0"]
+
+
+def test_distance_jump_and_callsign_change_split_a_flight():
+    jump = np.degrees((SEGMENT_MAX_GAP_KM + 10) / 6371.0)
+    df = _reports([("a1", 0, 0.0, 0.0), ("a1", 10, 0.0, jump), ("a1", 20, 0.0, jump + 0.01)])
+    assert _flight_ids(segment_flights(df)) == ["a1-0", "a1-1", "a1-1"]
+    df = _reports([("a1", 0, 0.0, 0.0), ("a1", 10, 0.0, 0.01), ("a1", 20, 0.0, 0.02)])
+    df.loc[2, "callsign"] = "OTHER"
+    assert _flight_ids(segment_flights(df)) == ["a1-0", "a1-0", "a1-1"]
+
+
+def test_label_flights_numbers_each_aircraft_from_zero():
+    df = _reports([("a1", 0, 0, 0), ("a1", 10, 0, 0), ("a1", 20, 0, 0), ("b2", 0, 0, 0), ("b2", 10, 0, 0)])
+    starts = np.array([True, False, True, False, True])
+    assert _flight_ids(label_flights(df, starts)) == ["a1-0", "a1-0", "a1-1", "b2-0", "b2-1"]
+    # Every aircraft's first row starts a flight even when the mask misses it
+    starts = np.array([False, False, False, False, False])
+    assert _flight_ids(label_flights(df, starts)) == ["a1-0", "a1-0", "a1-0", "b2-0", "b2-0"]
+
+
+def test_stationary_run_collapses_to_its_endpoints():
+    df = _reports([
+        ("a1", 0, 40.0, -100.0),
+        ("a1", 10, 40.01, -100.0),
+        ("a1", 20, 40.01, -100.0),       # parked: first report of the run
+        ("a1", 20, 40.01, -100.0),       # exact repeat
+        ("a1", 30, 40.01 + 5e-5, -100.0),  # within epsilon
+        ("a1", 40, 40.01, -100.0),
+        ("a1", 50, 40.01, -100.0),       # last report of the run
+        ("a1", 60, 40.02, -100.0),
+    ])
+    out = prune_stationary(segment_flights(df))
+    assert list(epoch_seconds(out["timestamp"]) - EPOCH) == [0, 10, 50, 60]
+    assert out.index.tolist() == [0, 1, 2, 3]
+
+
+def test_stationary_runs_do_not_span_flights():
+    gap = SEGMENT_MAX_GAP_SECONDS + 1
+    df = _reports([
+        ("a1", 0, 40.0, -100.0), ("a1", 10, 40.0, -100.0),
+        ("a1", 10 + gap, 40.0, -100.0), ("a1", 20 + gap, 40.0, -100.0),
+    ])
+    out = prune_stationary(segment_flights(df))
+    assert _flight_ids(out) == ["a1-0", "a1-0", "a1-1", "a1-1"]
+
+
+def test_single_report_flight_survives():
+    df = _reports([("a1", 0, 40.0, -100.0), ("a1", 10, 40.01, -100.0), ("b2", 5, 10.0, 10.0)])
+    out = prune_stationary(segment_flights(df))
+    assert _flight_ids(out) == ["a1-0", "a1-0", "b2-0"]
+    # Also through the full pipeline, kinematics included
+    prepared = prepare_trajectories(df)
+    assert "b2-0" in _flight_ids(prepared)
+    # Callers can still ask for a minimum
+    out = prune_stationary(segment_flights(df), min_points=2)
+    assert _flight_ids(out) == ["a1-0", "a1-0"]
+    assert list(out["flight_id"].cat.categories) == ["a1-0"]
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_") and callable(check):
+            check()
+            print(f"✅ {name}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Checks for the map transport encoding (app/transport.py)
+Round-trips frames through encode_frame and decode_frame: negative deltas, float32
+coordinates, missing values, a single-row flight and an empty frame. Decoded floats
+must be within half a quantization step of the input. Runs offline.
+Usage: python test_transport.py (or pytest test_transport.py)
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import numpy as np
+import pandas as pd
+from trajectory import epoch_seconds
+from transport import (
+    DEFAULT_FLOAT_PRECISION, FLOAT_PRECISION, decode_frame, encode_frame, polyline_decode, polyline_encode,
+)
+
+# float32 keeps about 7 significant digits, ~8e-6 degrees at 100 degrees longitude
+FLOAT32_SLACK = 1e-5
+
+
+def _round_trip(df):
+    return decode_frame(encode_frame(df))
+
+
+def _assert_round_trip(df, slack=0.0):
+    decoded = _round_trip(df)
+    assert list(decoded.columns) == list(df.columns)
+    assert len(decoded) == len(df)
+    for name in df.columns:
+        original, back = df[name], decoded[name]
+        if pd.api.types.is_datetime64_any_dtype(original):
+            assert (np.asarray(back) == epoch_seconds(original)).all(), name
+        elif pd.api.types.is_float_dtype(original):
+            values = original.to_numpy(np.float64)
+            back = np.array(back, dtype=np.float64)
+            missing = np.isnan(values)
+            assert (np.isnan(back) == missing).all(), name
+            step = 10.0 ** -FLOAT_PRECISION.get(name, DEFAULT_FLOAT_PRECISION)
+            assert np.all(np.abs(back[~missing] - values[~missing]) <= step / 2 + slack + 1e-9), name
+        else:
+            expected = original.astype(object).where(original.notna(), None).tolist()
+            got = pd.Series(back).astype(object).where(pd.Series(back).notna(), None).tolist()
+            assert got == expected, name
+
+
+def _flights(dtype=np.float64):
+    # Westbound and southbound, so coordinate, code and time deltas all go negative
+    return pd.DataFrame({
+        "icao24": pd.Categorical(["c3", "c3", "c3", "a1", "a1", "b2"]),
+        "callsign": ["ZED1", "ZED1", "ZED1", "ABC2", "ABC2", "MID3"],
+        "timestamp": pd.to_datetime(np.array([600, 610, 620, 0, 10, 5]) + 1704067200, unit="s"),
+        "lat": np.array([45.123456, 45.100001, 45.07651, -33.86785, -33.9, 0.0], dtype=dtype),
+        "lon": np.array([-73.56789, -73.6, -73.63211, 151.20732, 151.1, -0.00001], dtype=dtype),
+        "groundspeed": np.array([250.04, 249.96, 251.0, 0.0, 12.35, 88.8], dtype=dtype),
+        "on_ground": [False, False, False, True, False, True],
+        "level": np.array([5, -3, 12, 0, -7, 2], dtype=np.int64),
+    })
+
+
+def test_polyline_round_trips_extremes():
+    values = np.array([0, -1, 1, -2**40, 2**40, np.iinfo(np.int64).max, np.iinfo(np.int64).min + 1], dtype=np.int64)
+    assert (polyline_decode(polyline_encode(values)) == values).all()
+    assert polyline_encode([]) == ""
+
+
+def test_negative_deltas_round_trip():
+    _assert_round_trip(_flights())
+
+
+def test_float32_coordinates_round_trip():
+    _assert_round_trip(_flights(np.float32), slack=FLOAT32_SLACK)
+
+
+def test_missing_values_round_trip():
+    df = _flights()
+    df.loc[1, "groundspeed"] = np.nan
+    df.loc[4, "callsign"] = None
+    df["icao24"] = df["icao24"].cat.add_categories(["zz"])
+    _assert_round_trip(df)
+
+
+def test_single_row_flight_round_trips():
+    _assert_round_trip(_flights().iloc[[5]].reset_index(drop=True))
+
+
+def test_empty_frame_round_trips():
+    _assert_round_trip(_flights().iloc[:0])
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_") and callable(check):
+            check()
+            print(f"✅ {name}")